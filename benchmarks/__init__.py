@@ -0,0 +1 @@
+"""Load tests against local stand-ins of the Practicum and Telegram APIs."""
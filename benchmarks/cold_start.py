@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_servers import FakeConfig, start_fake_servers
+from benchmarks.run import BOT_TOKEN, percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = {
+    'interpreter': ['-c', 'pass'],
+    'import': ['-c', 'import homework'],
+    'once': ['homework.py', '--once'],
+}
+
+
+def time_command(args, env, runs):
+    """Wall time of ``runs`` fresh interpreters running ``args``."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args], cwd=ROOT, env=env, check=True,
+            stdout=subprocess.DEVNULL
+        )
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def make_env(directory, endpoint, telegram_url):
+    """Environment of a ``--once`` run against the fake servers."""
+    env = dict(os.environ)
+    env.pop('TENANTS_FILE', None)
+    env.update({
+        'PRACTICUM_TOKEN': 'token',
+        'PRACTICUM_ENDPOINT': endpoint,
+        'TELEGRAM_TOKEN': BOT_TOKEN,
+        'TELEGRAM_API_URL': telegram_url,
+        'TELEGRAM_CHAT_ID': '1',
+        'STATE_FILE': os.path.join(directory, 'state.json'),
+        'LOG_FILE': os.path.join(directory, 'main.log'),
+    })
+    return env
+
+
+def main(argv=None):
+    """Time import and import-to-exit of ``homework.py --once``."""
+    parser = argparse.ArgumentParser(
+        description='Measure the cold start of a single cycle.'
+    )
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--homeworks', type=int, default=0,
+                        help='homeworks each poll finds; 0 is an idle cycle')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+    process, endpoint, telegram_url = start_fake_servers(
+        FakeConfig(homeworks=args.homeworks)
+    )
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            env = make_env(directory, endpoint, telegram_url)
+            report = {}
+            for name, command in COMMANDS.items():
+                timings = time_command(command, env, args.runs)
+                report[name] = {
+                    'p50_ms': round(percentile(timings, 0.5) * 1000, 1),
+                    'max_ms': round(max(timings) * 1000, 1),
+                }
+    finally:
+        process.terminate()
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for name, row in report.items():
+            print(f"{name:<12} p50={row['p50_ms']}ms max={row['max_ms']}ms")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import json
+import multiprocessing
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATUSES = ('reviewing', 'approved', 'rejected')
+
+
+@dataclass
+class FakeConfig:
+    """Behaviour of a fake API server."""
+
+    latency: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: int = 1
+    homeworks: int = 3
+    change_rate: float = 0.2
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Shared plumbing of the fake servers."""
+
+    protocol_version = 'HTTP/1.1'
+    config = FakeConfig()
+
+    def log_message(self, *args):
+        """Keep the benchmark output clean."""
+
+    def reply(self, status, data, headers=()):
+        """Send a JSON response."""
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def misbehave(self):
+        """Sleep for the latency, then maybe fail; True if it failed."""
+        if self.config.latency:
+            time.sleep(self.config.latency)
+        chance = random.random()
+        if chance < self.config.throttle_rate:
+            self.throttle()
+            return True
+        if chance < self.config.throttle_rate + self.config.error_rate:
+            self.reply(HTTPStatus.INTERNAL_SERVER_ERROR, {'ok': False})
+            return True
+        return False
+
+
+class PracticumHandler(FakeHandler):
+    """Stand-in of ``homework_statuses/``.
+
+    Every token owns ``homeworks`` homeworks; each request moves every
+    homework to a random status with probability ``change_rate``.
+    """
+
+    homeworks = {}
+    lock = threading.Lock()
+
+    def throttle(self):
+        """Answer 429 with a Retry-After header."""
+        self.reply(
+            HTTPStatus.TOO_MANY_REQUESTS, {'code': 'throttled'},
+            [('Retry-After', str(self.config.retry_after))]
+        )
+
+    def do_GET(self):
+        """Serve homework statuses of the requesting token."""
+        token = self.headers.get('Authorization', '')
+        if not token.startswith('OAuth '):
+            self.reply(HTTPStatus.UNAUTHORIZED, {'code': 'not_authenticated'})
+            return
+        if self.misbehave():
+            return
+        with self.lock:
+            statuses = self.homeworks.setdefault(
+                token, ['reviewing'] * self.config.homeworks
+            )
+            for index in range(len(statuses)):
+                if random.random() < self.config.change_rate:
+                    statuses[index] = random.choice(STATUSES)
+            homeworks = [
+                {'id': index, 'homework_name': f'hw{index}',
+                 'status': status, 'reviewer_comment': '',
+                 'lesson_name': 'Load test'}
+                for index, status in enumerate(statuses)
+            ]
+        self.reply(HTTPStatus.OK, {
+            'homeworks': homeworks, 'current_date': int(time.time())
+        })
+
+
+class TelegramHandler(FakeHandler):
+    """Stand-in of the Bot API ``sendMessage``, ``getMe``, ``getChat``."""
+
+    message_id = 0
+
+    def throttle(self):
+        """Answer 429 the way the Bot API does."""
+        retry_after = self.config.retry_after
+        self.reply(HTTPStatus.TOO_MANY_REQUESTS, {
+            'ok': False, 'error_code': 429,
+            'description': f'Too Many Requests: retry after {retry_after}',
+            'parameters': {'retry_after': retry_after},
+        })
+
+    def do_POST(self):
+        """Serve one Bot API method."""
+        length = int(self.headers.get('Content-Length') or 0)
+        data = json.loads(self.rfile.read(length) or b'{}')
+        if self.misbehave():
+            return
+        method = self.path.rsplit('/', 1)[-1]
+        if method == 'getMe':
+            self.reply(HTTPStatus.OK, {'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'Fake',
+                'username': 'fake_bot',
+            }})
+            return
+        if method == 'getChat':
+            self.reply(HTTPStatus.OK, {'ok': True, 'result': {
+                'id': data.get('chat_id', 0), 'type': 'private',
+            }})
+            return
+        TelegramHandler.message_id += 1
+        chat_id = data.get('chat_id', 0)
+        self.reply(HTTPStatus.OK, {'ok': True, 'result': {
+            'message_id': TelegramHandler.message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': data.get('text', ''),
+        }})
+
+
+def start_server(handler, config, host='127.0.0.1', port=0):
+    """Start a fake server in a daemon thread."""
+    handler = type(handler.__name__, (handler,), {'config': config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _serve(practicum, telegram, ports):
+    """Child process body: run both servers and report their ports."""
+    servers = [
+        start_server(PracticumHandler, practicum),
+        start_server(TelegramHandler, telegram),
+    ]
+    ports.put([server.server_address[1] for server in servers])
+    threading.Event().wait()
+
+
+def start_fake_servers(practicum=None, telegram=None):
+    """Run both fake servers in a child process.
+
+    Returns the process, the Practicum endpoint and the Bot API base URL.
+    The servers live in their own process so they do not skew the CPU
+    and memory numbers of the bot under test.
+    """
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_serve,
+        args=(practicum or FakeConfig(), telegram or FakeConfig(), ports),
+        daemon=True
+    )
+    process.start()
+    practicum_port, telegram_port = ports.get(timeout=10)
+    return (
+        process,
+        f'http://127.0.0.1:{practicum_port}/api/user_api/homework_statuses/',
+        f'http://127.0.0.1:{telegram_port}/bot',
+    )
+
+
+def main():
+    """Run the fake servers in the foreground."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--practicum-port', type=int, default=8081)
+    parser.add_argument('--telegram-port', type=int, default=8082)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    config = FakeConfig(args.latency, args.error_rate, args.throttle_rate)
+    start_server(PracticumHandler, config, port=args.practicum_port)
+    start_server(TelegramHandler, config, port=args.telegram_port)
+    print(
+        f'Practicum: http://127.0.0.1:{args.practicum_port}'
+        '/api/user_api/homework_statuses/\n'
+        f'Telegram: http://127.0.0.1:{args.telegram_port}/bot'
+    )
+    threading.Event().wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import threading
+import time
+
+from benchmarks.fake_servers import FakeConfig, start_fake_servers
+
+MODES = ('sequential', 'engine')
+BOT_TOKEN = '1234:benchmark'
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+class Recorder:
+    """Collects latencies of the wrapped calls from any thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+
+    def wrap(self, func):
+        """Time every call of ``func``."""
+        def timed(*args):
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            except Exception:
+                with self.lock:
+                    self.errors += 1
+                raise
+            finally:
+                with self.lock:
+                    self.latencies.append(time.perf_counter() - start)
+        return timed
+
+    def summary(self, elapsed):
+        """Throughput and latency percentiles in milliseconds."""
+        return {
+            'count': len(self.latencies),
+            'per_second': round(len(self.latencies) / elapsed, 1),
+            'errors': self.errors,
+            'p50_ms': round(percentile(self.latencies, 0.5) * 1000, 2),
+            'p99_ms': round(percentile(self.latencies, 0.99) * 1000, 2),
+        }
+
+
+def import_homework(endpoint, telegram_url):
+    """Import ``homework.py`` pointed at the fake servers."""
+    os.environ.update({
+        'PRACTICUM_ENDPOINT': endpoint,
+        'TELEGRAM_API_URL': telegram_url,
+        'TELEGRAM_TOKEN': BOT_TOKEN,
+    })
+    import homework
+    return homework
+
+
+def make_tenants(count):
+    """Tenants with distinct tokens and chats."""
+    from homework_bot.tenants import Tenant
+    return [Tenant(f'token-{index}', str(index)) for index in range(count)]
+
+
+def run_sequential(homework, tenants, cycles, polls, sends):
+    """The classic loop: one tenant at a time, sending synchronously."""
+    from homework_bot.bots import get_bot
+    from homework_bot.diff import StatusIndex
+
+    bot = get_bot(BOT_TOKEN, base_url=homework.TELEGRAM_API_URL)
+    fetch = polls.wrap(homework.fetch_homeworks)
+    send = sends.wrap(
+        lambda chat_id, text: bot.send_message(chat_id=chat_id, text=text)
+    )
+    indexes = {tenant.key: StatusIndex() for tenant in tenants}
+    for _ in range(cycles):
+        for tenant in tenants:
+            try:
+                response = fetch(tenant.headers, 0)
+                statuses = indexes[tenant.key]
+                records = homework.check_response(response)
+                for item in statuses.changes(records):
+                    send(tenant.chat_id, homework.parse_status(item))
+                    statuses.remember(item)
+            except Exception:
+                pass
+
+
+def run_engine(homework, tenants, cycles, polls, sends, args):
+    """The asyncio engine with the send queue and timing wheel."""
+    from homework_bot.bots import get_bot
+    from homework_bot.delivery import SendQueue, TokenBucket
+    from homework_bot.engine import PollingEngine
+    from homework_bot.scheduler import AdaptiveSchedule
+
+    bot = get_bot(
+        BOT_TOKEN, pool_size=args.send_workers,
+        base_url=homework.TELEGRAM_API_URL
+    )
+    send = sends.wrap(
+        lambda chat_id, text: bot.send_message(chat_id=chat_id, text=text)
+    )
+    engine = PollingEngine(
+        tenants, fetch=polls.wrap(homework.fetch_homeworks),
+        check=homework.check_response, parse=homework.parse_status,
+        queue=SendQueue(
+            send, workers=args.send_workers, chat_rate=args.chat_rate,
+            global_rate=args.global_rate, backoff=0.1
+        ),
+        schedule=AdaptiveSchedule(0, 0, 0, 0, jitter=0),
+        budget=TokenBucket(args.api_rate),
+        max_in_flight=args.max_in_flight, tick=0.01
+    )
+    asyncio.run(engine.run(cycles=cycles))
+    return {
+        'loop_lag_max_ms': round(engine.loop_lag.max * 1000, 2),
+        'timer_late_max_ms': round(engine.wheel.lateness.max * 1000, 2),
+    }
+
+
+def run_mode(mode, homework, args):
+    """Benchmark one mode and return its report."""
+    tenants = make_tenants(args.tenants)
+    polls, sends = Recorder(), Recorder()
+    start = time.perf_counter()
+    extra = {}
+    if mode == 'sequential':
+        run_sequential(homework, tenants, args.cycles, polls, sends)
+    else:
+        extra = run_engine(homework, tenants, args.cycles, polls, sends,
+                           args)
+    elapsed = time.perf_counter() - start
+    return {
+        'mode': mode,
+        'tenants': args.tenants,
+        'seconds': round(elapsed, 2),
+        'polls': polls.summary(elapsed),
+        'sends': sends.summary(elapsed),
+        'max_rss_mb': round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        **extra,
+    }
+
+
+def print_report(report):
+    """Print one report as a short table."""
+    polls, sends = report['polls'], report['sends']
+    print(
+        f"{report['mode']:<11} tenants={report['tenants']} "
+        f"time={report['seconds']}s rss={report['max_rss_mb']}MB\n"
+        f"  polls {polls['per_second']}/s p50={polls['p50_ms']}ms "
+        f"p99={polls['p99_ms']}ms errors={polls['errors']}\n"
+        f"  sends {sends['per_second']}/s p50={sends['p50_ms']}ms "
+        f"p99={sends['p99_ms']}ms errors={sends['errors']}"
+    )
+
+
+def parse_args(argv=None):
+    """Command line of the benchmark runner."""
+    parser = argparse.ArgumentParser(
+        description='Load test the bot against fake Practicum/Telegram.'
+    )
+    parser.add_argument('--tenants', type=int, default=200)
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Practicum latency, seconds')
+    parser.add_argument('--telegram-latency', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='share of 429 answers')
+    parser.add_argument('--max-in-flight', type=int, default=64)
+    parser.add_argument('--api-rate', type=float, default=math.inf,
+                        help='Practicum requests per second of the engine, '
+                             'unlimited by default')
+    parser.add_argument('--send-workers', type=int, default=8)
+    parser.add_argument('--chat-rate', type=float, default=1)
+    parser.add_argument('--global-rate', type=float, default=30)
+    parser.add_argument('--json', action='store_true',
+                        help='print reports as JSON lines')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Start the fake servers and benchmark every requested mode."""
+    args = parse_args(argv)
+    practicum = FakeConfig(
+        latency=args.latency, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate
+    )
+    telegram = FakeConfig(
+        latency=args.telegram_latency, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate
+    )
+    process, endpoint, telegram_url = start_fake_servers(practicum, telegram)
+    try:
+        homework = import_homework(endpoint, telegram_url)
+        reports = [run_mode(mode, homework, args) for mode in args.modes]
+    finally:
+        process.terminate()
+    for report in reports:
+        if args.json:
+            print(json.dumps(report))
+        else:
+            print_report(report)
+    return reports
+
+
+if __name__ == '__main__':
+    main()
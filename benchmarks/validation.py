@@ -0,0 +1,109 @@
+import argparse
+import json
+import timeit
+
+from homework_bot.models import Homework, orjson, parse_response
+from homework_bot.templates import Catalog
+
+VERDICTS = {
+    'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
+    'reviewing': 'Работа взята на проверку ревьюером.',
+    'rejected': 'Работа проверена: у ревьюера есть замечания.'
+}
+CATALOG = Catalog(VERDICTS)
+
+
+def make_body(homeworks):
+    """Raw API answer with ``homeworks`` entries."""
+    statuses = list(VERDICTS)
+    return json.dumps({
+        'homeworks': [
+            {
+                'id': index, 'homework_name': f'hw{index}',
+                'status': statuses[index % len(statuses)],
+                'reviewer_comment': 'ok', 'lesson_name': 'lesson',
+                'date_updated': '2022-01-01T00:00:00Z',
+            }
+            for index in range(homeworks)
+        ],
+        'current_date': 1
+    }).encode()
+
+
+def legacy_check_response(response):
+    """``check_response`` as it was before the typed validator."""
+    if not isinstance(response, dict):
+        raise TypeError(f'Was expected dict type, {type(response)}')
+    homeworks = response.get('homeworks')
+    if not isinstance(homeworks, list):
+        raise TypeError(f'Was expected list type, {type(homeworks)}')
+
+
+def legacy_parse_status(homework):
+    """``parse_status`` as it was before the typed validator."""
+    keys = {'name': homework.get('homework_name'),
+            'status': homework.get('status')}
+    for name, value in keys.items():
+        if not value:
+            raise KeyError(f'No key {name}')
+    homework_name = homework.get('homework_name')
+    homework_status = homework.get('status')
+    if homework_status not in VERDICTS:
+        raise KeyError('Undefined status homework')
+    if not homework_name:
+        raise KeyError('Name field is empty')
+    result = VERDICTS[homework_status]
+    return f'Изменился статус проверки работы "{homework_name}". {result}'
+
+
+def legacy(body):
+    """Decode, check and format every homework the old way."""
+    response = json.loads(body)
+    legacy_check_response(response)
+    return [
+        legacy_parse_status(homework) for homework in response['homeworks']
+    ]
+
+
+def typed(body):
+    """Decode, validate and format every homework as the bot does."""
+    response = (orjson or json).loads(body)
+    return [
+        CATALOG.render(homework)
+        for homework in parse_response(response, CATALOG.statuses)
+    ]
+
+
+def measure(func, body, repeat):
+    """Best time of one call in microseconds."""
+    best = min(timeit.repeat(lambda: func(body), number=repeat, repeat=5))
+    return best / repeat * 1e6
+
+
+def parse_args(argv=None):
+    """Command line of the validation benchmark."""
+    parser = argparse.ArgumentParser(
+        description='Compare the old and the typed response validation.'
+    )
+    parser.add_argument('--homeworks', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=2000)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Time both validators on the same body and print the result."""
+    args = parse_args(argv)
+    body = make_body(args.homeworks)
+    assert legacy(body) == typed(body)
+    old = measure(legacy, body, args.repeat)
+    new = measure(typed, body, args.repeat)
+    print(
+        f'homeworks={args.homeworks} decoder='
+        f"{'orjson' if orjson else 'json'}\n"
+        f'  legacy {old:.1f}us  typed {new:.1f}us  speedup {old / new:.2f}x'
+    )
+    print(f'  record size {Homework.__basicsize__} bytes, no __dict__')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,24 @@
+import argparse
 import logging
 import os
+import sys
 import time
 from http import HTTPStatus
-from logging.handlers import RotatingFileHandler
 
 import requests
 from dotenv import load_dotenv
-from telegram import Bot, TelegramError
+
+from homework_bot.diff import StatusIndex
+from homework_bot.errors import (APIRequestError, APIResponseError,
+                                 ValidationError)
+from homework_bot.http_client import PooledClient, parse_retry_after
+from homework_bot.logs import setup_logging
+from homework_bot.metrics import (API_ERRORS, API_LATENCY, API_RESPONSES,
+                                  register_http_client, start_metrics_server)
+from homework_bot.models import parse_response, response_json
+from homework_bot.state import SQLITE_SUFFIXES, advance_cursor, open_store
+from homework_bot.templates import Catalog
+from homework_bot.tenants import Tenant, load_tenants
 
 load_dotenv()
 
@@ -14,11 +26,47 @@ load_dotenv()
 PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TENANTS_FILE = os.getenv('TENANTS_FILE')
+WORKERS = int(os.getenv('WORKERS', 1))
+LEASE_FILE = os.getenv('LEASE_FILE')
+LEASE_TTL = float(os.getenv('LEASE_TTL', 15))
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+LOG_FILE = os.getenv('LOG_FILE', 'main.log')
+LOG_JSON = os.getenv('LOG_JSON', '').lower() in ('1', 'true', 'yes')
+TEMPLATES_FILE = os.getenv('TEMPLATES_FILE')
+DIGEST_WINDOW = os.getenv('DIGEST_WINDOW')
+DIGEST_SIZE = int(os.getenv('DIGEST_SIZE', 20))
+BOARD = os.getenv('BOARD', '').lower() in ('1', 'true', 'yes')
+BOARD_DEBOUNCE = float(os.getenv('BOARD_DEBOUNCE', 5))
+COMMANDS = os.getenv('COMMANDS', '').lower() in ('1', 'true', 'yes')
+STATE_FILE = os.getenv('STATE_FILE', 'homework_state.json')
+MAX_IN_FLIGHT = int(os.getenv('MAX_IN_FLIGHT', 64))
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', 8))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', MAX_IN_FLIGHT))
+CONNECT_TIMEOUT = float(os.getenv('CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.getenv('READ_TIMEOUT', 10))
+API_RATE = float(os.getenv('API_RATE', 20))
+BREAKER_THRESHOLD = int(os.getenv('BREAKER_THRESHOLD', 5))
+BREAKER_RECOVERY = float(os.getenv('BREAKER_RECOVERY', 30))
+STARTUP_TIMEOUT = float(os.getenv('STARTUP_TIMEOUT', 10))
+CHECK_REPORT = os.getenv('CHECK_REPORT')
 
 RETRY_PERIOD = 600
-ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
+REVIEWING_PERIOD = int(os.getenv('REVIEWING_PERIOD', 120))
+IDLE_PERIOD = int(os.getenv('IDLE_PERIOD', 1800))
+ENDPOINT = os.getenv(
+    'PRACTICUM_ENDPOINT',
+    'https://practicum.yandex.ru/api/user_api/homework_statuses/'
+)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
 
+HTTP_CLIENT = PooledClient(
+    pool_size=HTTP_POOL_SIZE,
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT
+)
+
 timestamp = int(time.time())
 payload = {'from_date': timestamp}
 
@@ -27,22 +75,9 @@ HOMEWORK_VERDICTS = {
     'reviewing': 'Работа взята на проверку ревьюером.',
     'rejected': 'Работа проверена: у ревьюера есть замечания.'
 }
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    filename='main.log',
-    filemode='w',
-    format='%(asctime)s, %(levelname)s, %(message)s'
-)
+CATALOG = Catalog(HOMEWORK_VERDICTS, TEMPLATES_FILE)
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-handler = RotatingFileHandler('main.log', maxBytes=50000000, backupCount=5)
-logger.addHandler(handler)
-formatter = logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-handler.setFormatter(formatter)
 
 
 def check_tokens():
@@ -62,72 +97,329 @@ def send_message(bot, message):
     logger.debug('Message sent')
 
 
-def get_api_answer(timestamp):
-    """Function for getting api answer."""
+def fetch_homeworks(headers, timestamp):
+    """Function for getting api answer with the given headers."""
     params = {'from_date': timestamp}
     try:
-        homework_data = requests.get(
-            url=ENDPOINT, headers=HEADERS,
-            params=params)
+        with API_LATENCY.time():
+            homework_data = HTTP_CLIENT.get(
+                ENDPOINT, headers=headers, params=params
+            )
+        API_RESPONSES.inc(status=int(homework_data.status_code))
         if homework_data.status_code != HTTPStatus.OK:
-            raise Exception(f'Wrong response {homework_data.status_code}')
-        return homework_data.json()
-    except requests.exceptions.RequestException:
-        raise Exception('Request Exception')
+            raise APIResponseError(
+                homework_data.status_code,
+                parse_retry_after(homework_data.headers.get('Retry-After'))
+            )
+        return response_json(homework_data)
+    except requests.exceptions.RequestException as error:
+        API_ERRORS.inc(type=type(error).__name__)
+        raise APIRequestError('Request Exception') from error
+
+
+def get_api_answer(timestamp):
+    """Function for getting api answer."""
+    return fetch_homeworks(HEADERS, timestamp)
 
 
 def check_response(response):
-    """Function for checking response."""
-    if not isinstance(response, dict):
-        info_message = f'Was expected dict type, {type(response)}'
-        logger.error(info_message)
-        raise TypeError(info_message)
-    homeworks = response.get('homeworks')
-    if not isinstance(homeworks, list):
-        info_message = f'Was expected list type, {type(homeworks)}'
-        logger.error(info_message)
-        raise TypeError(info_message)
+    """Function for checking response; returns its homework records."""
+    try:
+        return parse_response(response, CATALOG.statuses)
+    except ValidationError as error:
+        logger.error(error)
+        raise
 
 
 def parse_status(homework):
     """Function for parsing status."""
-    keys = {'name': homework.get('homework_name'),
-            'status': homework.get('status')}
-    for name, value in keys.items():
-        if not value:
-            info_message = f'No key {name}'
-            logger.error(info_message)
-            raise KeyError(info_message)
-    homework_name = homework.get('homework_name')
-    homework_status = homework.get('status')
-    if homework_status not in HOMEWORK_VERDICTS:
-        raise KeyError('Undefined status homework')
-    if not homework_name:
-        raise KeyError('Name field is empty')
-    result = HOMEWORK_VERDICTS[homework_status]
-    return f'Изменился статус проверки работы "{homework_name}". {result}'
+    try:
+        return CATALOG.render(homework)
+    except ValidationError as error:
+        logger.error(error)
+        raise
+
+
+def make_board(bot, store):
+    """Function for building the status board of the BOARD mode."""
+    from homework_bot.board import StatusBoard
+    from homework_bot.delivery import SendQueue
+
+    def send(chat_id, text):
+        return bot.send_message(chat_id=chat_id, text=text).message_id
+
+    def edit(chat_id, message_id, text):
+        bot.edit_message_text(text, chat_id=chat_id, message_id=message_id)
+
+    def pin(chat_id, message_id):
+        bot.pin_chat_message(chat_id, message_id, disable_notification=True)
+
+    return StatusBoard(
+        store, send, edit, pin, debounce=BOARD_DEBOUNCE,
+        queue=SendQueue(None, workers=SEND_WORKERS)
+    )
+
+
+def make_commands(bot, store, name):
+    """Function for building the command poller of the COMMANDS mode.
+
+    Only one process may call getUpdates, so with WORKERS the first
+    worker answers for every chat from the shared store.
+    """
+    if not COMMANDS or name not in ('engine', 'worker-0'):
+        return None
+    from homework_bot.commands import CommandHandler, CommandPoller
+
+    def get_updates(offset, timeout):
+        return bot.get_updates(
+            offset=offset, timeout=timeout, allowed_updates=['message']
+        )
+
+    return CommandPoller(get_updates, CommandHandler(store))
+
+
+def make_lease(name):
+    """Function for building the lease of a replica if LEASE_FILE is set."""
+    if not LEASE_FILE:
+        return None
+    from homework_bot.lease import Lease, open_lease_backend
+    return Lease(
+        open_lease_backend(LEASE_FILE), f'homework-{name}', ttl=LEASE_TTL
+    )
+
+
+def wait_for_lease(lease):
+    """Function for standing by until this replica holds the lease."""
+    while lease is not None and not lease.renew():
+        holder = lease.backend.holder(lease.name)
+        logger.info(f'Lease {lease.name} is held by {holder}, standing by')
+        time.sleep(lease.interval)
+
+
+def check_shared_store(option):
+    """Function for checking that replicas can share STATE_FILE."""
+    if not str(STATE_FILE).endswith(SQLITE_SUFFIXES):
+        logger.critical(f'{option} needs an SQLite STATE_FILE')
+        exit()
+
+
+def worker_path(path, name):
+    """Function for giving each worker its own copy of a file."""
+    if name == 'engine':
+        return path
+    root, extension = os.path.splitext(path)
+    return f'{root}.{name}{extension}'
+
+
+def validate_tenants(bot, tenants, budget, name='engine'):
+    """Function for probing credentials of tenants; returns valid ones."""
+    import asyncio
+
+    from homework_bot.credentials import (INVALID, CredentialChecker,
+                                          check_bot, log_report,
+                                          write_report)
+
+    if not STARTUP_TIMEOUT:
+        return tenants
+    if check_bot(bot.get_me) == INVALID:
+        exit()
+    start = time.monotonic()
+    checks = asyncio.run(CredentialChecker(
+        fetch_homeworks, bot.get_chat, timeout=STARTUP_TIMEOUT,
+        budget=budget, practicum_in_flight=MAX_IN_FLIGHT,
+        telegram_in_flight=SEND_WORKERS
+    ).check(tenants))
+    log_report(checks, time.monotonic() - start)
+    if CHECK_REPORT:
+        write_report(checks, worker_path(CHECK_REPORT, name))
+    return [check.tenant for check in checks if check.enabled]
+
+
+def run_engine(tenants=None, name='engine', cycles=None):
+    """Function for polling every tenant from TENANTS_FILE."""
+    import asyncio
+
+    from homework_bot.bots import get_bot
+    from homework_bot.breaker import CircuitBreaker
+    from homework_bot.delivery import SendQueue, TokenBucket
+    from homework_bot.engine import PollingEngine
+    from homework_bot.metrics import register_engine
+    from homework_bot.scheduler import AdaptiveSchedule
+
+    if not TELEGRAM_TOKEN:
+        logger.critical('No, token telegram')
+        exit()
+    if LEASE_FILE:
+        check_shared_store('LEASE_FILE')
+    lease = make_lease(name)
+    if cycles is not None and lease is not None and not lease.renew():
+        logger.info(f'Lease {lease.name} is held elsewhere, skipping')
+        return
+    bot = get_bot(
+        TELEGRAM_TOKEN, pool_size=SEND_WORKERS, base_url=TELEGRAM_API_URL
+    )
+    budget = TokenBucket(API_RATE)
+    if tenants is None:
+        tenants = load_tenants(TENANTS_FILE)
+    if cycles is None:
+        # A bounded run polls every token once anyway; probing it first
+        # would only double the requests of every scheduled run.
+        tenants = validate_tenants(bot, tenants, budget, name)
+
+    def send(chat_id, message):
+        bot.send_message(chat_id=chat_id, text=message)
+        logger.debug('Message sent')
+
+    store = open_store(STATE_FILE)
+    engine = PollingEngine(
+        tenants, fetch=fetch_homeworks,
+        check=check_response, parse=parse_status,
+        queue=SendQueue(send, workers=SEND_WORKERS),
+        schedule=AdaptiveSchedule(
+            fast=REVIEWING_PERIOD, normal=RETRY_PERIOD, slow=IDLE_PERIOD
+        ),
+        max_in_flight=MAX_IN_FLIGHT,
+        store=store,
+        catalog=CATALOG,
+        digest_window=None if DIGEST_WINDOW is None else float(DIGEST_WINDOW),
+        digest_size=DIGEST_SIZE,
+        breaker=CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RECOVERY),
+        budget=budget,
+        board=make_board(bot, store) if BOARD else None,
+        lease=lease,
+        commands=make_commands(bot, store, name)
+    )
+    register_engine(engine)
+    asyncio.run(engine.run(cycles))
+
+
+def serve_metrics(port):
+    """Function for serving metrics of a process that polls the API."""
+    start_metrics_server(port)
+    register_http_client(HTTP_CLIENT)
+
+
+def run_worker(name, tenants):
+    """Function for running one shard of tenants in a worker process."""
+    setup_logging(worker_path(LOG_FILE, name), json_format=LOG_JSON)
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT + int(name.rsplit('-', 1)[1]) + 1)
+    run_engine(tenants, name)
+
+
+def run_supervisor():
+    """Function for sharding tenants over WORKERS processes."""
+    from homework_bot.sharding import Supervisor
+
+    check_shared_store('WORKERS')
+    Supervisor(
+        load_tenants(TENANTS_FILE), run_worker, workers=WORKERS,
+        load=lambda: load_tenants(TENANTS_FILE)
+    ).run()
+
+
+def run_tenants():
+    """Function for polling TENANTS_FILE in one or WORKERS processes.
+
+    The supervisor sends no requests, so only the processes that poll
+    export the connection pool.
+    """
+    if WORKERS > 1:
+        if METRICS_PORT:
+            start_metrics_server(METRICS_PORT)
+        run_supervisor()
+        return
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
+    run_engine()
+
+
+def poll_cycle(send, store, cursor_key, from_date, statuses, persist=False):
+    """Function for one poll/diff/send cycle; returns the new cursor.
+
+    With ``persist`` every delivered status is saved as soon as it is
+    sent, so a run that fails halfway does not send it again.
+    """
+    CATALOG.refresh()
+    response = get_api_answer(from_date)
+    for homework in statuses.changes(check_response(response)):
+        send(parse_status(homework))
+        key = statuses.remember(homework)
+        if persist:
+            store.set_status(cursor_key, key, homework.status)
+    from_date = advance_cursor(response, from_date)
+    store.set(cursor_key, from_date)
+    store.flush()
+    return from_date
+
+
+def run_once():
+    """Function for running one cycle and exiting; returns an exit code."""
+    setup_logging(LOG_FILE, json_format=LOG_JSON)
+    if TENANTS_FILE:
+        run_engine(cycles=1)
+        return 0
+    check_tokens()
+    lease = make_lease('classic')
+    if lease is not None:
+        if not lease.renew():
+            logger.info(f'Lease {lease.name} is held elsewhere, skipping')
+            return 0
+        lease.start_heartbeat()
+    store = open_store(STATE_FILE)
+    cursor_key = Tenant(PRACTICUM_TOKEN, TELEGRAM_CHAT_ID).key
+    bots = []
+
+    def send(message):
+        if not bots:
+            from homework_bot.bots import get_bot
+            bots.append(get_bot(TELEGRAM_TOKEN, base_url=TELEGRAM_API_URL))
+        send_message(bots[0], message)
+
+    try:
+        poll_cycle(
+            send, store, cursor_key, store.get(cursor_key, timestamp),
+            StatusIndex(store.statuses(cursor_key)), persist=True
+        )
+    except Exception as error:
+        logger.error(f'Error during single cycle: {error}')
+        return 1
+    finally:
+        store.close()
+        if lease is not None:
+            lease.release()
+    return 0
 
 
 def main():
     """Main function."""
+    from telegram import Bot, TelegramError
+
+    setup_logging(LOG_FILE, json_format=LOG_JSON)
+    if TENANTS_FILE:
+        run_tenants()
+        return
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
     check_tokens()
-    previous_status = []
+    lease = make_lease('classic')
+    wait_for_lease(lease)
+    if lease is not None:
+        lease.start_heartbeat()
+    store = open_store(STATE_FILE)
+    cursor_key = Tenant(PRACTICUM_TOKEN, TELEGRAM_CHAT_ID).key
+    from_date = store.get(cursor_key, timestamp)
+    statuses = StatusIndex()
+    bot = Bot(token=TELEGRAM_TOKEN)
     while True:
         try:
-            response = get_api_answer(timestamp)
-            check_response(response)
-            homeworks_list = response['homeworks']
-            if homeworks_list:
-                homework, *_ = homeworks_list
-                status_homework = parse_status(homework)
-                if status_homework != previous_status:
-                    bot = Bot(token=TELEGRAM_TOKEN)
-                    send_message(bot, status_homework)
-                    bot.send_message(
-                        chat_id=TELEGRAM_CHAT_ID,
-                        text=status_homework)
-                    logger.debug('Message was sent second time')
-                    previous_status = homeworks_list
+            if lease is not None and not lease.held:
+                logger.critical(f'Lease {lease.name} is lost')
+                exit()
+            from_date = poll_cycle(
+                lambda message: send_message(bot, message),
+                store, cursor_key, from_date, statuses
+            )
         except TelegramError as e:
             logger.error(f'Error {e}')
         except Exception as error:
@@ -136,5 +428,17 @@ def main():
         time.sleep(RETRY_PERIOD)
 
 
+def parse_args(args=None):
+    """Function for parsing command line arguments."""
+    parser = argparse.ArgumentParser(description='Homework status bot.')
+    parser.add_argument(
+        '--once', action='store_true',
+        help='run one poll/diff/send cycle, save the state and exit'
+    )
+    return parser.parse_args(args)
+
+
 if __name__ == '__main__':
+    if parse_args().once:
+        sys.exit(run_once())
     main()
@@ -0,0 +1 @@
+"""Multi-tenant polling engine for the homework bot."""
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+
+from telegram.error import BadRequest, TelegramError
+
+from homework_bot.delivery import DROPPED, SendQueue
+from homework_bot.digest import MESSAGE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE = 5
+ELLIPSIS = '…'
+NOT_MODIFIED = 'message is not modified'
+GONE = ('message to edit not found', "message can't be edited")
+
+
+def render_board(lines, limit=MESSAGE_LIMIT):
+    """Join board lines, dropping the oldest ones that do not fit."""
+    texts = list(lines.values())
+    text = '\n'.join(texts)
+    while len(text) > limit and len(texts) > 1:
+        texts.pop(0)
+        text = '\n'.join([ELLIPSIS] + texts)
+    return text[:limit]
+
+
+class StatusBoard:
+    """One message per chat that shows every homework and is edited.
+
+    ``update`` replaces the line of one homework in the store. The
+    board of a chat is rewritten at most once per ``debounce`` seconds
+    however many lines changed, and a chat is queued once at a time.
+    The text is taken from the store when the edit is sent, so queued
+    edits always show the latest lines.
+
+    ``send(chat_id, text)`` returns the id of the new message,
+    ``edit(chat_id, message_id, text)`` rewrites it and the optional
+    ``pin(chat_id, message_id)`` pins it. All three are blocking and run
+    through ``queue`` (a ``SendQueue``), which limits the rate and
+    retries, and a board it gave up on for transient reasons is
+    scheduled again. A board that was deleted or cannot be edited is
+    sent again as a new message.
+    """
+
+    def __init__(self, store, send, edit, pin=None, debounce=DEBOUNCE,
+                 queue=None):
+        self.store = store
+        self.send = send
+        self.edit = edit
+        self.pin = pin
+        self.debounce = debounce
+        self.queue = queue or SendQueue(None)
+        self.queue.send = self._sync
+        self.queue.on_done = self._synced
+        self.scheduled = set()
+        self.edits = 0
+        self.sends = 0
+        self._idle = None
+
+    def start(self):
+        """Start the delivery queue on the running loop."""
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.queue.start()
+
+    async def join(self):
+        """Wait until every scheduled board is shown."""
+        await self._idle.wait()
+
+    async def stop(self):
+        """Stop the delivery queue."""
+        await self.queue.stop()
+
+    def update(self, chat_id, key, text):
+        """Replace the line ``key`` of a chat board and schedule an edit."""
+        self.store.set_board_lines(chat_id, {key: text})
+        self._schedule(str(chat_id))
+
+    def resync(self, chat_ids):
+        """Schedule boards whose stored text is behind their lines."""
+        for chat_id in chat_ids:
+            _, lines, shown = self.store.board(chat_id)
+            if lines and render_board(lines) != shown:
+                self._schedule(str(chat_id))
+
+    def _schedule(self, chat_id):
+        """Queue a chat once ``debounce`` seconds from now."""
+        if chat_id in self.scheduled:
+            return
+        self.scheduled.add(chat_id)
+        self._idle.clear()
+        asyncio.get_running_loop().call_later(
+            self.debounce, self.queue.put, chat_id, '', chat_id
+        )
+
+    def _synced(self, chat_id, outcome):
+        """Reschedule a board that changed while it was being sent."""
+        self.scheduled.discard(chat_id)
+        _, lines, shown = self.store.board(chat_id)
+        if outcome != DROPPED and render_board(lines) != shown:
+            self._schedule(chat_id)
+        elif not self.scheduled:
+            self._idle.set()
+
+    def _sync(self, chat_id, _):
+        """Show the current lines of a chat, editing the board if any."""
+        message_id, lines, _ = self.store.board(chat_id)
+        text = render_board(lines)
+        if message_id is not None:
+            try:
+                self.edit(chat_id, message_id, text)
+                self.edits += 1
+            except BadRequest as error:
+                reason = str(error).lower()
+                if reason.startswith(GONE):
+                    message_id = None
+                elif not reason.startswith(NOT_MODIFIED):
+                    raise
+        if message_id is None:
+            message_id = self.send(chat_id, text)
+            self.sends += 1
+            self._pin(chat_id, message_id)
+        self.store.set_board_message(chat_id, message_id, text)
+
+    def _pin(self, chat_id, message_id):
+        """Pin a new board; chats without the right keep it unpinned."""
+        if self.pin is None:
+            return
+        try:
+            self.pin(chat_id, message_id)
+        except TelegramError as error:
+            logger.warning(f'Cannot pin the board of chat {chat_id}: {error}')
@@ -0,0 +1,34 @@
+import threading
+
+from telegram import Bot
+from telegram.utils.request import Request
+
+BOT_POOL_SIZE = 8
+
+_bots = {}
+_lock = threading.Lock()
+
+
+def get_bot(token, pool_size=BOT_POOL_SIZE, base_url=None):
+    """Return the process-wide bot of a token, creating it once.
+
+    The bot owns a connection pool of ``pool_size`` connections, so it
+    can be shared by that many concurrent delivery workers. ``base_url``
+    points the bot at another Bot API server.
+    """
+    with _lock:
+        bot = _bots.get((token, base_url))
+        if bot is None:
+            bot = _bots[(token, base_url)] = Bot(
+                token=token, base_url=base_url,
+                request=Request(con_pool_size=pool_size)
+            )
+        return bot
+
+
+def close_bots():
+    """Forget every bot and close its connections."""
+    with _lock:
+        for bot in _bots.values():
+            bot.request.stop()
+        _bots.clear()
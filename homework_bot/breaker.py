@@ -0,0 +1,99 @@
+import logging
+import time
+
+from homework_bot.errors import CircuitOpen
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+STATES = (CLOSED, HALF_OPEN, OPEN)
+
+FAILURE_THRESHOLD = 5
+RECOVERY_TIME = 30
+MAX_RECOVERY_TIME = 600
+HALF_OPEN_CALLS = 1
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Closed, open and half-open circuit breaker for one upstream.
+
+    ``failure_threshold`` outages in a row open the circuit and every
+    call is refused for ``recovery_time`` seconds. Then up to
+    ``half_open_calls`` probes are let through: a success closes the
+    circuit, a failure opens it again for twice as long, up to
+    ``max_recovery_time``.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD,
+                 recovery_time=RECOVERY_TIME,
+                 max_recovery_time=MAX_RECOVERY_TIME,
+                 half_open_calls=HALF_OPEN_CALLS, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.max_recovery_time = max_recovery_time
+        self.half_open_calls = half_open_calls
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opens = 0
+        self.opened_at = 0.0
+        self.cooldown = recovery_time
+        self.probes = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Raise ``CircuitOpen`` if the call must be shed."""
+        if self.state == OPEN:
+            wait = self.opened_at + self.cooldown - self.clock()
+            if wait > 0:
+                self.rejected += 1
+                raise CircuitOpen(wait)
+            self.state = HALF_OPEN
+            self.probes = 0
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpen(self.recovery_time)
+            self.probes += 1
+
+    def recheck(self):
+        """Raise ``CircuitOpen`` if the circuit opened after admission.
+
+        Unlike ``before_call`` it takes no half-open probe, so a call
+        that waited, e.g. for the request budget, can check again.
+        """
+        if self.state != OPEN:
+            return
+        wait = self.opened_at + self.cooldown - self.clock()
+        if wait > 0:
+            self.rejected += 1
+            raise CircuitOpen(wait)
+
+    def record_success(self):
+        """Close the circuit after a healthy answer."""
+        if self.state != CLOSED:
+            logger.info('Practicum API recovered, circuit closed')
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = self.recovery_time
+
+    def record_failure(self):
+        """Count an outage and open the circuit when needed."""
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, self.max_recovery_time)
+            self._open()
+        elif self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        """Start refusing calls."""
+        self.state = OPEN
+        self.opens += 1
+        self.opened_at = self.clock()
+        logger.warning(
+            f'Practicum API is failing, circuit opened for '
+            f'{self.cooldown:.0f} s'
+        )
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+
+from homework_bot.board import render_board
+
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 30
+ERROR_DELAY = 5
+HISTORY_LIMIT = 10
+TIME_FORMAT = '%d.%m %H:%M'
+
+HELP = (
+    'Команды:\n'
+    '/status — текущие статусы работ\n'
+    '/history — последние изменения статусов\n'
+    '/pause — приостановить уведомления\n'
+    '/resume — возобновить уведомления'
+)
+NO_STATUS = 'Статусы работ пока неизвестны.'
+NO_HISTORY = 'Изменений статусов пока не было.'
+PAUSED = 'Уведомления приостановлены. /resume — возобновить.'
+RESUMED = 'Уведомления возобновлены.'
+
+
+def parse_command(text):
+    """Return the command of a message, e.g. ``status``, or ``None``.
+
+    ``/status@some_bot`` and arguments after the command are accepted.
+    """
+    if not text or not text.startswith('/'):
+        return None
+    return text.split(maxsplit=1)[0][1:].split('@', 1)[0].lower()
+
+
+class CommandHandler:
+    """Answers bot commands from the state store alone.
+
+    Statuses come from the status lines the poller keeps for every chat
+    and history from the transitions it recorded, so no command ever
+    reaches the Practicum API. ``/pause`` sets a flag in the store that
+    the poller checks before queueing a notification.
+    """
+
+    def __init__(self, store, history_limit=HISTORY_LIMIT):
+        self.store = store
+        self.history_limit = history_limit
+        self.handlers = {
+            'status': self.status,
+            'history': self.history,
+            'pause': self.pause,
+            'resume': self.resume,
+            'start': self.help,
+            'help': self.help,
+        }
+
+    def handle(self, chat_id, text):
+        """Return the reply to a message, or ``None`` to stay silent."""
+        handler = self.handlers.get(parse_command(text))
+        if handler is None:
+            return None
+        return handler(str(chat_id))
+
+    def status(self, chat_id):
+        """Current line of every homework of the chat."""
+        lines = self.store.status_lines(chat_id)
+        return render_board(lines) if lines else NO_STATUS
+
+    def history(self, chat_id):
+        """Latest transitions of the chat, oldest first."""
+        events = self.store.history(chat_id, self.history_limit)
+        if not events:
+            return NO_HISTORY
+        return render_board({
+            index: f'{time.strftime(TIME_FORMAT, time.localtime(at))} {text}'
+            for index, (at, text) in enumerate(reversed(events))
+        })
+
+    def pause(self, chat_id):
+        """Stop notifications to the chat."""
+        self.store.set_paused(chat_id, True)
+        return PAUSED
+
+    def resume(self, chat_id):
+        """Start notifications to the chat again."""
+        self.store.set_paused(chat_id, False)
+        return RESUMED
+
+    def help(self, chat_id):
+        """List the commands."""
+        return HELP
+
+
+class CommandPoller:
+    """Long-polls ``getUpdates`` and answers commands.
+
+    ``get_updates(offset, timeout)`` is blocking and returns updates
+    with ``update_id`` and ``message`` (``chat_id`` and ``text``); it
+    runs in the default executor. Only one process may poll a bot
+    token, so ``active()`` tells whether this one should, e.g. while
+    it holds the lease. Replies go to ``reply(chat_id, text)``.
+    """
+
+    def __init__(self, get_updates, handler, timeout=POLL_TIMEOUT,
+                 error_delay=ERROR_DELAY):
+        self.get_updates = get_updates
+        self.handler = handler
+        self.timeout = timeout
+        self.error_delay = error_delay
+        self.offset = None
+        self.answered = 0
+
+    def _answer(self, updates, reply):
+        """Reply to the commands among updates and confirm them all."""
+        for update in updates:
+            self.offset = update.update_id + 1
+            message = update.message
+            if message is None:
+                continue
+            try:
+                text = self.handler.handle(message.chat_id, message.text)
+            except Exception as error:
+                logger.error(f'Error answering chat {message.chat_id}: '
+                             f'{error}')
+                continue
+            if text is not None:
+                reply(message.chat_id, text)
+                self.answered += 1
+
+    async def run(self, reply, active=lambda: True):
+        """Answer commands forever."""
+        loop = asyncio.get_running_loop()
+        while True:
+            if not active():
+                await asyncio.sleep(self.error_delay)
+                continue
+            try:
+                updates = await loop.run_in_executor(
+                    None, self.get_updates, self.offset, self.timeout
+                )
+            except Exception as error:
+                logger.warning(f'Error getting updates: {error}')
+                await asyncio.sleep(self.error_delay)
+                continue
+            self._answer(updates, reply)
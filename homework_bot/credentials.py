@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http import HTTPStatus
+
+from telegram.error import BadRequest, InvalidToken, Unauthorized
+
+from homework_bot.errors import APIResponseError
+
+logger = logging.getLogger(__name__)
+
+OK = 'ok'
+INVALID = 'invalid'
+UNKNOWN = 'unknown'
+TIMEOUT = 10
+PRACTICUM_IN_FLIGHT = 64
+TELEGRAM_IN_FLIGHT = 8
+REJECTED_STATUSES = frozenset({HTTPStatus.UNAUTHORIZED, HTTPStatus.FORBIDDEN})
+
+
+@dataclass
+class TenantCheck:
+    """Startup verdicts on the credentials of one tenant."""
+
+    tenant: object
+    practicum: str = UNKNOWN
+    telegram: str = UNKNOWN
+    error: str = ''
+
+    @property
+    def enabled(self):
+        """Whether the tenant is polled; unverified ones are."""
+        return INVALID not in (self.practicum, self.telegram)
+
+    def as_dict(self):
+        """Report row that does not expose the token."""
+        return {
+            'tenant': self.tenant.key, 'chat_id': self.tenant.chat_id,
+            'practicum': self.practicum, 'telegram': self.telegram,
+            'enabled': self.enabled, 'error': self.error,
+        }
+
+
+def practicum_verdict(error):
+    """Verdict on a token from the error of its probe."""
+    if error is None:
+        return OK
+    if (isinstance(error, APIResponseError)
+            and error.status in REJECTED_STATUSES):
+        return INVALID
+    return UNKNOWN
+
+
+def telegram_verdict(error):
+    """Verdict on a chat from the error of ``getChat``.
+
+    A missing chat or a bot that was blocked or kicked cannot deliver;
+    network trouble and throttling say nothing about the chat.
+    """
+    if error is None:
+        return OK
+    if isinstance(error, (BadRequest, Unauthorized)) and not isinstance(
+        error, InvalidToken
+    ):
+        return INVALID
+    return UNKNOWN
+
+
+def check_bot(get_me):
+    """Call ``getMe``; return ``INVALID`` only for a rejected bot token."""
+    try:
+        get_me()
+    except (InvalidToken, Unauthorized) as error:
+        logger.critical(f'Telegram rejected the bot token: {error}')
+        return INVALID
+    except Exception as error:
+        logger.warning(f'Cannot verify the bot token: {error}')
+        return UNKNOWN
+    return OK
+
+
+class CredentialChecker:
+    """Probes the credentials of every tenant at once before polling.
+
+    ``fetch(headers, timestamp)`` asks the Practicum API for nothing new
+    once per token and ``get_chat(chat_id)`` checks once per chat that
+    the bot can still write to it. Both are blocking and run in a thread
+    pool, at most ``practicum_in_flight`` and ``telegram_in_flight`` at a
+    time; a ``budget`` (a ``TokenBucket``) also paces the Practicum
+    probes. Whatever is not answered within ``timeout`` seconds stays
+    ``UNKNOWN``, so startup takes at most that long.
+    """
+
+    def __init__(self, fetch, get_chat, timeout=TIMEOUT, budget=None,
+                 practicum_in_flight=PRACTICUM_IN_FLIGHT,
+                 telegram_in_flight=TELEGRAM_IN_FLIGHT):
+        self.fetch = fetch
+        self.get_chat = get_chat
+        self.timeout = timeout
+        self.budget = budget
+        self.practicum_in_flight = practicum_in_flight
+        self.telegram_in_flight = telegram_in_flight
+        self._executor = None
+
+    async def _probe(self, semaphore, func, *args):
+        """Run a blocking probe; return the error it raised or ``None``."""
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            try:
+                await loop.run_in_executor(self._executor, func, *args)
+            except Exception as error:
+                return error
+        return None
+
+    async def _check_token(self, semaphore, checks):
+        """Probe one token and give the verdict to all of its chats."""
+        if self.budget is not None:
+            await self.budget.acquire()
+        error = await self._probe(
+            semaphore, self.fetch, checks[0].tenant.headers, int(time.time())
+        )
+        for check in checks:
+            check.practicum = practicum_verdict(error)
+            if error is not None:
+                check.error = str(error)
+
+    async def _check_chat(self, semaphore, checks):
+        """Probe one chat and give the verdict to all of its tenants."""
+        error = await self._probe(
+            semaphore, self.get_chat, checks[0].tenant.chat_id
+        )
+        for check in checks:
+            check.telegram = telegram_verdict(error)
+            if error is not None and not check.error:
+                check.error = str(error)
+
+    async def check(self, tenants):
+        """Return a ``TenantCheck`` of every tenant, in order."""
+        checks = [TenantCheck(tenant) for tenant in tenants]
+        tokens, chats = {}, {}
+        for check in checks:
+            tokens.setdefault(check.tenant.token_key, []).append(check)
+            chats.setdefault(check.tenant.chat_id, []).append(check)
+        practicum = asyncio.Semaphore(self.practicum_in_flight)
+        telegram = asyncio.Semaphore(self.telegram_in_flight)
+        self._executor = ThreadPoolExecutor(
+            self.practicum_in_flight + self.telegram_in_flight
+        )
+        tasks = [
+            asyncio.ensure_future(self._check_token(practicum, group))
+            for group in tokens.values()
+        ] + [
+            asyncio.ensure_future(self._check_chat(telegram, group))
+            for group in chats.values()
+        ]
+        try:
+            if tasks:
+                await asyncio.wait(tasks, timeout=self.timeout)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        return checks
+
+
+def log_report(checks, elapsed):
+    """Log disabled tenants and a summary of the startup checks."""
+    for check in checks:
+        if not check.enabled:
+            logger.warning(
+                f'Tenant {check.tenant.key} disabled: practicum '
+                f'{check.practicum}, telegram {check.telegram}: {check.error}'
+            )
+    enabled = sum(check.enabled for check in checks)
+    verified = sum(
+        check.practicum == OK and check.telegram == OK for check in checks
+    )
+    logger.info(
+        f'Checked {len(checks)} tenants in {elapsed:.1f} s: '
+        f'{verified} verified, {enabled - verified} unverified, '
+        f'{len(checks) - enabled} disabled'
+    )
+
+
+def write_report(checks, path):
+    """Write the per-tenant report as a JSON list."""
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump([check.as_dict() for check in checks], file, indent=2)
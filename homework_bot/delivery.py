@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+from homework_bot.metrics import SEND_ERRORS, SEND_LATENCY, SEND_WAIT
+
+logger = logging.getLogger(__name__)
+
+CHAT_RATE = 1
+GLOBAL_RATE = 30
+SEND_WORKERS = 8
+MAX_ATTEMPTS = 5
+BACKOFF = 1
+MAX_WAIT = 30
+
+ALERT = 'alert'
+VERDICT = 'verdict'
+NOTICE = 'notice'
+LANES = (ALERT, VERDICT, NOTICE)
+NOTICE_STATUSES = frozenset({'reviewing'})
+
+SENT = 'sent'
+DROPPED = 'dropped'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class TokenBucket:
+    """Token bucket refilled with ``rate`` tokens per second.
+
+    ``acquire`` serves waiters one at a time in arrival order: only the
+    head of the line sleeps, so a burst of callers does not wake up
+    together to race for the same token.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._loop = None
+        self._line = None
+
+    def pause(self, seconds):
+        """Hand out no tokens for ``seconds``, e.g. after a 429."""
+        self.paused_until = max(
+            self.paused_until, time.monotonic() + seconds
+        )
+
+    def take(self):
+        """Take a token; return seconds to wait if there is none yet."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def _waiters(self):
+        """Lock that queues waiters of the running loop in order."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._line = loop, asyncio.Lock()
+        return self._line
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self._waiters():
+            delay = self.take()
+            while delay:
+                await asyncio.sleep(delay)
+                delay = self.take()
+
+
+def status_lane(status):
+    """Lane of a transition: final verdicts go before notices."""
+    return NOTICE if status in NOTICE_STATUSES else VERDICT
+
+
+def is_transient(error):
+    """Tell whether a Telegram error is worth retrying."""
+    return isinstance(error, NetworkError) and not isinstance(
+        error, BadRequest
+    )
+
+
+class SendQueue:
+    """Outbound Telegram queue that never blocks the poller.
+
+    ``put`` only appends to a per-chat queue. Workers deliver messages
+    of one chat in order, at most ``chat_rate`` per second per chat and
+    ``global_rate`` per second in total. ``RetryAfter`` is honoured and
+    transient errors are retried with exponential backoff.
+    ``send(chat_id, message)`` is blocking and runs in a thread pool.
+    For messages queued with an id, ``on_done(message_id, outcome)`` is
+    called once they are done: ``SENT``, ``DROPPED`` after a permanent
+    error such as a blocked chat, or ``FAILED`` when transient errors
+    used up every attempt and the message is worth sending later.
+    While ``active()`` is false, e.g. after this replica lost its lease,
+    nothing is sent: queued messages are skipped with ``SKIPPED``.
+
+    Every message is put in one of ``LANES``: alerts first, then final
+    verdicts, then ``reviewing`` notices. A chat waits for a worker in
+    the lane of its oldest message, so the order inside a chat is kept.
+    Workers take the most urgent lane, unless the head of some lane has
+    waited ``max_wait`` seconds; the longest waiting of those goes
+    first, so no lane starves.
+    """
+
+    def __init__(self, send, workers=SEND_WORKERS, chat_rate=CHAT_RATE,
+                 global_rate=GLOBAL_RATE, max_attempts=MAX_ATTEMPTS,
+                 backoff=BACKOFF, on_done=None, max_wait=MAX_WAIT,
+                 active=None):
+        self.send = send
+        self.on_done = on_done
+        self.active = active
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.global_bucket = TokenBucket(global_rate)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.chat_buckets = {}
+        self.pending = {}
+        self.lanes = {lane: deque() for lane in LANES}
+        self.lane_sizes = dict.fromkeys(LANES, 0)
+        self.size = 0
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self._ready = None
+        self._drained = None
+        self._tasks = []
+        self._executor = None
+
+    def put(self, chat_id, message, message_id=None, lane=VERDICT):
+        """Queue a message for a chat in a delivery lane."""
+        entry = (message, message_id, lane, time.monotonic())
+        self.lane_sizes[lane] += 1
+        self.size += 1
+        self._drained.clear()
+        messages = self.pending.get(chat_id)
+        if messages is None:
+            self.pending[chat_id] = deque([entry])
+            self._push(chat_id)
+        else:
+            messages.append(entry)
+
+    def _push(self, chat_id):
+        """Make a chat ready in the lane of its oldest message."""
+        lane = self.pending[chat_id][0][2]
+        self.lanes[lane].append((chat_id, time.monotonic()))
+        self._ready.put_nowait(None)
+
+    def _pick(self):
+        """Take the next ready chat, most urgent lane first."""
+        now = time.monotonic()
+        waiting = [lane for lane in LANES if self.lanes[lane]]
+        starving = [
+            lane for lane in waiting
+            if now - self.lanes[lane][0][1] >= self.max_wait
+        ]
+        if starving:
+            lane = min(starving, key=lambda lane: self.lanes[lane][0][1])
+        else:
+            lane = waiting[0]
+        return self.lanes[lane].popleft()[0]
+
+    async def _deliver(self, chat_id, message):
+        """Send one message, retrying transient failures; return outcome."""
+        loop = asyncio.get_running_loop()
+        for attempt in range(1, self.max_attempts + 1):
+            await self.global_bucket.acquire()
+            if not self._may_send():
+                return SKIPPED
+            try:
+                with SEND_LATENCY.time():
+                    await loop.run_in_executor(
+                        self._executor, self.send, chat_id, message
+                    )
+                return SENT
+            except RetryAfter as error:
+                SEND_ERRORS.inc(type=type(error).__name__)
+                delay = error.retry_after
+            except TelegramError as error:
+                SEND_ERRORS.inc(type=type(error).__name__)
+                if not is_transient(error):
+                    logger.error(f'Error sending to chat {chat_id}: {error}')
+                    return DROPPED
+                delay = self.backoff * 2 ** (attempt - 1)
+            logger.warning(f'Retrying chat {chat_id} in {delay} s')
+            await asyncio.sleep(delay)
+        logger.error(f'Gave up sending to chat {chat_id}')
+        return FAILED
+
+    def _may_send(self):
+        """Whether messages may go out now."""
+        return self.active is None or self.active()
+
+    def _finish(self, chat_id, message_id, outcome):
+        """Count the outcome of the head message of a chat and drop it."""
+        if outcome == SENT:
+            self.sent += 1
+        elif outcome == SKIPPED:
+            self.skipped += 1
+        else:
+            self.failed += 1
+        self._done(chat_id)
+        if self.on_done is not None and message_id is not None:
+            self.on_done(message_id, outcome)
+
+    def _done(self, chat_id):
+        """Drop the head message of a chat and schedule the next one."""
+        messages = self.pending[chat_id]
+        _, _, lane, queued = messages.popleft()
+        SEND_WAIT.observe(time.monotonic() - queued, lane=lane)
+        self.lane_sizes[lane] -= 1
+        self.size -= 1
+        if messages:
+            self._push(chat_id)
+        else:
+            del self.pending[chat_id]
+            if not self.pending:
+                self._drained.set()
+
+    async def _worker(self):
+        """Deliver messages of ready chats forever."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.get()
+            chat_id = self._pick()
+            message, message_id, _, _ = self.pending[chat_id][0]
+            if not self._may_send():
+                self._finish(chat_id, message_id, SKIPPED)
+                continue
+            bucket = self.chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self.chat_buckets[chat_id] = TokenBucket(
+                    self.chat_rate, capacity=1
+                )
+            delay = bucket.take()
+            if delay:
+                loop.call_later(delay, self._push, chat_id)
+                continue
+            try:
+                outcome = await self._deliver(chat_id, message)
+            except Exception as error:
+                logger.error(f'Error sending to chat {chat_id}: {error}')
+                outcome = DROPPED
+            self._finish(chat_id, message_id, outcome)
+
+    def start(self):
+        """Start the delivery workers on the running loop."""
+        self._ready = asyncio.Queue()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._executor = ThreadPoolExecutor(self.workers)
+        self._tasks = [
+            asyncio.ensure_future(self._worker())
+            for _ in range(self.workers)
+        ]
+
+    async def join(self):
+        """Wait until every queued message is delivered or dropped."""
+        await self._drained.wait()
+
+    async def stop(self):
+        """Stop the workers."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,29 @@
+class StatusIndex:
+    """Last delivered status of every homework of one tenant.
+
+    Works on the ``Homework`` records returned by ``check_response``.
+    """
+
+    def __init__(self, statuses=None):
+        self.statuses = dict(statuses or {})
+
+    def changes(self, homeworks):
+        """Return homeworks whose status differs from the known one.
+
+        The API lists the newest homework first, so the response is read
+        backwards and only the newest entry of every homework is kept.
+        The index itself is not touched until ``remember`` is called.
+        """
+        latest = {}
+        for homework in reversed(homeworks):
+            latest[homework.key] = homework
+        return [
+            homework for key, homework in latest.items()
+            if self.statuses.get(key) != homework.status
+        ]
+
+    def remember(self, homework):
+        """Mark the status of a homework as delivered; return its key."""
+        key = homework.key
+        self.statuses[key] = homework.status
+        return key
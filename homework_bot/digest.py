@@ -0,0 +1,50 @@
+MESSAGE_LIMIT = 4096
+MAX_ITEMS = 20
+SEPARATOR = '\n\n'
+
+
+def split_text(text, limit=MESSAGE_LIMIT):
+    """Cut a text into parts of at most ``limit`` characters.
+
+    Parts end on a line break when there is one in the second half of
+    the part, otherwise the text is cut at the limit.
+    """
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind('\n', limit // 2, limit + 1)
+        if cut == -1:
+            parts.append(text[:limit])
+            text = text[limit:]
+        else:
+            parts.append(text[:cut])
+            text = text[cut + 1:]
+    parts.append(text)
+    return parts
+
+
+def build_digests(messages, limit=MESSAGE_LIMIT, max_items=MAX_ITEMS):
+    """Merge ``(message_id, text)`` pairs of one chat into few messages.
+
+    Returns ``(message_ids, text)`` pairs in the original order. A digest
+    holds at most ``max_items`` messages and ``limit`` characters; a
+    single message longer than that is split, and only its last part
+    carries its id, so it is marked sent once it is fully delivered.
+    """
+    digests = []
+    ids, texts, size = [], [], 0
+    for message_id, text in messages:
+        extra = len(text) + (len(SEPARATOR) if texts else 0)
+        if texts and (len(texts) >= max_items or size + extra > limit):
+            digests.append((tuple(ids), SEPARATOR.join(texts)))
+            ids, texts, size = [], [], 0
+            extra = len(text)
+        if len(text) > limit:
+            *heads, text = split_text(text, limit)
+            digests.extend(((), head) for head in heads)
+            extra = len(text)
+        ids.append(message_id)
+        texts.append(text)
+        size += extra
+    if texts:
+        digests.append((tuple(ids), SEPARATOR.join(texts)))
+    return digests
@@ -0,0 +1,451 @@
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+
+from homework_bot.breaker import CircuitBreaker
+from homework_bot.delivery import (ALERT, FAILED, LANES, SKIPPED, VERDICT,
+                                   TokenBucket, status_lane)
+from homework_bot.diff import StatusIndex
+from homework_bot.digest import MAX_ITEMS, build_digests
+from homework_bot.errors import APIResponseError, CircuitOpen, is_outage
+from homework_bot.scheduler import AdaptiveSchedule
+from homework_bot.state import StateStore, advance_cursor
+from homework_bot.timing_wheel import TICK, LagMonitor, TimingWheel
+
+logger = logging.getLogger(__name__)
+
+MAX_IN_FLIGHT = 64
+FLUSH_INTERVAL = 1
+API_RATE = 20
+RATE_LIMIT_PAUSE = 60
+
+
+@dataclass
+class TenantState:
+    """Polling state owned by exactly one tenant."""
+
+    timestamp: int = 0
+    statuses: StatusIndex = field(default_factory=StatusIndex)
+    errors: int = 0
+    idle_polls: int = 0
+    polls: int = 0
+
+
+def transition_id(tenant, key, homework):
+    """Idempotency key of one status transition of one homework."""
+    date_updated = homework.date_updated
+    return ':'.join((
+        tenant.key, key, homework.status,
+        '' if date_updated is None else str(date_updated)
+    ))
+
+
+class PollingEngine:
+    """Polls every tenant from a single asyncio loop.
+
+    ``fetch(headers, timestamp)`` is a blocking call and runs in a thread
+    pool; ``check`` (which returns the ``Homework`` records of a response)
+    and ``parse`` are the validators from ``homework.py``.
+    Transitions go to the outbox of ``store`` together with the new
+    statuses and cursor. Once that batch is flushed they are handed to
+    ``queue`` (a ``SendQueue``) and marked sent when delivered; pending
+    messages are replayed on start. Polling never waits for Telegram.
+    Chats following the same token form one subscription that is
+    fetched once per cycle. Each subscription is polled on its own
+    cadence chosen by ``schedule`` and kept on a hierarchical
+    ``TimingWheel``, so one timer task serves every tenant;
+    ``loop_lag`` tracks how late that task wakes up. At most
+    ``max_in_flight`` requests run at any time. The store is flushed
+    every ``FLUSH_INTERVAL`` seconds. With a ``catalog`` (a
+    ``templates.Catalog``) messages are rendered in the locale of each
+    chat instead of by ``parse``, and the catalog is refreshed on every
+    flush so edits of its file apply without a restart.
+
+    With ``digest_window`` set, the pending messages of a chat are
+    merged into digests of at most ``digest_size`` transitions: ``0``
+    merges what one poll found, a positive window also waits that many
+    seconds after the first held message for more to come.
+
+    With a ``board`` (a ``StatusBoard``) transitions skip the outbox and
+    update one line per homework of the status board of each chat.
+
+    Every transition is also kept as the status line of its homework
+    and in the history of the chat, even with a board. Paused chats
+    get no messages. With ``commands`` (a ``commands.CommandPoller``)
+    the engine answers ``/status``, ``/history`` and ``/pause`` from
+    the store, in the ``alert`` lane.
+
+    With a ``lease`` (a ``lease.Lease``) the engine polls and sends only
+    while it holds the lease and is a hot standby otherwise: tenants
+    stay loaded and the timers keep running. On taking the lease over
+    it reloads their state from the shared store and replays the
+    outbox. The send queue checks the lease before every message, so a
+    replica that lost it skips its backlog and leaves it unsent in the
+    store for the new holder.
+
+    Every request to the API goes through one ``breaker`` and takes a
+    token from one ``budget`` (a ``TokenBucket``), so all tenants
+    together stay under a request rate. A 429 pauses the budget for
+    ``Retry-After`` seconds; while the breaker is open polls are shed
+    and spread over its recovery window instead of counted as errors.
+    """
+
+    def __init__(self, tenants, fetch, check, parse, queue,
+                 schedule=None, max_in_flight=MAX_IN_FLIGHT, store=None,
+                 tick=TICK, breaker=None, budget=None, catalog=None,
+                 digest_window=None, digest_size=MAX_ITEMS, board=None,
+                 lease=None, commands=None):
+        self.tenants = list(tenants)
+        self.store = store or StateStore()
+        self.lease = lease
+        self.commands = commands
+        self.states = self._load_states()
+        self.fetch = fetch
+        self.check = check
+        self.parse = parse
+        self.catalog = catalog
+        self.queue = queue
+        self.queue.on_done = self._delivered
+        self.queue.active = self._active
+        self._outbox = set()
+        self._settling = set()
+        self._message_lanes = {}
+        self.digest_window = digest_window
+        self.digest_size = digest_size
+        self._held = {}
+        self.board = board
+        self.schedule = schedule or AdaptiveSchedule()
+        self.subscriptions = {}
+        for tenant in self.tenants:
+            self.subscriptions.setdefault(tenant.token_key, []).append(tenant)
+        self.fetches_saved = 0
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or TokenBucket(API_RATE)
+        self.wheel = TimingWheel(tick)
+        self.loop_lag = LagMonitor()
+        self._tasks = set()
+        self._cycles = None
+        self._remaining = 0
+        self._finished = None
+        self.max_in_flight = max_in_flight
+        self._executor = None
+        self._semaphore = None
+
+    def _load_states(self):
+        """Read cursors and statuses of every tenant from the store."""
+        now = int(time.time())
+        return {
+            tenant.key: TenantState(
+                self.store.get(tenant.key, now),
+                StatusIndex(self.store.statuses(tenant.key))
+            )
+            for tenant in self.tenants
+        }
+
+    def _active(self):
+        """Whether this replica polls and sends now."""
+        return self.lease is None or self.lease.held
+
+    def _lease_changed(self, held):
+        """Take the tenants over when the lease is acquired.
+
+        Nothing is needed when it is lost: the queue stops sending by
+        itself, since ``_active`` is false from then on.
+        """
+        if held:
+            task = asyncio.ensure_future(self._take_over())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _reply(self, chat_id, text):
+        """Queue the answer to a command ahead of notifications."""
+        self.queue.put(chat_id, text, lane=ALERT)
+
+    async def _take_over(self):
+        """Pick up the state and the outbox another replica left."""
+        states = await self._call(self._load_states)
+        for key, state in states.items():
+            self.states[key].timestamp = state.timestamp
+            self.states[key].statuses = state.statuses
+        await self._dispatch()
+
+    async def _call(self, func, *args):
+        """Run a blocking call without exceeding the in-flight limit."""
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _fetch(self, headers, timestamp):
+        """Fetch through the circuit breaker and the request budget.
+
+        The circuit may open while the poll waits for a token, so it is
+        checked again before the request goes out.
+        """
+        self.breaker.before_call()
+        await self.budget.acquire()
+        self.breaker.recheck()
+        try:
+            response = await self._call(self.fetch, headers, timestamp)
+        except Exception as error:
+            if is_outage(error):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            if (isinstance(error, APIResponseError)
+                    and error.status == HTTPStatus.TOO_MANY_REQUESTS):
+                self.budget.pause(error.retry_after or RATE_LIMIT_PAUSE)
+            raise
+        self.breaker.record_success()
+        return response
+
+    async def poll_once(self, tenants):
+        """Fetch once for tenants sharing a token and fan out transitions.
+
+        Each subscribed chat keeps its own cursor and status index, so a
+        chat that joined later still gets its own transitions. Every
+        homework is formatted once per poll however many chats follow it.
+        """
+        states = [self.states[tenant.key] for tenant in tenants]
+        timestamp = min(state.timestamp for state in states)
+        response = await self._fetch(tenants[0].headers, timestamp)
+        homeworks = self.check(response)
+        messages = {}
+        for tenant, state in zip(tenants, states):
+            state.idle_polls = 0 if homeworks else state.idle_polls + 1
+            for homework in state.statuses.changes(homeworks):
+                key = state.statuses.remember(homework)
+                if (key, tenant.locale) not in messages:
+                    messages[key, tenant.locale] = self._render(
+                        homework, tenant.locale
+                    )
+                self.store.set_status(tenant.key, key, homework.status)
+                self._notify(
+                    tenant, key, homework, messages[key, tenant.locale]
+                )
+            state.timestamp = advance_cursor(response, state.timestamp)
+            self.store.set(tenant.key, state.timestamp)
+        self.fetches_saved += len(tenants) - 1
+
+    def _notify(self, tenant, key, homework, message):
+        """Put a transition into the outbox or on the chat board."""
+        line_key = f'{tenant.key}:{key}'
+        self.store.add_event(tenant.chat_id, message)
+        if self.board is not None:
+            self.board.update(tenant.chat_id, line_key, message)
+            return
+        self.store.set_board_lines(tenant.chat_id, {line_key: message})
+        if self.store.is_paused(tenant.chat_id):
+            return
+        message_id = self.store.add_message(
+            tenant.key, tenant.chat_id, message,
+            message_id=transition_id(tenant, key, homework)
+        )
+        self._message_lanes[message_id] = status_lane(homework.status)
+
+    def _render(self, homework, locale):
+        """Message of one transition in the locale of a chat."""
+        if self.catalog is None:
+            return self.parse(homework)
+        return self.catalog.render(homework, locale)
+
+    def _next_delay(self, states):
+        """Delay before the next poll, as soon as any chat needs it."""
+        return self.schedule.spread(min(
+            self.schedule.base_delay(
+                state.statuses.statuses, state.idle_polls, state.errors
+            )
+            for state in states
+        ))
+
+    async def _attempt(self, token_key, tenants, states):
+        """Poll a token once; return a delay overriding the schedule."""
+        try:
+            await self.poll_once(tenants)
+            for state in states:
+                state.errors = 0
+        except CircuitOpen as error:
+            logger.debug(f'Poll of token {token_key} shed: {error}')
+            return error.retry_after + random.uniform(
+                0, self.breaker.recovery_time
+            )
+        except Exception as error:
+            for state in states:
+                state.errors += 1
+            logger.error(f'Error polling token {token_key}: {error}')
+        return None
+
+    async def _poll_subscription(self, token_key):
+        """Poll one token and put it back on the wheel."""
+        now = asyncio.get_running_loop().time
+        if not self._active():
+            self.wheel.schedule(token_key, self.lease.interval, now())
+            return
+        tenants = self.subscriptions[token_key]
+        states = [self.states[tenant.key] for tenant in tenants]
+        delay = await self._attempt(token_key, tenants, states)
+        for state in states:
+            state.polls += 1
+        if self._cycles is not None and states[0].polls >= self._cycles:
+            self._remaining -= 1
+            if not self._remaining:
+                self._finished.set()
+            return
+        if delay is None:
+            delay = self._next_delay(states)
+        self.wheel.schedule(token_key, delay, now())
+
+    async def _tick_loop(self):
+        """Advance the timing wheel and start the polls that are due."""
+        loop = asyncio.get_running_loop()
+        expected = loop.time()
+        while True:
+            expected += self.wheel.tick
+            await asyncio.sleep(expected - loop.time())
+            now = loop.time()
+            self.loop_lag.observe(now - expected)
+            expected = max(expected, now - self.wheel.tick)
+            for key in self.wheel.advance(now):
+                task = asyncio.ensure_future(self._poll_subscription(key))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, final=False):
+        """Flush the state batch and queue messages that became durable.
+
+        A delivered message leaves ``_outbox`` only once its
+        ``mark_sent`` is flushed, so a ``pending_messages`` read that
+        started before the delivery cannot queue it again.
+        """
+        settled, self._settling = self._settling, set()
+        try:
+            await self._call(self.store.flush)
+        except Exception:
+            self._settling |= settled
+            raise
+        self._outbox -= settled
+        if not self._active():
+            return
+        pending = await self._call(self.store.pending_messages)
+        fresh = [
+            row for row in pending
+            if row[0] not in self._outbox and row[1] in self.states
+        ]
+        if self.digest_window is not None:
+            self._put_digests(fresh, final)
+            return
+        for message_id, _, chat_id, message in fresh:
+            self._outbox.add(message_id)
+            self.queue.put(
+                chat_id, message, message_id, self._lane(message_id)
+            )
+
+    def _lane(self, *message_ids):
+        """Most urgent lane of messages; replayed ones are verdicts."""
+        return min(
+            (self._message_lanes.pop(message_id, VERDICT)
+             for message_id in message_ids),
+            key=LANES.index, default=VERDICT
+        )
+
+    def _put_digests(self, pending, final):
+        """Queue one digest per chat whose window is over."""
+        now = time.monotonic()
+        chats = {}
+        for message_id, _, chat_id, message in pending:
+            chats.setdefault(chat_id, []).append((message_id, message))
+        for chat_id, messages in chats.items():
+            since = self._held.setdefault(chat_id, now)
+            if not final and now - since < self.digest_window:
+                continue
+            del self._held[chat_id]
+            for message_ids, text in build_digests(
+                messages, max_items=self.digest_size
+            ):
+                self._outbox.update(message_ids)
+                self.queue.put(
+                    chat_id, text, message_ids, self._lane(*message_ids)
+                )
+
+    def _delivered(self, message_id, outcome):
+        """Close outbox entries once they are sent or dropped for good.
+
+        Messages that failed only for transient reasons, or were skipped
+        because the lease was lost, stay unsent in the store; the next
+        dispatch of the lease holder queues them again. Closed entries
+        are settled by the next dispatch, after their flush.
+        """
+        if not isinstance(message_id, tuple):
+            message_id = (message_id,)
+        for single_id in message_id:
+            if outcome in (FAILED, SKIPPED):
+                self._outbox.discard(single_id)
+            else:
+                self.store.mark_sent(single_id)
+                self._settling.add(single_id)
+
+    async def _flush_loop(self):
+        """Write buffered state changes and reload templates."""
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                if self.catalog is not None:
+                    await self._call(self.catalog.refresh)
+                await self._dispatch()
+            except Exception as error:
+                logger.error(f'Error flushing state: {error}')
+
+    async def run(self, cycles=None):
+        """Poll all tenants forever, or ``cycles`` times each.
+
+        A bounded run polls every token right away instead of spreading
+        the first polls over the cold start.
+        """
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self.queue.start()
+        if self.board is not None:
+            self.board.start()
+            self.board.resync({tenant.chat_id for tenant in self.tenants})
+        with ThreadPoolExecutor(self.max_in_flight) as executor:
+            self._executor = executor
+            loop = asyncio.get_running_loop()
+            self.wheel = TimingWheel(self.wheel.tick, loop.time())
+            self._cycles = cycles
+            self._remaining = len(self.subscriptions)
+            self._finished = asyncio.Event()
+            bounded = cycles is not None
+            for token_key in self.subscriptions:
+                delay = 0 if bounded else self.schedule.first_delay()
+                self.wheel.schedule(token_key, delay, loop.time())
+            await self._dispatch()
+            background = [
+                asyncio.ensure_future(self._flush_loop()),
+                asyncio.ensure_future(self._tick_loop()),
+            ]
+            if self.lease is not None:
+                background.append(asyncio.ensure_future(
+                    self.lease.keep(self._lease_changed)
+                ))
+            if self.commands is not None:
+                background.append(asyncio.ensure_future(
+                    self.commands.run(self._reply, self._active)
+                ))
+            try:
+                if self.tenants:
+                    await self._finished.wait()
+                await self._dispatch(final=True)
+                await self.queue.join()
+                if self.board is not None:
+                    await self.board.join()
+            finally:
+                for task in background + list(self._tasks):
+                    task.cancel()
+                await self.queue.stop()
+                if self.board is not None:
+                    await self.board.stop()
+                if self.lease is not None and self.lease.held:
+                    self.lease.release()
+                self.store.flush()
@@ -0,0 +1,58 @@
+class APIError(Exception):
+    """Request to the Practicum API failed."""
+
+
+class APIRequestError(APIError):
+    """The API did not answer: connection error or timeout."""
+
+
+class APIResponseError(APIError):
+    """The API answered with a status other than 200."""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f'Wrong response {status}')
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpen(APIError):
+    """Requests are shed while the API is considered down."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Circuit is open, retry in {retry_after:.0f} s')
+        self.retry_after = retry_after
+
+
+def is_outage(error):
+    """Tell whether an error means the API itself is unhealthy."""
+    if isinstance(error, APIRequestError):
+        return True
+    return isinstance(error, APIResponseError) and error.status >= 500
+
+
+class ValidationError(APIError):
+    """The API answered with data of an unexpected shape."""
+
+    def __str__(self):
+        """Plain message, without the quotes ``KeyError`` adds."""
+        return str(self.args[0]) if self.args else ''
+
+
+class InvalidResponse(ValidationError, TypeError):
+    """The response or its homework list has a wrong type."""
+
+
+class MissingField(ValidationError, KeyError):
+    """A homework lacks a required field or has it empty."""
+
+    def __init__(self, field):
+        super().__init__(f'No key {field}')
+        self.field = field
+
+
+class UnknownStatus(ValidationError, KeyError):
+    """A homework has a status the bot does not know."""
+
+    def __init__(self, status):
+        super().__init__(f'Undefined status homework: {status}')
+        self.status = status
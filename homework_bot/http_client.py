@@ -0,0 +1,76 @@
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POOL_SIZE = 64
+HOST_POOLS = 10
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+RETRIES = 3
+BACKOFF_FACTOR = 0.3
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a ``Retry-After`` header, or ``None``."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class PooledClient:
+    """Keep-alive HTTP client shared by every poll.
+
+    Connections are kept per host and reused between requests. Every
+    request gets connect and read timeouts, and idempotent requests are
+    retried on connection errors. ``status`` retries are left to the
+    caller so 4xx/5xx answers are seen as they are.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, retries=RETRIES):
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries, status=0, backoff_factor=BACKOFF_FACTOR,
+            allowed_methods=frozenset({'GET', 'HEAD'}),
+            raise_on_status=False
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=HOST_POOLS, pool_maxsize=pool_size,
+            max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def get(self, url, **kwargs):
+        """Send a GET request through the shared connection pool."""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def stats(self):
+        """Count requests and how many of them reused a connection."""
+        pools = self.adapter.poolmanager.pools
+        created = sent = 0
+        for key in pools.keys():
+            pool = pools[key]
+            created += pool.num_connections
+            sent += pool.num_requests
+        return {
+            'requests': sent,
+            'connections_created': created,
+            'connections_reused': max(sent - created, 0),
+        }
+
+    def close(self):
+        """Close every pooled connection."""
+        self.session.close()
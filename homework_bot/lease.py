@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from homework_bot.state import SQLITE_SUFFIXES
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TTL = 15
+
+
+def default_owner():
+    """Owner id unique to this process."""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+
+
+class FileLeaseBackend:
+    """Leases held as ``flock`` locks on files in a directory.
+
+    The kernel drops a lock as soon as its process dies, so failover is
+    immediate, but every replica must see the same local directory.
+    ``ttl`` is ignored.
+    """
+
+    def __init__(self, directory):
+        if fcntl is None:
+            raise RuntimeError('File leases need fcntl')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.files = {}
+
+    def _path(self, name):
+        """Lock file of a lease."""
+        return os.path.join(self.directory, f'{name}.lock')
+
+    def acquire(self, name, owner, ttl):
+        """Take or keep the lease; return whether it is held."""
+        if name in self.files:
+            return True
+        file = open(self._path(name), 'a+', encoding='utf-8')
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        file.truncate(0)
+        file.write(owner)
+        file.flush()
+        self.files[name] = file
+        return True
+
+    def release(self, name, owner):
+        """Give the lease up."""
+        file = self.files.pop(name, None)
+        if file is not None:
+            fcntl.flock(file, fcntl.LOCK_UN)
+            file.close()
+
+    def holder(self, name):
+        """Owner written by the last holder of the lease, if any."""
+        try:
+            with open(self._path(name), encoding='utf-8') as file:
+                return file.read() or None
+        except FileNotFoundError:
+            return None
+
+
+class SQLiteLeaseBackend:
+    """Leases kept as rows with an expiry time in an SQLite database.
+
+    A lease is taken when it is free, expired or already ours, in one
+    upsert, so two replicas can never both win it.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires REAL NOT NULL
+        ) WITHOUT ROWID;
+    '''
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(self.SCHEMA)
+        self.lock = threading.Lock()
+
+    def acquire(self, name, owner, ttl):
+        """Take or renew the lease; return whether it is held."""
+        now = time.time()
+        with self.lock:
+            cursor = self.connection.execute(
+                'INSERT INTO leases VALUES (?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET '
+                'owner = excluded.owner, expires = excluded.expires '
+                'WHERE leases.owner = excluded.owner OR leases.expires < ?',
+                (name, owner, now + ttl, now)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, name, owner):
+        """Give the lease up if it is ours."""
+        with self.lock:
+            self.connection.execute(
+                'DELETE FROM leases WHERE name = ? AND owner = ?',
+                (name, owner)
+            )
+
+    def holder(self, name):
+        """Owner of an unexpired lease, if any."""
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT owner FROM leases WHERE name = ? AND expires >= ?',
+                (name, time.time())
+            ).fetchall()
+        return rows[0][0] if rows else None
+
+
+def open_lease_backend(path):
+    """Open a lease backend: SQLite for ``.db`` files, else file locks."""
+    if str(path).endswith(SQLITE_SUFFIXES):
+        return SQLiteLeaseBackend(path)
+    return FileLeaseBackend(path)
+
+
+class Lease:
+    """Lease ``name`` renewed by a heartbeat every ``interval`` seconds.
+
+    The backend is anything with ``acquire(name, owner, ttl)``,
+    ``release(name, owner)`` and ``holder(name)``. The lease counts as
+    held until ``ttl - interval`` seconds after the last successful
+    renewal started, which leaves a margin before other replicas may
+    take it. Any replica that does not hold it keeps trying, so it can
+    take over within ``interval`` seconds of the lease expiring. Asyncio
+    code renews with ``keep``; blocking code starts a heartbeat thread
+    with ``start_heartbeat``, which ``release`` stops.
+    """
+
+    def __init__(self, backend, name, owner=None, ttl=TTL, interval=None,
+                 clock=time.monotonic):
+        self.backend = backend
+        self.name = name
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+        self.interval = interval or ttl / 3
+        self.clock = clock
+        self.valid_until = 0.0
+        self.acquisitions = 0
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    @property
+    def held(self):
+        """Whether this replica may act on the lease now."""
+        return self.clock() < self.valid_until
+
+    def renew(self):
+        """Take or renew the lease once; return whether it is held."""
+        start = self.clock()
+        if self.backend.acquire(self.name, self.owner, self.ttl):
+            if not self.held:
+                self.acquisitions += 1
+            self.valid_until = start + self.ttl - self.interval
+        else:
+            self.valid_until = 0.0
+        return self.held
+
+    def release(self):
+        """Give the lease up so a standby can take it at once."""
+        if self._heartbeat is not None:
+            self._stop.set()
+            self._heartbeat.join()
+            self._heartbeat = None
+        self.valid_until = 0.0
+        self.backend.release(self.name, self.owner)
+
+    def _log_change(self, held):
+        """Log that the lease was acquired or lost."""
+        logger.warning(
+            f"Lease {self.name} {'acquired' if held else 'lost'} "
+            f'by {self.owner}'
+        )
+
+    def _beat(self):
+        """Renew every ``interval`` seconds until stopped."""
+        was_held = self.held
+        while not self._stop.wait(self.interval):
+            try:
+                self.renew()
+            except Exception as error:
+                logger.error(f'Error renewing lease {self.name}: {error}')
+            if self.held != was_held:
+                was_held = self.held
+                self._log_change(was_held)
+
+    def start_heartbeat(self):
+        """Renew the lease from a daemon thread until it is released."""
+        self._stop.clear()
+        self._heartbeat = threading.Thread(
+            target=self._beat, name=f'lease-{self.name}', daemon=True
+        )
+        self._heartbeat.start()
+
+    async def keep(self, on_change=None):
+        """Renew forever, calling ``on_change(held)`` on every change."""
+        loop = asyncio.get_running_loop()
+        was_held = self.held
+        while True:
+            try:
+                await loop.run_in_executor(None, self.renew)
+            except Exception as error:
+                logger.error(f'Error renewing lease {self.name}: {error}')
+            if self.held != was_held:
+                was_held = self.held
+                self._log_change(was_held)
+                if on_change is not None:
+                    on_change(was_held)
+            await asyncio.sleep(self.interval)
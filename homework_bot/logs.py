@@ -0,0 +1,104 @@
+import atexit
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = 'main.log'
+MAX_BYTES = 50000000
+BACKUP_COUNT = 5
+RATE_LIMIT = 60
+RATE_LIMIT_KEYS = 10000
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record):
+        """Return the record as a JSON string."""
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets one record per message and ``interval`` seconds through.
+
+    Only records at ``level`` or below are limited, so warnings and
+    errors always pass.
+    """
+
+    def __init__(self, interval=RATE_LIMIT, level=logging.DEBUG):
+        super().__init__()
+        self.interval = interval
+        self.level = level
+        self.last_seen = {}
+
+    def filter(self, record):
+        """Drop a record seen less than ``interval`` seconds ago."""
+        if record.levelno > self.level:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        last = self.last_seen.get(key)
+        if last is not None and now - last < self.interval:
+            return False
+        if len(self.last_seen) >= RATE_LIMIT_KEYS:
+            self.last_seen.clear()
+        self.last_seen[key] = now
+        return True
+
+
+def setup_logging(filename=LOG_FILE, json_format=False, level=logging.DEBUG,
+                  rate_limit=RATE_LIMIT):
+    """Send root logging through a queue to one rotating file.
+
+    Callers only put records on an in-memory queue; a background
+    listener thread formats and writes them. Calling it again is a
+    no-op.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+    handler = RotatingFileHandler(
+        filename, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    handler.setFormatter(
+        JsonFormatter() if json_format else logging.Formatter(FORMAT)
+    )
+    records = queue.SimpleQueue()
+    queue_handler = QueueHandler(records)
+    if rate_limit:
+        queue_handler.addFilter(RateLimitFilter(rate_limit))
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    _queue_handler = queue_handler
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = _queue_handler = None
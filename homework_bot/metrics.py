@@ -0,0 +1,292 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from homework_bot.breaker import STATES
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30
+)
+WAIT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    """Escape a label value for the text exposition format."""
+    return (
+        str(value).replace('\\', r'\\').replace('\n', r'\n')
+        .replace('"', r'\"')
+    )
+
+
+def _labels(names, values, extra=()):
+    """Render ``{name="value",...}`` or an empty string."""
+    pairs = [
+        f'{name}="{_escape(value)}"'
+        for name, value in list(zip(names, values)) + list(extra)
+    ]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Registry:
+    """Collection of metrics rendered together on ``/metrics``."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """Add a metric to the registry."""
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    """Base of labelled metrics."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(),
+                 registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        """Label values in declaration order."""
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    """Monotonically increasing counter."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Increase the counter of the given labels."""
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        """Exposition lines of the counter."""
+        with self.lock:
+            items = list(self.values.items())
+        return [
+            f'{self.name}{_labels(self.labelnames, key)} {value}'
+            for key, value in items
+        ]
+
+
+class Gauge(Metric):
+    """Value read from ``callback`` at scrape time.
+
+    The callback returns a number, or a dict from label value tuples to
+    numbers for labelled gauges.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=(),
+                 registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.callback = callback
+
+    def samples(self):
+        """Exposition lines of the gauge."""
+        try:
+            value = self.callback()
+        except Exception as error:
+            logger.error(f'Error collecting {self.name}: {error}')
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [
+            f'{self.name}{_labels(self.labelnames, key)} {number}'
+            for key, number in value.items()
+        ]
+
+
+class Histogram(Metric):
+    """Cumulative histogram of observed values."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        """Record one value."""
+        key = self._key(labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 1)
+                counts.append(0.0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the ``with`` block took."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        """Exposition lines of the histogram."""
+        with self.lock:
+            items = [
+                (key, list(counts)) for key, counts in self.values.items()
+            ]
+        lines = []
+        for key, counts in items:
+            total = 0
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, counts):
+                total += count
+                labels = _labels(self.labelnames, key, [('le', bound)])
+                lines.append(f'{self.name}_bucket{labels} {total}')
+            labels = _labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {counts[-1]}')
+            lines.append(f'{self.name}_count{labels} {total}')
+        return lines
+
+
+API_LATENCY = Histogram(
+    'homework_api_request_seconds', 'Practicum API request latency.'
+)
+API_RESPONSES = Counter(
+    'homework_api_responses_total', 'Practicum API responses by HTTP status.',
+    ['status']
+)
+API_ERRORS = Counter(
+    'homework_api_errors_total', 'Failed Practicum API requests by type.',
+    ['type']
+)
+SEND_LATENCY = Histogram(
+    'homework_telegram_send_seconds', 'Telegram sendMessage latency.'
+)
+SEND_WAIT = Histogram(
+    'homework_send_queue_wait_seconds',
+    'Time from queueing a message to its delivery, by lane.', ['lane'],
+    buckets=WAIT_BUCKETS
+)
+SEND_ERRORS = Counter(
+    'homework_telegram_errors_total', 'Failed Telegram sends by type.',
+    ['type']
+)
+
+
+def register_engine(engine, registry=REGISTRY):
+    """Expose queue depth, scheduler lag and tenant counts of an engine."""
+
+    def tenants_by_health():
+        failing = sum(1 for state in engine.states.values() if state.errors)
+        return {('ok',): len(engine.states) - failing, ('failing',): failing}
+
+    def homeworks_by_status():
+        counts = {}
+        for state in engine.states.values():
+            for status in state.statuses.statuses.values():
+                counts[(status,)] = counts.get((status,), 0) + 1
+        return counts
+
+    Gauge('homework_send_queue_depth', 'Messages waiting for Telegram.',
+          lambda: engine.queue.size, registry=registry)
+    Gauge('homework_send_lane_depth', 'Messages waiting per delivery lane.',
+          lambda: {
+              (lane,): size for lane, size in engine.queue.lane_sizes.items()
+          }, ['lane'], registry=registry)
+    Gauge('homework_scheduler_lag_seconds',
+          'How late the last scheduler tick woke up.',
+          lambda: engine.loop_lag.last, registry=registry)
+    Gauge('homework_scheduler_lag_max_seconds',
+          'Worst scheduler tick delay since start.',
+          lambda: engine.loop_lag.max, registry=registry)
+    Gauge('homework_scheduled_tenants', 'Tenants waiting on the wheel.',
+          lambda: len(engine.wheel), registry=registry)
+    Gauge('homework_subscriptions', 'Distinct Practicum tokens polled.',
+          lambda: len(engine.subscriptions), registry=registry)
+    Gauge('homework_coalesced_fetches',
+          'Fetches saved by sharing one poll between chats of a token.',
+          lambda: engine.fetches_saved,
+          registry=registry)
+    Gauge('homework_api_circuit_state',
+          'Practicum API circuit breaker state, 1 for the current one.',
+          lambda: {
+              (state,): int(engine.breaker.state == state)
+              for state in STATES
+          }, ['state'], registry=registry)
+    Gauge('homework_api_circuit_opens', 'Times the circuit has opened.',
+          lambda: engine.breaker.opens, registry=registry)
+    Gauge('homework_api_shed_requests',
+          'Practicum requests refused while the circuit was open.',
+          lambda: engine.breaker.rejected, registry=registry)
+    Gauge('homework_api_budget_tokens',
+          'Practicum requests left in the shared rate budget.',
+          lambda: engine.budget.tokens, registry=registry)
+    Gauge('homework_tenants', 'Tenants by polling health.',
+          tenants_by_health, ['state'], registry=registry)
+    Gauge('homework_homeworks', 'Known homeworks by status.',
+          homeworks_by_status, ['status'], registry=registry)
+
+
+def register_http_client(client, registry=REGISTRY):
+    """Expose connection reuse of a ``PooledClient``."""
+    Gauge('homework_api_requests', 'Requests sent through the pool.',
+          lambda: client.stats()['requests'], registry=registry)
+    Gauge('homework_api_connections', 'Pooled connections by how used.',
+          lambda: {
+              ('created',): client.stats()['connections_created'],
+              ('reused',): client.stats()['connections_reused'],
+          }, ['kind'], registry=registry)
+
+
+def start_metrics_server(port, host='0.0.0.0', registry=REGISTRY):
+    """Serve ``/metrics`` from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(HTTPStatus.NOT_FOUND)
+                return
+            body = registry.render().encode()
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f'Metrics are served on port {server.server_address[1]}')
+    return server
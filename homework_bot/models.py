@@ -0,0 +1,94 @@
+from enum import Enum
+
+from homework_bot.errors import InvalidResponse, MissingField, UnknownStatus
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class Status(str, Enum):
+    """Review status of a homework."""
+
+    APPROVED = 'approved'
+    REVIEWING = 'reviewing'
+    REJECTED = 'rejected'
+
+    def __str__(self):
+        """The plain value, as in the API response."""
+        return self.value
+
+
+STATUSES = {status.value: status for status in Status}
+
+
+class Homework:
+    """One validated homework of an API response."""
+
+    __slots__ = ('id', 'name', 'status', 'date_updated')
+
+    def __init__(self, id, name, status, date_updated=None):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.date_updated = date_updated
+
+    @classmethod
+    def from_dict(cls, raw, statuses=STATUSES):
+        """Validate a raw homework and build a record from it.
+
+        ``statuses`` maps every known status to its interned value.
+        """
+        if not isinstance(raw, dict):
+            raise InvalidResponse(f'Was expected dict type, {type(raw)}')
+        name = raw.get('homework_name')
+        if not name:
+            raise MissingField('homework_name')
+        status = raw.get('status')
+        if not status:
+            raise MissingField('status')
+        try:
+            status = statuses[status]
+        except (KeyError, TypeError):
+            raise UnknownStatus(status) from None
+        return cls(raw.get('id'), name, status, raw.get('date_updated'))
+
+    @property
+    def key(self):
+        """Key of the homework: its id, falling back to its name."""
+        return str(self.name if self.id is None else self.id)
+
+    def __eq__(self, other):
+        """Compare records field by field."""
+        if not isinstance(other, Homework):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__
+        )
+
+    def __repr__(self):
+        """Show the fields that identify the homework."""
+        return (
+            f'Homework(id={self.id!r}, name={self.name!r}, '
+            f'status={self.status!r})'
+        )
+
+
+def parse_response(response, statuses=STATUSES):
+    """Validate a whole API response in one pass; return its homeworks."""
+    if not isinstance(response, dict):
+        raise InvalidResponse(f'Was expected dict type, {type(response)}')
+    homeworks = response.get('homeworks')
+    if not isinstance(homeworks, list):
+        raise InvalidResponse(f'Was expected list type, {type(homeworks)}')
+    return [Homework.from_dict(raw, statuses) for raw in homeworks]
+
+
+def response_json(response):
+    """Decode a response body, with orjson when it is installed."""
+    content = getattr(response, 'content', None)
+    if orjson is None or not isinstance(content, bytes):
+        return response.json()
+    return orjson.loads(content)
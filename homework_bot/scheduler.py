@@ -0,0 +1,55 @@
+import random
+
+REVIEWING_PERIOD = 120
+NORMAL_PERIOD = 600
+IDLE_PERIOD = 1800
+MAX_BACKOFF = 3600
+JITTER = 0.1
+IDLE_POLLS = 3
+TERMINAL_STATUSES = frozenset({'approved'})
+
+
+class AdaptiveSchedule:
+    """Chooses how long a tenant waits before its next poll.
+
+    Tenants with a homework in ``reviewing`` are polled every ``fast``
+    seconds. Tenants whose homeworks are all terminal, or whose polls
+    returned nothing ``idle_polls`` times in a row, wait ``slow``
+    seconds. Errors back off exponentially up to ``max_backoff``. Every
+    delay is spread by ``jitter`` so tenants do not poll in lockstep.
+    """
+
+    def __init__(self, fast=REVIEWING_PERIOD, normal=NORMAL_PERIOD,
+                 slow=IDLE_PERIOD, max_backoff=MAX_BACKOFF, jitter=JITTER,
+                 idle_polls=IDLE_POLLS):
+        self.fast = fast
+        self.normal = normal
+        self.slow = slow
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.idle_polls = idle_polls
+
+    def spread(self, delay):
+        """Add random jitter to a delay."""
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def first_delay(self):
+        """Delay of the first poll, spreading a cold start."""
+        return random.uniform(0, self.normal * self.jitter)
+
+    def base_delay(self, statuses, idle_polls, errors):
+        """Delay without jitter for the given tenant state."""
+        if errors:
+            return min(self.normal * 2 ** (errors - 1), self.max_backoff)
+        values = statuses.values()
+        if 'reviewing' in values:
+            return self.fast
+        if idle_polls >= self.idle_polls or (
+            values and all(value in TERMINAL_STATUSES for value in values)
+        ):
+            return self.slow
+        return self.normal
+
+    def next_delay(self, statuses, idle_polls, errors):
+        """Delay before the next poll of a tenant."""
+        return self.spread(self.base_delay(statuses, idle_polls, errors))
@@ -0,0 +1,234 @@
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+REPLICAS = 100
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 60
+CHECK_INTERVAL = 1
+STOP_TIMEOUT = 10
+
+
+def _hash(value):
+    """Stable 64-bit position of a value on the ring."""
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big'
+    )
+
+
+class HashRing:
+    """Consistent hash ring with ``replicas`` virtual points per node.
+
+    Adding or removing a node only moves the keys that land next to its
+    points, about ``1 / len(nodes)`` of them.
+    """
+
+    def __init__(self, nodes=(), replicas=REPLICAS):
+        self.replicas = replicas
+        self.points = []
+        self.owners = {}
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self):
+        """Nodes on the ring, in the order they were added."""
+        return list(dict.fromkeys(self.owners.values()))
+
+    def add(self, node):
+        """Put a node on the ring."""
+        for replica in range(self.replicas):
+            point = _hash(f'{node}#{replica}')
+            if point not in self.owners:
+                bisect.insort(self.points, point)
+                self.owners[point] = node
+
+    def remove(self, node):
+        """Take a node off the ring."""
+        for point in [p for p, owner in self.owners.items() if owner == node]:
+            del self.owners[point]
+            self.points.remove(point)
+
+    def node_for(self, key):
+        """Node owning a key."""
+        if not self.points:
+            raise LookupError('Hash ring is empty')
+        index = bisect.bisect(self.points, _hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+def assign(tenants, ring):
+    """Split tenants between the nodes of a ring by their token.
+
+    Chats following one token land on the same node, so their polls are
+    still coalesced.
+    """
+    shards = {node: [] for node in ring.nodes}
+    for tenant in tenants:
+        shards[ring.node_for(tenant.token_key)].append(tenant)
+    return shards
+
+
+def worker_name(index):
+    """Name of the worker with a given number."""
+    return f'worker-{index}'
+
+
+class Supervisor:
+    """Runs ``target(name, tenants)`` in one process per shard.
+
+    Tenants are spread over ``workers`` processes with a ``HashRing``.
+    Processes are spawned, so each one builds its own HTTP and Telegram
+    pools. A worker that dies is restarted after ``restart_delay``
+    seconds, doubled after every crash in a row up to
+    ``max_restart_delay``. ``resize`` and ``reload`` rebalance the ring
+    and restart only the workers whose tenants changed. In ``run``
+    SIGTTIN adds a worker, SIGTTOU removes one, SIGHUP reloads tenants
+    from ``load()`` and SIGTERM/SIGINT stop everything.
+    """
+
+    def __init__(self, tenants, target, workers=None, load=None,
+                 restart_delay=RESTART_DELAY,
+                 max_restart_delay=MAX_RESTART_DELAY, context=None):
+        self.tenants = list(tenants)
+        self.target = target
+        self.load = load
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.context = context or multiprocessing.get_context('spawn')
+        self.ring = HashRing(
+            worker_name(index) for index in range(workers or os.cpu_count())
+        )
+        self.shards = {}
+        self.processes = {}
+        self.crashes = {}
+        self.started = {}
+        self.restart_at = {}
+        self.restarts = 0
+        self._signals = []
+
+    def start(self):
+        """Start a process for every shard."""
+        self.shards = assign(self.tenants, self.ring)
+        for node in self.shards:
+            self._spawn(node)
+
+    def _spawn(self, node):
+        """Start the worker of one shard."""
+        process = self.context.Process(
+            target=self.target, args=(node, self.shards[node]), name=node
+        )
+        process.start()
+        self.processes[node] = process
+        self.started[node] = time.monotonic()
+        self.restart_at.pop(node, None)
+        logger.info(
+            f'Started {node} (pid {process.pid}) with '
+            f'{len(self.shards[node])} tenants'
+        )
+
+    def _stop(self, node):
+        """Terminate the worker of one shard and wait for it."""
+        process = self.processes.pop(node, None)
+        self.restart_at.pop(node, None)
+        if process is None:
+            return
+        process.terminate()
+        process.join(STOP_TIMEOUT)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def check(self):
+        """Schedule restarts of dead workers and run the due ones."""
+        now = time.monotonic()
+        for node, process in list(self.processes.items()):
+            if process.is_alive() or node in self.restart_at:
+                continue
+            if now - self.started[node] > self.max_restart_delay:
+                self.crashes[node] = 0
+            self.crashes[node] = self.crashes.get(node, 0) + 1
+            delay = min(
+                self.restart_delay * 2 ** (self.crashes[node] - 1),
+                self.max_restart_delay
+            )
+            self.restart_at[node] = now + delay
+            logger.error(
+                f'{node} exited with code {process.exitcode}, '
+                f'restarting in {delay} s'
+            )
+        for node, at in list(self.restart_at.items()):
+            if at <= now:
+                self.restarts += 1
+                self._spawn(node)
+
+    def rebalance(self):
+        """Reassign tenants and restart the workers whose shard changed."""
+        shards = assign(self.tenants, self.ring)
+        for node in set(self.shards) - set(shards):
+            self._stop(node)
+            logger.info(f'Stopped {node}')
+        previous, self.shards = self.shards, shards
+        for node, tenants in shards.items():
+            if previous.get(node) != tenants:
+                self._stop(node)
+                self._spawn(node)
+
+    def resize(self, workers):
+        """Run ``workers`` processes, adding or removing ring nodes."""
+        workers = max(workers, 1)
+        nodes = self.ring.nodes
+        for index in range(len(nodes), workers):
+            self.ring.add(worker_name(index))
+        for node in nodes[workers:]:
+            self.ring.remove(node)
+        self.rebalance()
+
+    def reload(self):
+        """Read tenants again and rebalance them."""
+        if self.load is not None:
+            self.tenants = list(self.load())
+        self.rebalance()
+
+    def stop(self):
+        """Stop every worker."""
+        for node in list(self.processes):
+            self._stop(node)
+
+    def _handle(self, signum, frame):
+        """Remember a signal for the supervision loop."""
+        self._signals.append(signum)
+
+    def _on_signal(self, signum):
+        """Act on one signal; return False to stop."""
+        if signum == signal.SIGTTIN:
+            self.resize(len(self.ring.nodes) + 1)
+        elif signum == signal.SIGTTOU:
+            self.resize(len(self.ring.nodes) - 1)
+        elif signum == signal.SIGHUP:
+            self.reload()
+        else:
+            return False
+        return True
+
+    def run(self, interval=CHECK_INTERVAL):
+        """Supervise workers until SIGTERM or SIGINT."""
+        for signum in (signal.SIGTTIN, signal.SIGTTOU, signal.SIGHUP,
+                       signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._handle)
+        self.start()
+        try:
+            while True:
+                while self._signals:
+                    if not self._on_signal(self._signals.pop(0)):
+                        return
+                self.check()
+                time.sleep(interval)
+        finally:
+            self.stop()
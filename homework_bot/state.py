@@ -0,0 +1,581 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+HISTORY_SIZE = 20
+SENT_RETENTION = 24 * 60 * 60
+
+
+def advance_cursor(response, cursor):
+    """Return the next ``from_date`` taken from the API ``current_date``."""
+    current_date = response.get('current_date')
+    if isinstance(current_date, int) and current_date > cursor:
+        return current_date
+    return cursor
+
+
+class StateStore:
+    """Tenant state kept in memory.
+
+    Holds the ``from_date`` cursor and the last delivered homework
+    statuses of every tenant, outbound messages that are not sent yet
+    and the status board of every chat. Changes are buffered;
+    subclasses make them durable on ``flush``, which the engine calls
+    in the background.
+    """
+
+    def __init__(self):
+        self.cursors = {}
+        self.homeworks = {}
+        self.messages = {}
+        self.boards = {}
+        self.changed_boards = set()
+        self.events = {}
+        self.paused = set()
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def get(self, key, default):
+        """Return the cursor of a tenant or ``default``."""
+        return self.cursors.get(key, default)
+
+    def set(self, key, cursor):
+        """Remember a new cursor of a tenant."""
+        with self.lock:
+            if self.cursors.get(key) != cursor:
+                self.cursors[key] = cursor
+                self.dirty = True
+
+    def statuses(self, key):
+        """Return ``{homework key: status}`` of a tenant."""
+        return dict(self.homeworks.get(key, {}))
+
+    def set_status(self, key, homework, status):
+        """Remember the delivered status of a homework."""
+        with self.lock:
+            self.homeworks.setdefault(key, {})[str(homework)] = status
+            self.dirty = True
+
+    def add_message(self, key, chat_id, text, message_id=None):
+        """Store an outbound message and return its id."""
+        message_id = message_id or uuid.uuid4().hex
+        with self.lock:
+            self.messages[message_id] = (key, str(chat_id), text)
+            self.dirty = True
+        return message_id
+
+    def pending_messages(self):
+        """Return ``(id, tenant key, chat id, text)`` of unsent messages."""
+        with self.lock:
+            return [(message_id, *row)
+                    for message_id, row in self.messages.items()]
+
+    def mark_sent(self, message_id):
+        """Forget a delivered message."""
+        with self.lock:
+            if self.messages.pop(message_id, None) is not None:
+                self.dirty = True
+
+    def _load_board(self, chat_id):
+        """Read a board missing from memory; none are kept elsewhere."""
+        return None
+
+    def _board(self, chat_id):
+        """Mutable ``[message id, lines, shown text]`` of a chat."""
+        chat_id = str(chat_id)
+        board = self.boards.get(chat_id)
+        if board is None:
+            board = self._load_board(chat_id) or [None, {}, '']
+            self.boards[chat_id] = board
+        return board
+
+    def board(self, chat_id):
+        """Return ``(message id, {line key: text}, shown text)``."""
+        with self.lock:
+            message_id, lines, shown = self._board(chat_id)
+            return message_id, dict(lines), shown
+
+    def set_board_lines(self, chat_id, lines):
+        """Add or replace lines of the status board of a chat."""
+        with self.lock:
+            self._board(chat_id)[1].update(lines)
+            self.changed_boards.add(str(chat_id))
+            self.dirty = True
+
+    def set_board_message(self, chat_id, message_id, shown):
+        """Remember which message shows the board and its text."""
+        with self.lock:
+            board = self._board(chat_id)
+            board[0], board[2] = message_id, shown
+            self.changed_boards.add(str(chat_id))
+            self.dirty = True
+
+    def status_lines(self, chat_id):
+        """Return ``{line key: text}`` of a chat, as on its board."""
+        return self.board(chat_id)[1]
+
+    def add_event(self, chat_id, text, at=None):
+        """Remember a transition found for a chat."""
+        with self.lock:
+            events = self.events.setdefault(str(chat_id), [])
+            events.append([time.time() if at is None else at, text])
+            del events[:-HISTORY_SIZE]
+            self.dirty = True
+
+    def history(self, chat_id, limit=HISTORY_SIZE):
+        """Return up to ``limit`` ``(time, text)`` of a chat, newest first."""
+        with self.lock:
+            events = self.events.get(str(chat_id), [])
+            return [tuple(event) for event in reversed(events[-limit:])]
+
+    def is_paused(self, chat_id):
+        """Whether notifications to a chat are paused."""
+        return str(chat_id) in self.paused
+
+    def set_paused(self, chat_id, paused):
+        """Pause or resume notifications to a chat."""
+        with self.lock:
+            if paused:
+                self.paused.add(str(chat_id))
+            else:
+                self.paused.discard(str(chat_id))
+            self.dirty = True
+
+    def flush(self):
+        """Make buffered changes durable; nothing to do in memory."""
+        self.dirty = False
+
+    def close(self):
+        """Flush and release resources."""
+        self.flush()
+
+
+class JsonStateStore(StateStore):
+    """State kept in a small JSON file.
+
+    The file is rewritten atomically: data goes to a temporary file in
+    the same directory, is fsynced and then renamed over the old one, so
+    a crash leaves either the old or the new state on disk.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        data = self._read()
+        self.cursors = data.get('cursors', {})
+        self.homeworks = data.get('homeworks', {})
+        self.messages = {
+            message_id: tuple(row)
+            for message_id, row in data.get('messages', {}).items()
+        }
+        self.boards = data.get('boards', {})
+        self.events = data.get('history', {})
+        self.paused = set(data.get('paused', []))
+
+    def _read(self):
+        """Load the state file, starting empty on a missing file."""
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as error:
+            logger.error(f'Cannot read state file {self.path}: {error}')
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def flush(self):
+        """Atomically write the state to disk if it changed."""
+        if not self.dirty:
+            return
+        with self.lock:
+            snapshot = {
+                'cursors': dict(self.cursors),
+                'homeworks': {
+                    key: dict(statuses)
+                    for key, statuses in self.homeworks.items()
+                },
+                'messages': dict(self.messages),
+                'boards': {
+                    chat_id: [message_id, dict(lines), shown]
+                    for chat_id, (message_id, lines, shown)
+                    in self.boards.items()
+                },
+                'history': {
+                    chat_id: list(events)
+                    for chat_id, events in self.events.items()
+                },
+                'paused': sorted(self.paused),
+            }
+            self.dirty = False
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=directory, prefix='.state-', suffix='.tmp'
+        )
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+                json.dump(snapshot, file, ensure_ascii=False)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            self.dirty = True
+            os.unlink(temp_path)
+            raise
+
+
+class SQLiteStateStore(StateStore):
+    """State kept in an SQLite database in WAL mode.
+
+    Only changes are buffered in memory. ``flush`` writes all of them in
+    one transaction, so a batch of polls costs one commit. Reads go
+    through the primary keys, which start with the tenant key, and see
+    buffered changes first.
+
+    The buffers are guarded by ``lock`` and the database by
+    ``connection_lock``: ``flush`` swaps the buffers out and writes them
+    under the connection lock alone, so recording a poll never waits for
+    the disk. Readers hold the connection lock while they look at both,
+    which keeps a batch that is being written visible. Delivered messages
+    are deleted after ``sent_retention`` seconds.
+
+    Paused chats are kept in memory, so checking a transition costs no
+    query. The set is reread on every ``flush`` to pick up ``/pause``
+    answered by another process.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS cursors (
+            tenant TEXT PRIMARY KEY,
+            cursor INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS statuses (
+            tenant TEXT NOT NULL,
+            homework TEXT NOT NULL,
+            status TEXT,
+            PRIMARY KEY (tenant, homework)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS messages (
+            id TEXT PRIMARY KEY,
+            tenant TEXT NOT NULL,
+            chat_id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            created REAL NOT NULL,
+            sent REAL
+        );
+        CREATE INDEX IF NOT EXISTS messages_pending
+            ON messages (created) WHERE sent IS NULL;
+        CREATE INDEX IF NOT EXISTS messages_sent
+            ON messages (sent) WHERE sent IS NOT NULL;
+        CREATE TABLE IF NOT EXISTS boards (
+            chat_id TEXT PRIMARY KEY,
+            message_id INTEGER,
+            lines TEXT NOT NULL,
+            shown TEXT NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS history (
+            chat_id TEXT NOT NULL,
+            at REAL NOT NULL,
+            text TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS history_chat ON history (chat_id, at);
+        CREATE TABLE IF NOT EXISTS paused (
+            chat_id TEXT PRIMARY KEY
+        ) WITHOUT ROWID;
+    '''
+
+    def __init__(self, path, sent_retention=SENT_RETENTION):
+        super().__init__()
+        self.path = path
+        self.sent_retention = sent_retention
+        self.connection_lock = threading.RLock()
+        self.connection = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(self.SCHEMA)
+        self.sent = {}
+        self.pauses = {}
+        self._load_paused()
+
+    def _query(self, sql, params=()):
+        """Run a read query under the connection lock."""
+        with self.connection_lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def get(self, key, default):
+        """Return the cursor of a tenant or ``default``."""
+        with self.connection_lock:
+            if key in self.cursors:
+                return self.cursors[key]
+            rows = self._query(
+                'SELECT cursor FROM cursors WHERE tenant = ?', (key,)
+            )
+        return rows[0][0] if rows else default
+
+    def set(self, key, cursor):
+        """Buffer a new cursor of a tenant."""
+        with self.lock:
+            self.cursors[key] = cursor
+            self.dirty = True
+
+    def statuses(self, key):
+        """Return ``{homework key: status}`` of a tenant."""
+        with self.connection_lock:
+            statuses = dict(self._query(
+                'SELECT homework, status FROM statuses WHERE tenant = ?',
+                (key,)
+            ))
+            with self.lock:
+                statuses.update(self.homeworks.get(key, {}))
+        return statuses
+
+    def _load_board(self, chat_id):
+        """Read the board of a chat; the caller holds both locks."""
+        rows = self.connection.execute(
+            'SELECT message_id, lines, shown FROM boards WHERE chat_id = ?',
+            (chat_id,)
+        ).fetchall()
+        if not rows:
+            return None
+        message_id, lines, shown = rows[0]
+        return [message_id, json.loads(lines), shown]
+
+    def _cache_board(self, chat_id):
+        """Read the board of a chat into memory unless it is there."""
+        chat_id = str(chat_id)
+        if chat_id in self.boards:
+            return
+        with self.connection_lock, self.lock:
+            if chat_id not in self.boards:
+                self.boards[chat_id] = (
+                    self._load_board(chat_id) or [None, {}, '']
+                )
+
+    def board(self, chat_id):
+        """Return ``(message id, {line key: text}, shown text)``."""
+        self._cache_board(chat_id)
+        return super().board(chat_id)
+
+    def set_board_lines(self, chat_id, lines):
+        """Add or replace lines of the status board of a chat."""
+        self._cache_board(chat_id)
+        super().set_board_lines(chat_id, lines)
+
+    def set_board_message(self, chat_id, message_id, shown):
+        """Remember which message shows the board and its text."""
+        self._cache_board(chat_id)
+        super().set_board_message(chat_id, message_id, shown)
+
+    def status_lines(self, chat_id):
+        """Return the lines of a chat, fresh from disk if not cached.
+
+        Another process may own the chat, so its board is not cached.
+        """
+        chat_id = str(chat_id)
+        with self.connection_lock, self.lock:
+            board = self.boards.get(chat_id) or self._load_board(chat_id)
+            return dict(board[1]) if board else {}
+
+    def history(self, chat_id, limit=HISTORY_SIZE):
+        """Return up to ``limit`` ``(time, text)`` of a chat, newest first."""
+        with self.connection_lock:
+            rows = self._query(
+                'SELECT at, text FROM history WHERE chat_id = ? '
+                'ORDER BY at DESC LIMIT ?', (str(chat_id), limit)
+            )
+            events = super().history(chat_id, limit) + rows
+        return sorted(events, reverse=True)[:limit]
+
+    def set_paused(self, chat_id, paused):
+        """Pause or resume notifications to a chat and buffer the flag."""
+        super().set_paused(chat_id, paused)
+        with self.lock:
+            self.pauses[str(chat_id)] = paused
+
+    def _load_paused(self):
+        """Reread paused chats; flags not written yet still win."""
+        with self.connection_lock:
+            rows = self._query('SELECT chat_id FROM paused')
+            with self.lock:
+                paused = {chat_id for chat_id, in rows}
+                for chat_id, flag in self.pauses.items():
+                    if flag:
+                        paused.add(chat_id)
+                    else:
+                        paused.discard(chat_id)
+                self.paused = paused
+
+    def pending_messages(self):
+        """Return ``(id, tenant key, chat id, text)`` of unsent messages."""
+        with self.connection_lock, self.lock:
+            rows = self._query(
+                'SELECT id, tenant, chat_id, text FROM messages '
+                'WHERE sent IS NULL ORDER BY created'
+            )
+            known = {row[0] for row in rows}
+            rows += [
+                (message_id, *row)
+                for message_id, row in self.messages.items()
+                if message_id not in known
+            ]
+            return [row for row in rows if row[0] not in self.sent]
+
+    def mark_sent(self, message_id):
+        """Buffer the delivery of a message."""
+        with self.lock:
+            self.sent[message_id] = time.time()
+            self.dirty = True
+
+    def flush(self):
+        """Write every buffered change in one transaction.
+
+        Paused chats are reread afterwards, even if nothing changed.
+        """
+        with self.connection_lock:
+            batch = self._take_batch()
+            if batch is not None:
+                try:
+                    self._write_batch(*batch)
+                except sqlite3.Error:
+                    with self.lock:
+                        self._restore(*batch)
+                    raise
+            self._load_paused()
+
+    def _take_batch(self):
+        """Swap the buffers out; return them or ``None`` if clean."""
+        with self.lock:
+            if not self.dirty:
+                return None
+            cursors, self.cursors = self.cursors, {}
+            homeworks, self.homeworks = self.homeworks, {}
+            messages, self.messages = self.messages, {}
+            sent, self.sent = self.sent, {}
+            boards = {
+                chat_id: (
+                    self.boards[chat_id][0], dict(self.boards[chat_id][1]),
+                    self.boards[chat_id][2]
+                )
+                for chat_id in self.changed_boards
+            }
+            self.changed_boards = set()
+            events, self.events = self.events, {}
+            pauses, self.pauses = self.pauses, {}
+            self.dirty = False
+            return cursors, homeworks, messages, sent, boards, events, pauses
+
+    def _write_batch(self, cursors, homeworks, messages, sent, boards,
+                     events, pauses):
+        """Write a batch in one transaction; the caller holds the lock."""
+        now = time.time()
+        with self.connection:
+            self.connection.execute('BEGIN')
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO cursors VALUES (?, ?)',
+                cursors.items()
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO statuses VALUES (?, ?, ?)',
+                [(key, homework, status)
+                 for key, statuses in homeworks.items()
+                 for homework, status in statuses.items()]
+            )
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?, NULL)',
+                [(message_id, *row, now)
+                 for message_id, row in messages.items()]
+            )
+            self.connection.executemany(
+                'UPDATE messages SET sent = ? WHERE id = ?',
+                [(at, message_id) for message_id, at in sent.items()]
+            )
+            self.connection.execute(
+                'DELETE FROM messages WHERE sent < ?',
+                (now - self.sent_retention,)
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO boards VALUES (?, ?, ?, ?)',
+                [(chat_id, message_id,
+                  json.dumps(lines, ensure_ascii=False), shown)
+                 for chat_id, (message_id, lines, shown) in boards.items()]
+            )
+            self._write_events(events)
+            self._write_pauses(pauses)
+
+    def _write_events(self, events):
+        """Append transitions and keep the newest of every chat."""
+        self.connection.executemany(
+            'INSERT INTO history VALUES (?, ?, ?)',
+            [(chat_id, at, text)
+             for chat_id, chat_events in events.items()
+             for at, text in chat_events]
+        )
+        self.connection.executemany(
+            'DELETE FROM history WHERE chat_id = ? AND at < ('
+            'SELECT at FROM history WHERE chat_id = ? '
+            'ORDER BY at DESC LIMIT 1 OFFSET ?)',
+            [(chat_id, chat_id, HISTORY_SIZE - 1) for chat_id in events]
+        )
+
+    def _write_pauses(self, pauses):
+        """Store the paused flags that changed."""
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO paused VALUES (?)',
+            [(chat_id,) for chat_id, paused in pauses.items() if paused]
+        )
+        self.connection.executemany(
+            'DELETE FROM paused WHERE chat_id = ?',
+            [(chat_id,) for chat_id, paused in pauses.items() if not paused]
+        )
+
+    def _restore(self, cursors, homeworks, messages, sent, boards, events,
+                 pauses):
+        """Put a failed batch back into the buffers."""
+        for key, cursor in cursors.items():
+            self.cursors.setdefault(key, cursor)
+        for key, statuses in homeworks.items():
+            for homework, status in statuses.items():
+                self.homeworks.setdefault(key, {}).setdefault(
+                    homework, status
+                )
+        for message_id, row in messages.items():
+            self.messages.setdefault(message_id, row)
+        for message_id, at in sent.items():
+            self.sent.setdefault(message_id, at)
+        self.changed_boards.update(boards)
+        for chat_id, chat_events in events.items():
+            self.events[chat_id] = (
+                chat_events + self.events.get(chat_id, [])
+            )[-HISTORY_SIZE:]
+        for chat_id, paused in pauses.items():
+            self.pauses.setdefault(chat_id, paused)
+        self.dirty = True
+
+    def close(self):
+        """Flush and close the database."""
+        with self.connection_lock:
+            self.flush()
+            self.connection.close()
+
+
+def open_store(path):
+    """Open the state store for ``path``.
+
+    ``.db``/``.sqlite``/``.sqlite3`` files use SQLite, other paths a
+    JSON file and an empty path keeps the state in memory.
+    """
+    if not path:
+        return StateStore()
+    if str(path).endswith(SQLITE_SUFFIXES):
+        return SQLiteStateStore(path)
+    return JsonStateStore(path)
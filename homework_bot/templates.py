@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import sys
+import time
+from string import Formatter
+
+from homework_bot.models import STATUSES, Homework
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCALE = 'ru'
+DEFAULT_MESSAGE = 'Изменился статус проверки работы "{name}". {verdict}'
+RELOAD_INTERVAL = 1
+FIELDS = ('id', 'name', 'date_updated')
+
+
+class Template:
+    """Message template with the verdict and status already filled in.
+
+    Only the homework fields are left to substitute, so rendering is a
+    join of precomputed literals and record attributes.
+    """
+
+    __slots__ = ('parts',)
+
+    def __init__(self, message, verdict, status):
+        baked = {'verdict': verdict, 'status': status}
+        parts = []
+        literal = ''
+        for text, field, spec, conversion in Formatter().parse(message):
+            literal += text
+            if field is None:
+                continue
+            if spec or conversion:
+                raise ValueError(f'Format specs are not supported: {field}')
+            if field in baked:
+                literal += baked[field]
+            elif field in FIELDS:
+                parts.append((literal, field))
+                literal = ''
+            else:
+                raise ValueError(f'Unknown template field {field}')
+        parts.append((literal, None))
+        self.parts = tuple(parts)
+
+    def render(self, homework):
+        """Format the message of one ``Homework``."""
+        chunks = []
+        for literal, field in self.parts:
+            chunks.append(literal)
+            if field is not None:
+                chunks.append(str(getattr(homework, field)))
+        return ''.join(chunks)
+
+
+def merge_config(base, config):
+    """Overlay a catalog file on the built-in catalog."""
+    locales = {
+        name: dict(locale, verdicts=dict(locale['verdicts']))
+        for name, locale in base['locales'].items()
+    }
+    for name, locale in config.get('locales', {}).items():
+        merged = locales.setdefault(name, {'verdicts': {}})
+        if 'message' in locale:
+            merged['message'] = locale['message']
+        merged['verdicts'].update(locale.get('verdicts', {}))
+    return {
+        'default_locale': config.get(
+            'default_locale', base['default_locale']
+        ),
+        'locales': locales,
+    }
+
+
+def compile_catalog(config):
+    """Build the status table and a ``Template`` per (status, locale)."""
+    default_locale = config['default_locale']
+    locales = config['locales']
+    if default_locale not in locales:
+        raise ValueError(f'No default locale {default_locale}')
+    default = locales[default_locale]
+    statuses = {}
+    for locale in locales.values():
+        for value in locale['verdicts']:
+            statuses[value] = STATUSES.get(value) or sys.intern(value)
+    templates = {}
+    for name, locale in locales.items():
+        message = locale.get('message') or default['message']
+        for value, status in statuses.items():
+            verdict = locale['verdicts'].get(value)
+            if verdict is None:
+                verdict = default['verdicts'].get(value)
+            if verdict is None:
+                raise ValueError(f'No verdict for {value} in {name}')
+            templates[(status, name)] = Template(message, verdict, value)
+    return statuses, templates, default_locale
+
+
+class Catalog:
+    """Verdicts and message templates per locale, reloaded from a file.
+
+    The built-in ``verdicts`` and ``message`` form the ``locale``
+    catalog; a JSON file at ``path`` may override them and add locales
+    and statuses::
+
+        {"default_locale": "ru",
+         "locales": {"en": {"message": "{name}: {verdict}",
+                            "verdicts": {"approved": "Approved!"}}}}
+
+    Templates may use ``{name}``, ``{id}``, ``{date_updated}``,
+    ``{status}`` and ``{verdict}``. Missing verdicts fall back to the
+    default locale. ``refresh`` reloads the file when its mtime changes,
+    at most every ``reload_interval`` seconds; a broken file is logged
+    and the previous catalog is kept.
+    """
+
+    def __init__(self, verdicts, path=None, message=DEFAULT_MESSAGE,
+                 locale=DEFAULT_LOCALE, reload_interval=RELOAD_INTERVAL,
+                 clock=time.monotonic):
+        self.builtin = {
+            'default_locale': locale,
+            'locales': {
+                locale: {'message': message, 'verdicts': dict(verdicts)}
+            },
+        }
+        self.path = path
+        self.reload_interval = reload_interval
+        self.clock = clock
+        self.mtime = None
+        self.checked = clock()
+        self.reloads = 0
+        self.load()
+
+    def load(self):
+        """Read the file, if any, and recompile every template."""
+        config = self.builtin
+        mtime = None
+        if self.path:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, encoding='utf-8') as file:
+                config = merge_config(config, json.load(file))
+        self.statuses, self.templates, self.default_locale = (
+            compile_catalog(config)
+        )
+        self.mtime = mtime
+
+    def refresh(self):
+        """Reload the file if it changed since the last load."""
+        now = self.clock()
+        if not self.path or now - self.checked < self.reload_interval:
+            return False
+        self.checked = now
+        try:
+            if os.stat(self.path).st_mtime_ns == self.mtime:
+                return False
+            self.load()
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logger.error(f'Templates are not reloaded: {error}')
+            return False
+        self.reloads += 1
+        logger.info(f'Templates are reloaded from {self.path}')
+        return True
+
+    def render(self, homework, locale=None):
+        """Message of a homework dict or ``Homework`` in a locale."""
+        if not isinstance(homework, Homework):
+            homework = Homework.from_dict(homework, self.statuses)
+        template = self.templates.get((homework.status, locale))
+        if template is None:
+            template = self.templates[(homework.status, self.default_locale)]
+        return template.render(homework)
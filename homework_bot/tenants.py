@@ -0,0 +1,43 @@
+import hashlib
+import json
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Tenant:
+    """One Practicum token followed from one Telegram chat."""
+
+    practicum_token: str
+    chat_id: str
+    locale: str = None
+
+    @property
+    def token_key(self):
+        """Stable key of the token that does not expose it."""
+        digest = hashlib.sha256(self.practicum_token.encode()).hexdigest()
+        return digest[:12]
+
+    @property
+    def key(self):
+        """Stable tenant key that does not expose the token."""
+        return f'{self.token_key}:{self.chat_id}'
+
+    @property
+    def headers(self):
+        """Authorization headers for the Practicum API."""
+        return {'Authorization': f'OAuth {self.practicum_token}'}
+
+
+def load_tenants(path):
+    """Read tenants from a JSON list of token/chat id objects."""
+    with open(path, encoding='utf-8') as file:
+        raw_tenants = json.load(file)
+    if not isinstance(raw_tenants, list):
+        raise TypeError(f'Was expected list type, {type(raw_tenants)}')
+    return [
+        Tenant(
+            str(item['practicum_token']), str(item['chat_id']),
+            item.get('locale')
+        )
+        for item in raw_tenants
+    ]
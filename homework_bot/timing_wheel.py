@@ -0,0 +1,112 @@
+import math
+
+TICK = 0.1
+SLOT_BITS = 6
+LEVELS = 4
+
+
+class LagMonitor:
+    """Running statistics of how late something happened, in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def observe(self, lag):
+        """Record one measurement."""
+        lag = max(lag, 0.0)
+        self.count += 1
+        self.total += lag
+        self.last = lag
+        self.max = max(self.max, lag)
+
+    @property
+    def mean(self):
+        """Average lag over every measurement."""
+        return self.total / self.count if self.count else 0.0
+
+
+class TimingWheel:
+    """Hierarchical timing wheel keyed by tenant.
+
+    ``LEVELS`` wheels of ``2 ** SLOT_BITS`` slots each; a slot of level
+    ``n`` spans ``2 ** (SLOT_BITS * n)`` ticks of ``tick`` seconds. A
+    timer lives in the lowest level that covers its delay and moves one
+    level down when its slot comes round, so ``schedule`` and ``cancel``
+    are O(1) and ``advance`` is O(1) amortized per timer. Time is passed
+    in by the caller, which keeps the wheel independent of the clock.
+    """
+
+    def __init__(self, tick=TICK, now=0.0):
+        self.tick = tick
+        self.origin = now
+        self.current = 0
+        self.size = 1 << SLOT_BITS
+        self.mask = self.size - 1
+        self.wheels = [
+            [{} for _ in range(self.size)] for _ in range(LEVELS)
+        ]
+        self.locations = {}
+        self.lateness = LagMonitor()
+
+    def __len__(self):
+        """Number of pending timers."""
+        return len(self.locations)
+
+    def __contains__(self, key):
+        """Tell whether a timer for ``key`` is pending."""
+        return key in self.locations
+
+    def _place(self, key, deadline):
+        """Put a timer into the slot covering its deadline."""
+        delta = deadline - self.current
+        for level in range(LEVELS):
+            if delta < 1 << (SLOT_BITS * (level + 1)):
+                break
+        shift = SLOT_BITS * level
+        slot = self.wheels[level][(deadline >> shift) & self.mask]
+        slot[key] = deadline
+        self.locations[key] = slot
+
+    def schedule(self, key, delay, now):
+        """Fire ``key`` after ``delay`` seconds, replacing its timer."""
+        self.cancel(key)
+        ticks = math.ceil((now + delay - self.origin) / self.tick)
+        self._place(key, max(ticks, self.current + 1))
+
+    def cancel(self, key):
+        """Drop the pending timer of ``key`` if there is one."""
+        slot = self.locations.pop(key, None)
+        if slot is not None:
+            del slot[key]
+
+    def _cascade(self, level):
+        """Move the due slot of ``level`` one level down."""
+        index = (self.current >> (SLOT_BITS * level)) & self.mask
+        slot = self.wheels[level][index]
+        self.wheels[level][index] = {}
+        for key, deadline in slot.items():
+            self._place(key, deadline)
+
+    def advance(self, now):
+        """Move the wheel to ``now`` and return the keys that are due."""
+        target = int((now - self.origin) / self.tick)
+        due = []
+        while self.current < target:
+            self.current += 1
+            for level in range(LEVELS - 1, 0, -1):
+                if not self.current & ((1 << (SLOT_BITS * level)) - 1):
+                    self._cascade(level)
+            index = self.current & self.mask
+            slot = self.wheels[0][index]
+            if slot:
+                self.wheels[0][index] = {}
+                for key, deadline in slot.items():
+                    del self.locations[key]
+                    self.lateness.observe(
+                        now - self.origin - deadline * self.tick
+                    )
+                    due.append(key)
+        return due
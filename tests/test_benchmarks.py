@@ -0,0 +1,46 @@
+import requests
+import telegram
+from telegram.error import RetryAfter
+
+from benchmarks.fake_servers import (FakeConfig, PracticumHandler,
+                                     TelegramHandler, start_server)
+from benchmarks.run import percentile
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 51
+    assert percentile(values, 0.99) == 100
+    assert percentile([], 0.5) == 0.0
+
+
+def test_fake_practicum():
+    server = start_server(PracticumHandler, FakeConfig(homeworks=2))
+    url = f'http://127.0.0.1:{server.server_address[1]}/homework_statuses/'
+    try:
+        assert requests.get(url, timeout=5).status_code == 401
+        data = requests.get(
+            url, headers={'Authorization': 'OAuth token'}, timeout=5
+        ).json()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert [homework['id'] for homework in data['homeworks']] == [0, 1]
+    assert isinstance(data['current_date'], int)
+
+
+def test_fake_telegram_throttles():
+    server = start_server(TelegramHandler, FakeConfig(throttle_rate=1))
+    bot = telegram.Bot(
+        '1234:abcdefg',
+        base_url=f'http://127.0.0.1:{server.server_address[1]}/bot'
+    )
+    try:
+        bot.send_message(chat_id=1, text='hello')
+    except RetryAfter as error:
+        assert error.retry_after == 1
+    else:
+        raise AssertionError('Fake Telegram did not throttle')
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,99 @@
+import asyncio
+
+from telegram.error import BadRequest, Unauthorized
+
+from homework_bot.board import StatusBoard, render_board
+from homework_bot.delivery import SendQueue
+from homework_bot.state import StateStore
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.messages = {}
+        self.calls = []
+        self.next_id = 1
+
+    def send(self, chat_id, text):
+        message_id = self.next_id
+        self.next_id += 1
+        self.messages[message_id] = text
+        self.calls.append(('send', text))
+        return message_id
+
+    def edit(self, chat_id, message_id, text):
+        if message_id not in self.messages:
+            raise BadRequest('Message to edit not found')
+        if self.messages[message_id] == text:
+            raise BadRequest('Message is not modified: same content')
+        self.messages[message_id] = text
+        self.calls.append(('edit', text))
+
+    def pin(self, chat_id, message_id):
+        raise Unauthorized('not enough rights to pin a message')
+
+
+def make_board(store, telegram):
+    return StatusBoard(
+        store, telegram.send, telegram.edit, telegram.pin, debounce=0.01,
+        queue=SendQueue(None, workers=1, chat_rate=1000, global_rate=1000)
+    )
+
+
+def run(board, steps):
+    async def main():
+        board.start()
+        for step in steps:
+            step()
+            await board.join()
+        await board.stop()
+
+    asyncio.run(main())
+
+
+def test_render_board_drops_oldest_lines():
+    lines = {'a': 'x' * 6, 'b': 'y' * 6, 'c': 'z' * 6}
+    assert render_board(lines) == '\n'.join(lines.values())
+    assert render_board(lines, limit=15) == '…\n' + 'y' * 6 + '\n' + 'z' * 6
+
+
+class TestStatusBoard:
+    def test_changes_are_coalesced_and_edited(self):
+        store, telegram = StateStore(), FakeTelegram()
+        board = make_board(store, telegram)
+
+        def first():
+            board.update('1', 'a', 'a: reviewing')
+            board.update('1', 'b', 'b: reviewing')
+
+        def second():
+            board.update('1', 'a', 'a: approved')
+
+        run(board, [first, second])
+        assert telegram.calls == [
+            ('send', 'a: reviewing\nb: reviewing'),
+            ('edit', 'a: approved\nb: reviewing'),
+        ]
+        assert store.board('1') == (
+            1, {'a': 'a: approved', 'b': 'b: reviewing'},
+            'a: approved\nb: reviewing'
+        )
+
+    def test_deleted_board_is_sent_again(self):
+        store, telegram = StateStore(), FakeTelegram()
+        board = make_board(store, telegram)
+        store.set_board_lines('1', {'a': 'a: reviewing'})
+        store.set_board_message('1', 42, 'old')
+        run(board, [lambda: board.update('1', 'a', 'a: approved')])
+        assert telegram.calls == [('send', 'a: approved')]
+        assert store.board('1')[0] == 1
+
+    def test_unchanged_board_is_not_resent(self):
+        store, telegram = StateStore(), FakeTelegram()
+        board = make_board(store, telegram)
+        run(board, [
+            lambda: board.update('1', 'a', 'a: approved'),
+            lambda: store.set_board_message('1', 1, 'stale'),
+            lambda: board.resync(['1']),
+        ])
+        assert telegram.calls == [('send', 'a: approved')]
+        assert store.board('1')[2] == 'a: approved'
@@ -199,7 +199,9 @@ class TestHomework:
                     'Проверьте, что в параметре `from_date` передано число.'
                 )
 
-        monkeypatch.setattr(requests, 'get', check_request_call)
+        monkeypatch.setattr(
+            homework_module.HTTP_CLIENT.session, 'get', check_request_call
+        )
         try:
             homework_module.get_api_answer(current_timestamp)
         except AssertionError:
@@ -222,7 +224,9 @@ class TestHomework:
                 current_timestamp=current_timestamp, **kwargs
             )
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr(
+            homework_module.HTTP_CLIENT.session, 'get', mock_response_get
+        )
 
         result = homework_module.get_api_answer(current_timestamp)
         assert isinstance(result, dict), (
@@ -242,7 +246,7 @@ class TestHomework:
             self.HOMEWORK_FUNC_WITH_PARAMS_QTY[func_name]
         )
 
-        monkeypatch.setattr(requests, 'get', response)
+        monkeypatch.setattr(homework_module.HTTP_CLIENT.session, 'get', response)
         try:
             homework_module.get_api_answer(current_timestamp)
         except Exception:
@@ -266,7 +270,11 @@ class TestHomework:
         def mock_request_get_with_exception(*args, **kwargs):
             raise requests.RequestException('Something wrong')
 
-        monkeypatch.setattr(requests, 'get', mock_request_get_with_exception)
+        monkeypatch.setattr(
+            homework_module.HTTP_CLIENT.session,
+            'get',
+            mock_request_get_with_exception
+        )
         try:
             homework_module.get_api_answer(current_timestamp)
         except requests.RequestException as e:
@@ -578,7 +586,7 @@ class TestHomework:
                 data=response_data
             ))
         monkeypatch.setattr(
-            requests,
+            homework_module.HTTP_CLIENT.session,
             'get',
             mock_response_get_with_new_status
         )
@@ -636,7 +644,7 @@ class TestHomework:
                     if record.message == utils.MockResponseGET.CALLED_LOG_MSG
                 ]
                 assert log_record, (
-                    'Убедитесь, что бот использует функцию `requests.get()` '
+                    'Убедитесь, что бот использует общий HTTP-клиент '
                     'для отправки запроса к API домашки.'
                 )
 
@@ -0,0 +1,19 @@
+from homework_bot.bots import close_bots, get_bot
+
+
+class TestBotRegistry:
+    def teardown_method(self):
+        close_bots()
+
+    def test_bot_is_reused(self):
+        bot = get_bot('1234:abcdefg', pool_size=4)
+        assert get_bot('1234:abcdefg') is bot
+        assert bot.request.con_pool_size == 4
+
+    def test_one_bot_per_token(self):
+        assert get_bot('1234:abcdefg') is not get_bot('5678:abcdefg')
+
+    def test_close_bots(self):
+        bot = get_bot('1234:abcdefg')
+        close_bots()
+        assert get_bot('1234:abcdefg') is not bot
@@ -0,0 +1,93 @@
+import pytest
+
+from homework_bot.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from homework_bot.errors import (APIRequestError, APIResponseError,
+                                 CircuitOpen, is_outage)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock):
+    return CircuitBreaker(
+        failure_threshold=3, recovery_time=10, max_recovery_time=30,
+        clock=clock
+    )
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold(self):
+        breaker = make_breaker(Clock())
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record_failure()
+        assert breaker.state == CLOSED
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpen) as error:
+            breaker.before_call()
+        assert error.value.retry_after == 10
+        assert breaker.rejected == 1
+
+    def test_success_resets_failures(self):
+        breaker = make_breaker(Clock())
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+
+    def test_half_open_lets_one_probe_through(self):
+        clock = Clock()
+        breaker = make_breaker(clock)
+        for _ in range(3):
+            breaker.record_failure()
+        clock.now = 10
+        breaker.before_call()
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpen):
+            breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+        breaker.before_call()
+
+    def test_recheck_after_admission(self):
+        clock = Clock()
+        breaker = make_breaker(clock)
+        breaker.before_call()
+        breaker.recheck()
+        for _ in range(3):
+            breaker.record_failure()
+        with pytest.raises(CircuitOpen):
+            breaker.recheck()
+        clock.now = 10
+        breaker.before_call()
+        breaker.recheck()
+        assert breaker.probes == 1
+        assert breaker.rejected == 1
+
+    def test_failed_probe_doubles_cooldown(self):
+        clock = Clock()
+        breaker = make_breaker(clock)
+        for _ in range(3):
+            breaker.record_failure()
+        for cooldown in (20, 30):
+            clock.now += breaker.cooldown
+            breaker.before_call()
+            breaker.record_failure()
+            assert breaker.state == OPEN
+            assert breaker.cooldown == cooldown
+        assert breaker.opens == 3
+
+
+def test_is_outage():
+    assert is_outage(APIRequestError('Request Exception'))
+    assert is_outage(APIResponseError(503))
+    assert not is_outage(APIResponseError(401))
+    assert not is_outage(APIResponseError(429, retry_after=5))
+    assert not is_outage(ValueError())
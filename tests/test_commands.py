@@ -0,0 +1,126 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from homework_bot.commands import (HELP, NO_HISTORY, NO_STATUS, PAUSED,
+                                   RESUMED, CommandHandler, CommandPoller,
+                                   parse_command)
+from homework_bot.state import StateStore
+
+
+def update(update_id, chat_id, text):
+    return SimpleNamespace(
+        update_id=update_id,
+        message=SimpleNamespace(chat_id=chat_id, text=text)
+    )
+
+
+def test_parse_command():
+    assert parse_command('/status') == 'status'
+    assert parse_command('/History@homework_bot now') == 'history'
+    assert parse_command('status') is None
+    assert parse_command(None) is None
+
+
+class TestCommandHandler:
+    def test_status(self):
+        store = StateStore()
+        handler = CommandHandler(store)
+        assert handler.handle(1, '/status') == NO_STATUS
+        store.set_board_lines(1, {'a': 'a: reviewing', 'b': 'b: approved'})
+        store.set_board_lines(1, {'a': 'a: approved'})
+        assert handler.handle(1, '/status') == 'a: approved\nb: approved'
+        assert handler.handle(2, '/status') == NO_STATUS
+
+    def test_history(self):
+        store = StateStore()
+        handler = CommandHandler(store, history_limit=2)
+        assert handler.handle(1, '/history') == NO_HISTORY
+        for index, text in enumerate(['first', 'second', 'third']):
+            store.add_event(1, text, at=index * 60)
+        stamp = time.strftime('%d.%m %H:%M', time.localtime(60))
+        assert handler.handle(1, '/history').startswith(f'{stamp} second\n')
+        assert handler.handle(1, '/history').endswith(' third')
+
+    def test_pause_and_resume(self):
+        store = StateStore()
+        handler = CommandHandler(store)
+        assert handler.handle(1, '/pause') == PAUSED
+        assert store.is_paused(1)
+        assert not store.is_paused(2)
+        assert handler.handle(1, '/resume') == RESUMED
+        assert not store.is_paused(1)
+
+    def test_other_messages(self):
+        handler = CommandHandler(StateStore())
+        assert handler.handle(1, '/start') == HELP
+        assert handler.handle(1, '/unknown') is None
+        assert handler.handle(1, 'hello') is None
+
+
+class TestCommandPoller:
+    def run_poller(self, poller, active=lambda: True, duration=0.2):
+        replies = []
+
+        async def run():
+            task = asyncio.ensure_future(poller.run(
+                lambda chat_id, text: replies.append((chat_id, text)), active
+            ))
+            await asyncio.sleep(duration)
+            task.cancel()
+
+        asyncio.run(run())
+        return replies
+
+    def test_answers_and_confirms_updates(self):
+        batches = [
+            [update(5, 1, '/pause'), update(6, 2, 'hi'),
+             SimpleNamespace(update_id=7, message=None)],
+            [update(8, 1, '/resume')],
+        ]
+        offsets = []
+
+        def get_updates(offset, timeout):
+            offsets.append(offset)
+            if batches:
+                return batches.pop(0)
+            time.sleep(0.01)
+            return []
+
+        store = StateStore()
+        poller = CommandPoller(get_updates, CommandHandler(store))
+        replies = self.run_poller(poller)
+        assert replies == [(1, PAUSED), (1, RESUMED)]
+        assert offsets[:3] == [None, 8, 9]
+        assert poller.answered == 2
+        assert not store.is_paused(1)
+
+    def test_inactive_replica_does_not_poll(self):
+        calls = []
+
+        def get_updates(offset, timeout):
+            calls.append(offset)
+            return []
+
+        poller = CommandPoller(
+            get_updates, CommandHandler(StateStore()), error_delay=0.01
+        )
+        assert self.run_poller(poller, active=lambda: False) == []
+        assert calls == []
+
+    def test_errors_are_survived(self):
+        calls = []
+
+        def get_updates(offset, timeout):
+            calls.append(offset)
+            if len(calls) == 1:
+                raise ConnectionError('offline')
+            if len(calls) == 2:
+                return [update(1, 3, '/status')]
+            time.sleep(0.01)
+            return []
+
+        poller = CommandPoller(
+            get_updates, CommandHandler(StateStore()), error_delay=0.01
+        )
+        assert self.run_poller(poller) == [(3, NO_STATUS)]
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import threading
+import time
+
+from telegram.error import BadRequest, TimedOut, Unauthorized
+
+from homework_bot.credentials import (INVALID, OK, UNKNOWN, CredentialChecker,
+                                      check_bot, practicum_verdict,
+                                      telegram_verdict, write_report)
+from homework_bot.delivery import TokenBucket
+from homework_bot.errors import APIRequestError, APIResponseError
+from homework_bot.tenants import Tenant
+
+
+def test_practicum_verdict():
+    assert practicum_verdict(None) == OK
+    assert practicum_verdict(APIResponseError(401)) == INVALID
+    assert practicum_verdict(APIResponseError(403)) == INVALID
+    assert practicum_verdict(APIResponseError(500)) == UNKNOWN
+    assert practicum_verdict(APIRequestError('Request Exception')) == UNKNOWN
+
+
+def test_telegram_verdict():
+    assert telegram_verdict(None) == OK
+    assert telegram_verdict(BadRequest('Chat not found')) == INVALID
+    assert telegram_verdict(Unauthorized('Bot was blocked')) == INVALID
+    assert telegram_verdict(TimedOut()) == UNKNOWN
+
+
+def test_check_bot():
+    def rejected():
+        raise Unauthorized('Unauthorized')
+
+    def offline():
+        raise TimedOut()
+
+    assert check_bot(lambda: None) == OK
+    assert check_bot(rejected) == INVALID
+    assert check_bot(offline) == UNKNOWN
+
+
+class TestCredentialChecker:
+    def test_invalid_tenants_are_disabled(self):
+        tenants = [
+            Tenant('good', '1'), Tenant('bad', '2'),
+            Tenant('good', '3'), Tenant('flaky', '4'),
+        ]
+        fetched = []
+        chats = []
+
+        def fetch(headers, timestamp):
+            token = headers['Authorization'].split()[1]
+            fetched.append(token)
+            if token == 'bad':
+                raise APIResponseError(401)
+            if token == 'flaky':
+                raise APIRequestError('Request Exception')
+
+        def get_chat(chat_id):
+            chats.append(chat_id)
+            if chat_id == '3':
+                raise BadRequest('Chat not found')
+
+        checks = asyncio.run(CredentialChecker(fetch, get_chat).check(tenants))
+        assert [check.tenant for check in checks] == tenants
+        assert [(check.practicum, check.telegram) for check in checks] == [
+            (OK, OK), (INVALID, OK), (OK, INVALID), (UNKNOWN, OK)
+        ]
+        assert [check.enabled for check in checks] == [
+            True, False, False, True
+        ]
+        assert sorted(fetched) == ['bad', 'flaky', 'good']
+        assert sorted(chats) == ['1', '2', '3', '4']
+        assert checks[1].error == 'Wrong response 401'
+
+    def test_probes_run_concurrently(self):
+        tenants = [Tenant(f'token{i}', str(i)) for i in range(20)]
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def fetch(headers, timestamp):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+
+        checker = CredentialChecker(
+            fetch, lambda chat_id: None, practicum_in_flight=10
+        )
+        start = time.monotonic()
+        checks = asyncio.run(checker.check(tenants))
+        assert time.monotonic() - start < 0.5
+        assert max(peak) == 10
+        assert all(check.practicum == OK for check in checks)
+
+    def test_timeout_leaves_tenants_unverified(self):
+        tenants = [Tenant('slow', '1'), Tenant('fast', '2')]
+
+        def fetch(headers, timestamp):
+            if headers['Authorization'].endswith('slow'):
+                time.sleep(1)
+
+        checker = CredentialChecker(fetch, lambda chat_id: None, timeout=0.2)
+        start = time.monotonic()
+        checks = asyncio.run(checker.check(tenants))
+        assert time.monotonic() - start < 0.8
+        assert [check.practicum for check in checks] == [UNKNOWN, OK]
+        assert all(check.enabled for check in checks)
+
+    def test_budget_paces_practicum_probes(self):
+        tenants = [Tenant(f'token{i}', str(i)) for i in range(3)]
+        budget = TokenBucket(1000, capacity=1)
+        budget.pause(0.2)
+        checker = CredentialChecker(
+            lambda headers, timestamp: None, lambda chat_id: None,
+            timeout=0.1, budget=budget
+        )
+        checks = asyncio.run(checker.check(tenants))
+        assert [check.practicum for check in checks] == [UNKNOWN] * 3
+        assert [check.telegram for check in checks] == [OK] * 3
+
+
+def test_write_report(tmp_path):
+    tenant = Tenant('secret-token', '1')
+    checker = CredentialChecker(
+        lambda headers, timestamp: None, lambda chat_id: None
+    )
+    checks = asyncio.run(checker.check([tenant]))
+    path = tmp_path / 'report.json'
+    write_report(checks, path)
+    report = json.loads(path.read_text())
+    assert report == [{
+        'tenant': tenant.key, 'chat_id': '1', 'practicum': OK,
+        'telegram': OK, 'enabled': True, 'error': '',
+    }]
+    assert 'secret' not in path.read_text()
@@ -0,0 +1,193 @@
+import asyncio
+import time
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from homework_bot.delivery import (ALERT, DROPPED, FAILED, NOTICE, SENT,
+                                   VERDICT, SendQueue, TokenBucket,
+                                   is_transient, status_lane)
+
+
+def deliver(queue, messages):
+    async def run():
+        queue.start()
+        for chat_id, message, *lane in messages:
+            queue.put(chat_id, message, None, *lane)
+        await queue.join()
+        await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert 0 < bucket.take() <= 0.1
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(rate=10)
+    bucket.pause(5)
+    assert 4.9 < bucket.take() <= 5
+    bucket.paused_until = 0
+    assert bucket.take() == 0
+
+
+def test_token_bucket_serves_waiters_in_order():
+    bucket = TokenBucket(rate=100, capacity=1)
+    bucket.take()
+    takes = []
+    take = bucket.take
+
+    def counted_take():
+        takes.append(1)
+        return take()
+
+    bucket.take = counted_take
+    done = []
+
+    async def waiter(index):
+        await bucket.acquire()
+        done.append(index)
+
+    async def run():
+        await asyncio.gather(*(waiter(index) for index in range(10)))
+
+    asyncio.run(run())
+    assert done == list(range(10))
+    assert len(takes) <= 20
+
+
+def test_status_lane():
+    assert status_lane('reviewing') == NOTICE
+    assert status_lane('approved') == VERDICT
+    assert status_lane('rejected') == VERDICT
+
+
+def test_is_transient():
+    assert is_transient(TimedOut())
+    assert not is_transient(BadRequest('chat not found'))
+
+
+class TestSendQueue:
+    def test_chat_order_is_kept(self):
+        sent = []
+        queue = SendQueue(
+            lambda chat_id, text: sent.append((chat_id, text)),
+            workers=4, chat_rate=1000, global_rate=1000
+        )
+        messages = [(chat, f'{chat}-{i}') for i in range(5) for chat in 'ab']
+        deliver(queue, messages)
+        assert [m for m in sent if m[0] == 'a'] == [
+            ('a', f'a-{i}') for i in range(5)
+        ]
+        assert queue.sent == 10 and queue.size == 0
+
+    def test_chat_rate_is_limited(self):
+        sent = []
+        queue = SendQueue(
+            lambda chat_id, text: sent.append(time.monotonic()),
+            chat_rate=20, global_rate=1000
+        )
+        deliver(queue, [('a', str(i)) for i in range(3)])
+        assert sent[-1] - sent[0] >= 0.09
+
+    def test_retry_after_and_transient_errors(self):
+        errors = [RetryAfter(0.01), TimedOut()]
+        sent = []
+
+        def send(chat_id, text):
+            if errors:
+                raise errors.pop(0)
+            sent.append(text)
+
+        queue = SendQueue(send, chat_rate=1000, backoff=0.01)
+        deliver(queue, [('a', 'hello')])
+        assert sent == ['hello']
+        assert queue.sent == 1
+
+    def test_permanent_error_is_dropped(self):
+        calls = []
+
+        def send(chat_id, text):
+            calls.append(text)
+            raise BadRequest('chat not found')
+
+        queue = SendQueue(send, chat_rate=1000)
+        deliver(queue, [('a', 'hello'), ('a', 'again')])
+        assert calls == ['hello', 'again']
+        assert queue.failed == 2
+
+    def test_inactive_queue_skips_messages(self):
+        sent = []
+        active = [True]
+
+        def send(chat_id, text):
+            sent.append(text)
+            active[0] = False
+
+        queue = SendQueue(send, chat_rate=1000, active=lambda: active[0])
+        deliver(queue, [('a', 'first'), ('a', 'second'), ('b', 'third')])
+        assert sent == ['first']
+        assert queue.sent == 1
+        assert queue.skipped == 2
+
+    def test_outcomes(self):
+        def send(chat_id, text):
+            if text == 'blocked':
+                raise BadRequest('chat not found')
+            if text == 'offline':
+                raise NetworkError('offline')
+
+        outcomes = {}
+        queue = SendQueue(
+            send, chat_rate=1000, max_attempts=2, backoff=0.01,
+            on_done=outcomes.__setitem__
+        )
+
+        async def run():
+            queue.start()
+            for text in ('sent', 'blocked', 'offline'):
+                queue.put(text, text, message_id=text)
+            await asyncio.wait_for(queue.join(), 5)
+            await queue.stop()
+
+        asyncio.run(run())
+        assert outcomes == {'sent': SENT, 'blocked': DROPPED, 'offline': FAILED}
+
+    def test_urgent_lanes_go_first(self):
+        sent = []
+        queue = SendQueue(
+            lambda chat_id, text: sent.append(text),
+            workers=1, chat_rate=1000, global_rate=1000
+        )
+        deliver(queue, [
+            ('n1', 'notice 1', NOTICE), ('n2', 'notice 2', NOTICE),
+            ('v', 'verdict', VERDICT), ('a', 'alert', ALERT),
+        ])
+        assert sent == ['alert', 'verdict', 'notice 1', 'notice 2']
+        assert set(queue.lane_sizes.values()) == {0}
+
+    def test_chat_order_beats_lanes(self):
+        sent = []
+        queue = SendQueue(
+            lambda chat_id, text: sent.append(text),
+            workers=1, chat_rate=1000, global_rate=1000
+        )
+        deliver(queue, [
+            ('a', 'reviewing', NOTICE), ('a', 'approved', VERDICT),
+            ('b', 'rejected', VERDICT),
+        ])
+        assert sent == ['rejected', 'reviewing', 'approved']
+
+    def test_starving_lane_is_served(self):
+        sent = []
+        queue = SendQueue(
+            lambda chat_id, text: sent.append(text),
+            workers=1, chat_rate=1000, global_rate=1000, max_wait=0
+        )
+        deliver(queue, [
+            ('n', 'notice', NOTICE), ('v', 'verdict', VERDICT),
+        ])
+        assert sent == ['notice', 'verdict']
@@ -0,0 +1,32 @@
+from homework_bot.diff import StatusIndex
+from homework_bot.models import Homework
+
+
+class TestStatusIndex:
+    def test_only_transitions_are_returned(self):
+        index = StatusIndex()
+        first = Homework(1, 'a', 'reviewing')
+        second = Homework(2, 'b', 'approved')
+        assert index.changes([first, second]) == [second, first]
+        assert index.remember(first) == '1'
+        index.remember(second)
+        assert index.changes([first, second]) == []
+        rejected = Homework(1, 'a', 'rejected')
+        assert index.changes([rejected, second]) == [rejected]
+
+    def test_not_remembered_until_delivered(self):
+        index = StatusIndex()
+        homework = Homework(1, 'a', 'reviewing')
+        assert index.changes([homework]) == [homework]
+        assert index.changes([homework]) == [homework]
+
+    def test_newest_duplicate_wins(self):
+        index = StatusIndex({'1': 'reviewing'})
+        newest = Homework(1, 'a', 'approved')
+        oldest = Homework(1, 'a', 'reviewing')
+        assert index.changes([newest, oldest]) == [newest]
+
+    def test_name_is_the_key_without_id(self):
+        index = StatusIndex({'hw': 'approved'})
+        assert index.changes([Homework(None, 'hw', 'approved')]) == []
+        assert index.changes([Homework(0, 'hw', 'approved')]) != []
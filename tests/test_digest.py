@@ -0,0 +1,30 @@
+from homework_bot.digest import SEPARATOR, build_digests, split_text
+
+
+def test_split_text_prefers_line_breaks():
+    text = 'a' * 6 + '\n' + 'b' * 6
+    assert split_text(text, limit=10) == ['a' * 6, 'b' * 6]
+    assert split_text('c' * 25, limit=10) == ['c' * 10, 'c' * 10, 'c' * 5]
+    assert split_text('short', limit=10) == ['short']
+
+
+def test_messages_are_merged_in_order():
+    messages = [(str(index), f'hw{index}') for index in range(3)]
+    assert build_digests(messages) == [
+        (('0', '1', '2'), SEPARATOR.join(['hw0', 'hw1', 'hw2']))
+    ]
+
+
+def test_digest_size_is_capped():
+    messages = [(str(index), 'x') for index in range(5)]
+    digests = build_digests(messages, max_items=2)
+    assert [ids for ids, _ in digests] == [('0', '1'), ('2', '3'), ('4',)]
+
+
+def test_digest_length_is_capped():
+    messages = [('a', 'x' * 6), ('b', 'y' * 6), ('c', 'z' * 25)]
+    digests = build_digests(messages, limit=10)
+    assert digests == [
+        (('a',), 'x' * 6), (('b',), 'y' * 6),
+        ((), 'z' * 10), ((), 'z' * 10), (('c',), 'z' * 5),
+    ]
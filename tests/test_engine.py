@@ -0,0 +1,510 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+from telegram.error import BadRequest, NetworkError
+
+from homework_bot import engine as engine_module
+from homework_bot.board import StatusBoard
+from homework_bot.breaker import CLOSED, CircuitBreaker
+from homework_bot.delivery import SendQueue, TokenBucket
+from homework_bot.engine import PollingEngine
+from homework_bot.errors import APIRequestError, APIResponseError
+from homework_bot.models import parse_response
+from homework_bot.scheduler import AdaptiveSchedule
+from homework_bot.state import JsonStateStore, SQLiteStateStore, StateStore
+from homework_bot.templates import Catalog
+from homework_bot.tenants import Tenant, load_tenants
+
+
+def check_response(response):
+    return parse_response(response)
+
+
+def parse_status(homework):
+    return f'{homework.name}: {homework.status}'
+
+
+class TestPollingEngine:
+    def make_engine(self, tenants, fetch, sent, **kwargs):
+        def send(chat_id, message):
+            sent.append((chat_id, message))
+
+        queue = SendQueue(send, workers=1, chat_rate=1000, global_rate=1000)
+        kwargs.setdefault('budget', TokenBucket(1000))
+        return PollingEngine(
+            tenants, fetch=fetch, check=check_response, parse=parse_status,
+            queue=queue, schedule=AdaptiveSchedule(0, 0, 0, 0, jitter=0),
+            tick=0.01, **kwargs
+        )
+
+    def test_load_tenants(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        path.write_text(json.dumps([
+            {'practicum_token': 'a', 'chat_id': 1},
+            {'practicum_token': 'b', 'chat_id': '2'},
+        ]))
+        assert load_tenants(path) == [Tenant('a', '1'), Tenant('b', '2')]
+
+    def test_tenant_key_hides_token(self):
+        tenant = Tenant('secret-token', '42')
+        assert 'secret' not in tenant.key
+        assert tenant.key.endswith(':42')
+        assert tenant.headers == {'Authorization': 'OAuth secret-token'}
+
+    def test_each_tenant_notified_once(self):
+        tenants = [Tenant(f'token{i}', str(i)) for i in range(20)]
+
+        def fetch(headers, timestamp):
+            token = headers['Authorization'].split()[1]
+            return {'homeworks': [
+                {'homework_name': token, 'status': 'approved'}
+            ], 'current_date': 1}
+
+        sent = []
+        engine = self.make_engine(tenants, fetch, sent)
+        asyncio.run(engine.run(cycles=3))
+        assert sorted(sent) == sorted(
+            (str(i), f'token{i}: approved') for i in range(20)
+        )
+        assert all(state.polls == 3 for state in engine.states.values())
+        assert engine.loop_lag.count > 0
+        assert len(engine.wheel) == 0
+
+    def test_bounded_run_polls_right_away(self):
+        def fetch(headers, timestamp):
+            return {'homeworks': [], 'current_date': 1}
+
+        engine = self.make_engine([Tenant('a', '1')], fetch, [])
+        engine.schedule = AdaptiveSchedule(normal=600, jitter=0.5)
+        start = time.monotonic()
+        asyncio.run(engine.run(cycles=1))
+        assert time.monotonic() - start < 1
+        assert engine.states[Tenant('a', '1').key].polls == 1
+
+    def test_errors_are_isolated(self):
+        tenants = [Tenant('bad', '1'), Tenant('good', '2')]
+
+        def fetch(headers, timestamp):
+            if headers['Authorization'] == 'OAuth bad':
+                raise Exception('Request Exception')
+            return {'homeworks': [
+                {'homework_name': 'hw', 'status': 'reviewing'}
+            ]}
+
+        sent = []
+        engine = self.make_engine(tenants, fetch, sent)
+        asyncio.run(engine.run(cycles=2))
+        assert sent == [('2', 'hw: reviewing')]
+        assert engine.states[tenants[0].key].errors == 2
+        assert engine.states[tenants[1].key].errors == 0
+
+    @pytest.mark.parametrize('max_in_flight', [1, 4])
+    def test_in_flight_is_bounded(self, max_in_flight):
+        lock = threading.Lock()
+        counters = {'now': 0, 'peak': 0}
+
+        def fetch(headers, timestamp):
+            with lock:
+                counters['now'] += 1
+                counters['peak'] = max(counters['peak'], counters['now'])
+            time.sleep(0.01)
+            with lock:
+                counters['now'] -= 1
+            return {'homeworks': []}
+
+        tenants = [Tenant(f'token{i}', str(i)) for i in range(16)]
+        engine = self.make_engine(
+            tenants, fetch, [], max_in_flight=max_in_flight
+        )
+        asyncio.run(engine.run(cycles=1))
+        assert counters['peak'] <= max_in_flight
+
+    def test_cursor_advances_and_persists(self, tmp_path):
+        tenant = Tenant('token', '1')
+        requested = []
+
+        def fetch(headers, timestamp):
+            requested.append(timestamp)
+            return {'homeworks': [], 'current_date': 1000 + len(requested)}
+
+        store = JsonStateStore(tmp_path / 'state.json')
+        store.set(tenant.key, 1000)
+        engine = self.make_engine([tenant], fetch, [], store=store)
+        asyncio.run(engine.run(cycles=3))
+        assert requested == [1000, 1001, 1002]
+        reopened = JsonStateStore(tmp_path / 'state.json')
+        assert reopened.get(tenant.key, 0) == 1003
+
+    def test_statuses_survive_restart(self, tmp_path):
+        tenant = Tenant('token', '1')
+
+        def fetch(headers, timestamp):
+            return {'homeworks': [
+                {'id': 7, 'homework_name': 'a', 'status': 'approved'}
+            ]}
+
+        sent = []
+        for _ in range(2):
+            store = SQLiteStateStore(tmp_path / 'state.db')
+            engine = self.make_engine([tenant], fetch, sent, store=store)
+            asyncio.run(engine.run(cycles=1))
+            store.close()
+        assert sent == [('1', 'a: approved')]
+
+    def test_every_homework_is_diffed(self):
+        tenant = Tenant('token', '1')
+        responses = [
+            [{'id': 1, 'homework_name': 'a', 'status': 'reviewing'},
+             {'id': 2, 'homework_name': 'b', 'status': 'reviewing'}],
+            [{'id': 2, 'homework_name': 'b', 'status': 'approved'},
+             {'id': 1, 'homework_name': 'a', 'status': 'reviewing'}],
+        ]
+
+        def fetch(headers, timestamp):
+            return {'homeworks': responses.pop(0)}
+
+        sent = []
+        engine = self.make_engine([tenant], fetch, sent)
+        asyncio.run(engine.run(cycles=2))
+        assert sent == [
+            ('1', 'b: reviewing'), ('1', 'a: reviewing'), ('1', 'b: approved')
+        ]
+
+    def test_outbox_is_replayed_once(self, tmp_path):
+        tenant = Tenant('token', '1')
+        store = SQLiteStateStore(tmp_path / 'state.db')
+        store.add_message(tenant.key, '1', 'left over', message_id='old')
+        store.flush()
+
+        def fetch(headers, timestamp):
+            return {'homeworks': [
+                {'id': 7, 'homework_name': 'a', 'status': 'approved',
+                 'date_updated': '2020-02-13T14:40:57Z'}
+            ]}
+
+        sent = []
+        engine = self.make_engine([tenant], fetch, sent, store=store)
+        asyncio.run(engine.run(cycles=2))
+        store.close()
+        assert sent == [('1', 'left over'), ('1', 'a: approved')]
+        reopened = SQLiteStateStore(tmp_path / 'state.db')
+        assert reopened.pending_messages() == []
+        reopened.close()
+
+    def test_failed_message_stays_in_outbox(self, tmp_path):
+        tenant = Tenant('token', '1')
+        store = SQLiteStateStore(tmp_path / 'state.db')
+        texts = []
+
+        def send(chat_id, text):
+            texts.append(text)
+            if text == 'a: approved':
+                raise NetworkError('offline')
+            raise BadRequest('Chat not found')
+
+        def fetch(headers, timestamp):
+            return {'homeworks': [
+                {'id': 7, 'homework_name': 'a', 'status': 'approved'},
+                {'id': 8, 'homework_name': 'b', 'status': 'approved'},
+            ]}
+
+        engine = PollingEngine(
+            [tenant], fetch=fetch, check=check_response, parse=parse_status,
+            queue=SendQueue(send, workers=1, chat_rate=1000,
+                            global_rate=1000, max_attempts=2, backoff=0.01),
+            schedule=AdaptiveSchedule(0, 0, 0, 0, jitter=0), tick=0.01,
+            store=store, budget=TokenBucket(1000)
+        )
+        asyncio.run(engine.run(cycles=1))
+        store.close()
+        assert engine.queue.failed == 2
+        reopened = SQLiteStateStore(tmp_path / 'state.db')
+        assert [row[3] for row in reopened.pending_messages()] == [
+            'a: approved'
+        ]
+        assert reopened.statuses(tenant.key) == {
+            '7': 'approved', '8': 'approved'
+        }
+        reopened.close()
+
+    def test_delivery_during_outbox_read_is_not_resent(
+            self, tmp_path, monkeypatch):
+        monkeypatch.setattr(engine_module, 'FLUSH_INTERVAL', 0.01)
+        tenant = Tenant('token', '1')
+        store = SQLiteStateStore(tmp_path / 'state.db')
+        store.add_message(tenant.key, '1', 'left over', message_id='old')
+        store.flush()
+        reading = threading.Event()
+        delivered = threading.Event()
+        read = store.pending_messages
+        reads = []
+
+        def pending_messages():
+            rows = read()
+            reads.append(rows)
+            if len(reads) == 2:
+                reading.set()
+                delivered.wait(2)
+            return rows
+
+        store.pending_messages = pending_messages
+        sent = []
+
+        def send(chat_id, text):
+            reading.wait(2)
+            sent.append(text)
+
+        engine = PollingEngine(
+            [tenant], fetch=lambda headers, timestamp: {'homeworks': []},
+            check=check_response, parse=parse_status,
+            queue=SendQueue(send, workers=1, chat_rate=1000,
+                            global_rate=1000),
+            schedule=AdaptiveSchedule(0, 0, 0, 0, jitter=0), tick=0.01,
+            store=store, budget=TokenBucket(1000)
+        )
+        on_done = engine.queue.on_done
+
+        def done(message_id, outcome):
+            on_done(message_id, outcome)
+            delivered.set()
+
+        engine.queue.on_done = done
+        asyncio.run(engine.run(cycles=1))
+        store.pending_messages = read
+        assert sent == ['left over']
+        assert [row[0] for row in reads[1]] == ['old']
+        assert store.pending_messages() == []
+        store.close()
+
+    def test_message_is_not_queued_before_flush(self):
+        tenant = Tenant('token', '1')
+        store = StateStore()
+
+        def fetch(headers, timestamp):
+            return {'homeworks': [
+                {'id': 7, 'homework_name': 'a', 'status': 'approved'}
+            ]}
+
+        engine = self.make_engine([tenant], fetch, [], store=store)
+
+        async def poll():
+            engine.queue.start()
+            await engine.poll_once([tenant])
+            await engine.queue.stop()
+
+        engine._semaphore = asyncio.Semaphore(1)
+        asyncio.run(poll())
+        assert engine.queue.size == 0
+        assert [row[3] for row in store.pending_messages()] == ['a: approved']
+
+    def test_one_fetch_per_token(self):
+        tenants = [Tenant('shared', '1'), Tenant('shared', '2'),
+                   Tenant('own', '3')]
+        calls = []
+
+        def fetch(headers, timestamp):
+            calls.append(headers['Authorization'])
+            return {'homeworks': [
+                {'id': 1, 'homework_name': 'hw', 'status': 'reviewing'}
+            ]}
+
+        sent = []
+        engine = self.make_engine(tenants, fetch, sent)
+        asyncio.run(engine.run(cycles=2))
+        assert sorted(calls) == ['OAuth own'] * 2 + ['OAuth shared'] * 2
+        assert sorted(sent) == [
+            ('1', 'hw: reviewing'), ('2', 'hw: reviewing'),
+            ('3', 'hw: reviewing'),
+        ]
+        assert engine.fetches_saved == 2
+
+    def test_messages_follow_chat_locale(self, tmp_path):
+        path = tmp_path / 'templates.json'
+        path.write_text(json.dumps({'locales': {'en': {
+            'message': '{name}: {verdict}',
+            'verdicts': {'approved': 'approved'},
+        }}}))
+        tenants = [Tenant('shared', '1'), Tenant('shared', '2', 'en')]
+
+        def fetch(headers, timestamp):
+            return {'homeworks': [
+                {'homework_name': 'hw', 'status': 'approved'}
+            ]}
+
+        sent = []
+        engine = self.make_engine(
+            tenants, fetch, sent, catalog=Catalog({'approved': 'Ура!'}, path)
+        )
+        asyncio.run(engine.run(cycles=1))
+        assert sorted(sent) == [
+            ('1', 'Изменился статус проверки работы "hw". Ура!'),
+            ('2', 'hw: approved'),
+        ]
+
+    def test_catalog_is_reloaded(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(engine_module, 'FLUSH_INTERVAL', 0.01)
+        path = tmp_path / 'templates.json'
+
+        def write(verdict):
+            path.write_text(json.dumps({'locales': {'ru': {
+                'message': '{name}: {verdict}',
+                'verdicts': {'approved': verdict, 'reviewing': verdict},
+            }}}))
+
+        write('old')
+        catalog = Catalog(
+            {'approved': 'Ура!', 'reviewing': 'На проверке'}, path,
+            reload_interval=0
+        )
+        statuses = iter(['reviewing', 'approved'])
+
+        def fetch(headers, timestamp):
+            status = next(statuses)
+            if status == 'approved':
+                write('new')
+                stat = path.stat()
+                os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+                deadline = time.monotonic() + 5
+                while not catalog.reloads and time.monotonic() < deadline:
+                    time.sleep(0.01)
+            return {'homeworks': [
+                {'id': 1, 'homework_name': 'hw', 'status': status}
+            ]}
+
+        sent = []
+        engine = self.make_engine(
+            [Tenant('token', '1')], fetch, sent, catalog=catalog
+        )
+        asyncio.run(engine.run(cycles=2))
+        assert sent == [('1', 'hw: old'), ('1', 'hw: new')]
+        assert catalog.reloads == 1
+
+    def test_digest_merges_one_poll(self):
+        def fetch(headers, timestamp):
+            return {'homeworks': [
+                {'id': index, 'homework_name': f'hw{index}',
+                 'status': 'approved'}
+                for index in range(3)
+            ]}
+
+        sent = []
+        engine = self.make_engine(
+            [Tenant('token', '1')], fetch, sent, digest_window=0
+        )
+        asyncio.run(engine.run(cycles=1))
+        assert sent == [('1', 'hw2: approved\n\nhw1: approved\n\n'
+                              'hw0: approved')]
+        assert engine.store.pending_messages() == []
+
+    def test_digest_window_holds_messages(self):
+        def fetch(headers, timestamp):
+            return {'homeworks': [
+                {'id': timestamp, 'homework_name': 'hw', 'status': 'approved'}
+            ], 'current_date': timestamp + 1}
+
+        sent = []
+        engine = self.make_engine(
+            [Tenant('token', '1')], fetch, sent, digest_window=60
+        )
+        engine.states[Tenant('token', '1').key].timestamp = 0
+        asyncio.run(engine.run(cycles=3))
+        assert len(sent) == 1
+        assert sent[0][1].count('hw: approved') == 3
+
+    def test_board_replaces_messages(self):
+        statuses = iter(['reviewing', 'approved'])
+        calls = []
+
+        def fetch(headers, timestamp):
+            return {'homeworks': [
+                {'id': 1, 'homework_name': 'hw', 'status': next(statuses)}
+            ]}
+
+        def send(chat_id, text):
+            calls.append(('send', chat_id, text))
+            return 100
+
+        def edit(chat_id, message_id, text):
+            calls.append(('edit', chat_id, text))
+
+        sent = []
+        store = StateStore()
+        board = StatusBoard(store, send, edit, debounce=0, queue=SendQueue(
+            None, workers=1, chat_rate=1000, global_rate=1000
+        ))
+        engine = self.make_engine(
+            [Tenant('token', '1')], fetch, sent, store=store, board=board
+        )
+        asyncio.run(engine.run(cycles=2))
+        assert sent == []
+        assert store.pending_messages() == []
+        assert calls[0][:2] == ('send', '1')
+        assert calls[-1][2] == 'hw: approved'
+        assert [call[0] for call in calls[1:]] == ['edit'] * (len(calls) - 1)
+        assert store.board('1')[2] == 'hw: approved'
+
+    def test_paused_chat_keeps_status_and_history(self):
+        tenants = [Tenant('token', '1'), Tenant('token', '2')]
+
+        def fetch(headers, timestamp):
+            return {'homeworks': [
+                {'id': 1, 'homework_name': 'hw', 'status': 'approved'}
+            ]}
+
+        sent = []
+        store = StateStore()
+        store.set_paused('1', True)
+        engine = self.make_engine(tenants, fetch, sent, store=store)
+        asyncio.run(engine.run(cycles=1))
+        assert sent == [('2', 'hw: approved')]
+        for chat_id in ('1', '2'):
+            assert list(store.status_lines(chat_id).values()) == [
+                'hw: approved'
+            ]
+            assert [text for _, text in store.history(chat_id)] == [
+                'hw: approved'
+            ]
+
+    def test_verdicts_are_sent_before_notices(self):
+        tenants = [Tenant('reviewing', '1'), Tenant('approved', '2')]
+
+        def fetch(headers, timestamp):
+            status = headers['Authorization'].split()[1]
+            return {'homeworks': [
+                {'homework_name': 'hw', 'status': status}
+            ]}
+
+        sent = []
+        engine = self.make_engine(tenants, fetch, sent)
+        asyncio.run(engine.run(cycles=1))
+        assert sent == [('2', 'hw: approved'), ('1', 'hw: reviewing')]
+
+    def test_open_circuit_sheds_polls(self):
+        calls = []
+
+        def fetch(headers, timestamp):
+            calls.append(timestamp)
+            raise APIRequestError('Request Exception')
+
+        tenant = Tenant('token', '1')
+        engine = self.make_engine(
+            [tenant], fetch, [], breaker=CircuitBreaker(2, 0.05)
+        )
+        asyncio.run(engine.run(cycles=6))
+        assert engine.breaker.opens >= 1
+        assert engine.breaker.rejected >= 1
+        assert len(calls) < 6
+        assert engine.states[tenant.key].errors == len(calls)
+
+    def test_rate_limit_pauses_budget(self):
+        def fetch(headers, timestamp):
+            raise APIResponseError(429, retry_after=30)
+
+        engine = self.make_engine([Tenant('token', '1')], fetch, [])
+        asyncio.run(engine.run(cycles=1))
+        assert engine.budget.paused_until - time.monotonic() > 25
+        assert engine.breaker.state == CLOSED
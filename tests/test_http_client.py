@@ -0,0 +1,71 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from homework_bot.http_client import PooledClient, parse_retry_after
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path.startswith('/slow'):
+            time.sleep(0.5)
+        body = b'{"homeworks": []}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    date = time.strftime(
+        '%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 60)
+    )
+    assert 55 < parse_retry_after(date) <= 60
+
+
+class TestPooledClient:
+    def test_connection_is_reused(self, server_url):
+        client = PooledClient(pool_size=2)
+        for _ in range(5):
+            response = client.get(f'{server_url}/homework_statuses/')
+            assert response.json() == {'homeworks': []}
+        assert client.stats() == {
+            'requests': 5,
+            'connections_created': 1,
+            'connections_reused': 4,
+        }
+        client.close()
+
+    def test_read_timeout(self, server_url):
+        client = PooledClient(read_timeout=0.1, retries=0)
+        with pytest.raises(requests.exceptions.RequestException):
+            client.get(f'{server_url}/slow')
+        client.close()
+
+    def test_timeout_can_be_overridden(self, server_url):
+        client = PooledClient(read_timeout=0.1, retries=0)
+        response = client.get(f'{server_url}/slow', timeout=2)
+        assert response.status_code == 200
+        client.close()
@@ -0,0 +1,245 @@
+import asyncio
+import time
+
+import pytest
+
+from homework_bot import engine as engine_module
+from homework_bot.delivery import SendQueue, TokenBucket
+from homework_bot.engine import PollingEngine
+from homework_bot.lease import (FileLeaseBackend, Lease, SQLiteLeaseBackend,
+                                open_lease_backend)
+from homework_bot.models import parse_response
+from homework_bot.scheduler import AdaptiveSchedule
+from homework_bot.state import SQLiteStateStore
+from homework_bot.tenants import Tenant
+
+
+class Partitioned:
+    def __init__(self, backend):
+        self.backend = backend
+        self.cut = False
+
+    def acquire(self, name, owner, ttl):
+        return not self.cut and self.backend.acquire(name, owner, ttl)
+
+    def release(self, name, owner):
+        self.backend.release(name, owner)
+
+    def holder(self, name):
+        return self.backend.holder(name)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBackends:
+    def test_open_lease_backend(self, tmp_path):
+        assert isinstance(
+            open_lease_backend(tmp_path / 'leases.db'), SQLiteLeaseBackend
+        )
+        assert isinstance(
+            open_lease_backend(tmp_path / 'leases'), FileLeaseBackend
+        )
+
+    def test_sqlite_lease_has_one_owner(self, tmp_path):
+        first = SQLiteLeaseBackend(tmp_path / 'leases.db')
+        second = SQLiteLeaseBackend(tmp_path / 'leases.db')
+        assert first.acquire('homework', 'a', 10)
+        assert not second.acquire('homework', 'b', 10)
+        assert first.acquire('homework', 'a', 10)
+        assert second.holder('homework') == 'a'
+        second.release('homework', 'b')
+        assert first.holder('homework') == 'a'
+        first.release('homework', 'a')
+        assert second.acquire('homework', 'b', 10)
+        assert first.holder('homework') == 'b'
+
+    def test_sqlite_lease_expires(self, tmp_path):
+        first = SQLiteLeaseBackend(tmp_path / 'leases.db')
+        second = SQLiteLeaseBackend(tmp_path / 'leases.db')
+        assert first.acquire('homework', 'a', -1)
+        assert second.holder('homework') is None
+        assert second.acquire('homework', 'b', 10)
+        assert not first.acquire('homework', 'a', 10)
+
+    def test_file_lease_has_one_owner(self, tmp_path):
+        first = FileLeaseBackend(tmp_path / 'leases')
+        second = FileLeaseBackend(tmp_path / 'leases')
+        assert first.acquire('homework', 'a', 10)
+        assert first.acquire('homework', 'a', 10)
+        assert not second.acquire('homework', 'b', 10)
+        assert second.holder('homework') == 'a'
+        first.release('homework', 'a')
+        assert second.acquire('homework', 'b', 10)
+        assert first.holder('homework') == 'b'
+        second.release('homework', 'b')
+
+
+class TestLease:
+    def test_renewal_keeps_a_margin(self, tmp_path):
+        clock = FakeClock()
+        backend = SQLiteLeaseBackend(tmp_path / 'leases.db')
+        lease = Lease(backend, 'homework', owner='a', ttl=9, clock=clock)
+        assert lease.interval == 3
+        assert not lease.held
+        assert lease.renew()
+        assert lease.acquisitions == 1
+        clock.now = 5.9
+        assert lease.held
+        clock.now = 6
+        assert not lease.held
+        assert lease.renew()
+        assert lease.acquisitions == 2
+
+    def test_lease_is_lost_to_another_owner(self, tmp_path):
+        backend = SQLiteLeaseBackend(tmp_path / 'leases.db')
+        ours = Lease(backend, 'homework', owner='a', ttl=10)
+        theirs = Lease(backend, 'homework', owner='b', ttl=10)
+        assert theirs.renew()
+        assert not ours.renew()
+        theirs.release()
+        assert not theirs.held
+        assert ours.renew()
+        assert backend.holder('homework') == 'a'
+
+
+    def test_heartbeat_renews_until_released(self, tmp_path):
+        backend = SQLiteLeaseBackend(tmp_path / 'leases.db')
+        lease = Lease(backend, 'homework', owner='a', ttl=0.15)
+        assert lease.renew()
+        lease.start_heartbeat()
+        time.sleep(0.4)
+        assert lease.held
+        assert lease.acquisitions == 1
+        lease.release()
+        assert backend.holder('homework') is None
+        time.sleep(0.15)
+        assert not lease.held
+        assert backend.holder('homework') is None
+
+    def test_heartbeat_notices_a_lost_lease(self, tmp_path):
+        backend = SQLiteLeaseBackend(tmp_path / 'leases.db')
+        lease = Lease(backend, 'homework', owner='a', ttl=0.15)
+        lease.start_heartbeat()
+        backend.acquire('homework', 'b', 10)
+        time.sleep(0.2)
+        assert not lease.held
+        lease.release()
+
+
+class TestStandby:
+    def test_standby_takes_over_after_expiry(self, tmp_path):
+        tenant = Tenant('token', '1')
+        store = SQLiteStateStore(tmp_path / 'state.db')
+        store.add_message(tenant.key, '1', 'left over', message_id='old')
+        store.flush()
+        backend = SQLiteLeaseBackend(tmp_path / 'leases.db')
+        expires = time.monotonic() + 0.3
+        backend.acquire('homework', 'other', 0.3)
+        polls = []
+        sent = []
+
+        def fetch(headers, timestamp):
+            polls.append(time.monotonic())
+            return {'homeworks': [
+                {'homework_name': 'a', 'status': 'approved'}
+            ]}
+
+        def send(chat_id, message):
+            sent.append((time.monotonic(), message))
+
+        engine = PollingEngine(
+            [tenant], fetch=fetch,
+            check=parse_response,
+            parse=lambda homework: f'{homework.name}: approved',
+            queue=SendQueue(send, workers=1, chat_rate=1000,
+                            global_rate=1000),
+            schedule=AdaptiveSchedule(0, 0, 0, 0, jitter=0), tick=0.01,
+            store=store, budget=TokenBucket(1000),
+            lease=Lease(backend, 'homework', owner='me', ttl=0.3,
+                        interval=0.05)
+        )
+        asyncio.run(asyncio.wait_for(engine.run(cycles=1), 5))
+        store.close()
+        assert len(polls) == 1
+        assert polls[0] >= expires
+        assert [message for _, message in sent] == ['left over', 'a: approved']
+        assert sent[0][0] >= expires
+        assert backend.holder('homework') is None
+
+    def test_standby_neither_polls_nor_sends(self, tmp_path):
+        tenant = Tenant('token', '1')
+        store = SQLiteStateStore(tmp_path / 'state.db')
+        store.add_message(tenant.key, '1', 'left over', message_id='old')
+        store.flush()
+        backend = SQLiteLeaseBackend(tmp_path / 'leases.db')
+        backend.acquire('homework', 'other', 10)
+        polls = []
+        sent = []
+        engine = PollingEngine(
+            [tenant], fetch=lambda headers, timestamp: polls.append(1),
+            check=None, parse=None,
+            queue=SendQueue(lambda chat_id, text: sent.append(text)),
+            schedule=AdaptiveSchedule(0, 0, 0, 0, jitter=0), tick=0.01,
+            store=store,
+            lease=Lease(backend, 'homework', owner='me', ttl=0.3)
+        )
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(asyncio.wait_for(engine.run(cycles=1), 0.5))
+        store.close()
+        assert polls == []
+        assert sent == []
+        assert backend.holder('homework') == 'other'
+
+    def test_lease_moves_while_messages_are_queued(self, tmp_path,
+                                                   monkeypatch):
+        monkeypatch.setattr(engine_module, 'FLUSH_INTERVAL', 0.01)
+        tenant = Tenant('token', '1')
+        backend = SQLiteLeaseBackend(tmp_path / 'leases.db')
+        partitioned = Partitioned(backend)
+        sent = []
+
+        def fetch(headers, timestamp):
+            return {'homeworks': [
+                {'id': index, 'homework_name': f'hw{index}',
+                 'status': 'approved'}
+                for index in range(5)
+            ]}
+
+        def make_engine(name, lease_backend, chat_rate):
+            def send(chat_id, message):
+                sent.append((name, message))
+                partitioned.cut = True
+
+            return PollingEngine(
+                [tenant], fetch=fetch, check=parse_response,
+                parse=lambda homework: homework.name,
+                queue=SendQueue(send, workers=1, chat_rate=chat_rate,
+                                global_rate=1000),
+                schedule=AdaptiveSchedule(0, 0, 0, 0, jitter=0), tick=0.01,
+                store=SQLiteStateStore(tmp_path / 'state.db'),
+                budget=TokenBucket(1000),
+                lease=Lease(lease_backend, 'homework', owner=name, ttl=0.3,
+                            interval=0.1)
+            )
+
+        old = make_engine('old', partitioned, chat_rate=2)
+        new = make_engine('new', backend, chat_rate=1000)
+        assert old.lease.renew()
+
+        async def run():
+            await asyncio.gather(old.run(cycles=1), new.run(cycles=1))
+
+        asyncio.run(asyncio.wait_for(run(), 10))
+        old.store.close()
+        new.store.close()
+        messages = [message for _, message in sent]
+        assert sorted(messages) == [f'hw{index}' for index in range(5)]
+        assert sent[0][0] == 'old'
+        assert sent[-1][0] == 'new'
+        assert old.queue.skipped > 0
@@ -0,0 +1,44 @@
+import json
+import logging
+
+import pytest
+
+from homework_bot import logs
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / 'main.log'
+    logs.stop_logging()
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    level = root.level
+    yield path
+    logs.stop_logging()
+    root.handlers = handlers
+    root.setLevel(level)
+
+
+def test_rate_limit_filter():
+    log_filter = logs.RateLimitFilter(interval=60)
+    debug = logging.LogRecord('bot', logging.DEBUG, '', 0, 'Message sent',
+                              None, None)
+    error = logging.LogRecord('bot', logging.ERROR, '', 0, 'Failed', None,
+                              None)
+    assert log_filter.filter(debug)
+    assert not log_filter.filter(debug)
+    assert log_filter.filter(error) and log_filter.filter(error)
+
+
+def test_json_records_are_written_once(log_file):
+    listener = logs.setup_logging(str(log_file), json_format=True)
+    assert logs.setup_logging(str(log_file)) is listener
+    logger = logging.getLogger('homework_bot.test')
+    for _ in range(3):
+        logger.debug('Message sent')
+    logger.error('Ошибка')
+    logs.stop_logging()
+    records = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [(r['level'], r['message']) for r in records] == [
+        ('DEBUG', 'Message sent'), ('ERROR', 'Ошибка')
+    ]
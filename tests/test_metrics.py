@@ -0,0 +1,101 @@
+import urllib.request
+
+import homework
+from homework_bot.delivery import SendQueue
+from homework_bot.engine import PollingEngine
+from homework_bot.metrics import (Counter, Gauge, Histogram, Registry,
+                                  register_engine, register_http_client,
+                                  start_metrics_server)
+from homework_bot.tenants import Tenant
+
+
+class TestRegistry:
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        counter = Counter('errors_total', 'Errors.', ['type'],
+                          registry=registry)
+        counter.inc(type='Timeout')
+        counter.inc(2, type='Timeout')
+        counter.inc(type='say "hi"')
+        Gauge('depth', 'Depth.', lambda: 7, registry=registry)
+        assert registry.render().splitlines() == [
+            '# HELP errors_total Errors.',
+            '# TYPE errors_total counter',
+            'errors_total{type="Timeout"} 3',
+            'errors_total{type="say \\"hi\\""} 1',
+            '# HELP depth Depth.',
+            '# TYPE depth gauge',
+            'depth 7',
+        ]
+
+    def test_histogram_is_cumulative(self):
+        registry = Registry()
+        histogram = Histogram('latency', 'Latency.', buckets=(0.1, 1),
+                              registry=registry)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+        assert registry.render().splitlines()[2:] == [
+            'latency_bucket{le="0.1"} 1',
+            'latency_bucket{le="1"} 2',
+            'latency_bucket{le="+Inf"} 3',
+            'latency_sum 5.55',
+            'latency_count 3',
+        ]
+
+
+def test_engine_metrics_are_served():
+    registry = Registry()
+    engine = PollingEngine(
+        [Tenant('a', '1'), Tenant('b', '2')], fetch=None, check=None,
+        parse=None, queue=SendQueue(None)
+    )
+    engine.states[Tenant('a', '1').key].errors = 2
+    engine.states[Tenant('b', '2').key].statuses.statuses[1] = 'reviewing'
+    register_engine(engine, registry=registry)
+    server = start_metrics_server(0, host='127.0.0.1', registry=registry)
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+        body = urllib.request.urlopen(url, timeout=5).read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'homework_send_queue_depth 0' in body
+    assert 'homework_tenants{state="failing"} 1' in body
+    assert 'homework_homeworks{status="reviewing"} 1' in body
+    assert 'homework_api_circuit_state{state="closed"} 1' in body
+    assert 'homework_send_lane_depth{lane="notice"} 0' in body
+
+
+def test_http_client_metrics():
+    class Client:
+        def stats(self):
+            return {
+                'requests': 5, 'connections_created': 2,
+                'connections_reused': 3,
+            }
+
+    registry = Registry()
+    register_http_client(Client(), registry=registry)
+    body = registry.render()
+    assert 'homework_api_requests 5' in body
+    assert 'homework_api_connections{kind="created"} 2' in body
+    assert 'homework_api_connections{kind="reused"} 3' in body
+
+
+def test_http_client_is_registered_where_requests_are_sent(monkeypatch,
+                                                            tmp_path):
+    calls = []
+    monkeypatch.setattr(homework, 'METRICS_PORT', 9000)
+    monkeypatch.setattr(homework, 'LOG_FILE', str(tmp_path / 'main.log'))
+    monkeypatch.setattr(homework, 'start_metrics_server', calls.append)
+    monkeypatch.setattr(homework, 'register_http_client', calls.append)
+    monkeypatch.setattr(homework, 'run_engine', lambda *args: None)
+    monkeypatch.setattr(homework, 'run_supervisor', lambda: None)
+    monkeypatch.setattr(homework, 'WORKERS', 2)
+    homework.run_tenants()
+    assert calls == [9000]
+    homework.run_worker('worker-1', [])
+    assert calls == [9000, 9002, homework.HTTP_CLIENT]
+    monkeypatch.setattr(homework, 'WORKERS', 1)
+    homework.run_tenants()
+    assert calls[3:] == [9000, homework.HTTP_CLIENT]
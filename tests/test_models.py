@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from homework_bot.errors import (InvalidResponse, MissingField,
+                                 UnknownStatus, ValidationError)
+from homework_bot.models import (Homework, Status, parse_response,
+                                 response_json)
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class TestHomework:
+    def test_from_dict(self):
+        raw = {'id': 7, 'homework_name': 'hw', 'status': 'approved',
+               'date_updated': '2022-01-01T00:00:00Z', 'lesson_name': 'x'}
+        homework = Homework.from_dict(raw)
+        assert homework == Homework(7, 'hw', Status.APPROVED,
+                                    '2022-01-01T00:00:00Z')
+        assert homework.status is Status('approved')
+        assert homework.key == '7'
+        assert str(homework.status) == f'{homework.status}' == 'approved'
+        assert not hasattr(homework, '__dict__')
+
+    @pytest.mark.parametrize('raw, error', [
+        ({'status': 'approved'}, MissingField),
+        ({'homework_name': '', 'status': 'approved'}, MissingField),
+        ({'homework_name': 'hw'}, MissingField),
+        ({'homework_name': 'hw', 'status': 'unknown'}, UnknownStatus),
+        ({'homework_name': 'hw', 'status': ['approved']}, UnknownStatus),
+        (['hw'], InvalidResponse),
+    ])
+    def test_invalid_homework(self, raw, error):
+        with pytest.raises(error) as info:
+            Homework.from_dict(raw)
+        assert isinstance(info.value, ValidationError)
+
+    def test_errors_keep_builtin_types(self):
+        assert issubclass(InvalidResponse, TypeError)
+        assert issubclass(MissingField, KeyError)
+        assert issubclass(UnknownStatus, KeyError)
+        assert str(MissingField('status')) == 'No key status'
+
+
+class TestParseResponse:
+    def test_returns_records(self):
+        homeworks = parse_response({'homeworks': [
+            {'homework_name': 'a', 'status': 'reviewing'},
+            {'id': 2, 'homework_name': 'b', 'status': 'rejected'},
+        ]})
+        assert [homework.key for homework in homeworks] == ['a', '2']
+        assert homeworks[1].status is Status.REJECTED
+
+    @pytest.mark.parametrize('response', [
+        [], {'current_date': 1}, {'homeworks': {}},
+    ])
+    def test_invalid_shape(self, response):
+        with pytest.raises(InvalidResponse):
+            parse_response(response)
+
+
+def test_response_json():
+    body = b'{"homeworks": [], "current_date": 1}'
+    assert response_json(FakeResponse(body)) == {
+        'homeworks': [], 'current_date': 1
+    }
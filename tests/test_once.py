@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+import homework
+from homework_bot import bots
+from homework_bot.lease import SQLiteLeaseBackend
+
+
+@pytest.fixture
+def once(monkeypatch, tmp_path):
+    state_file = tmp_path / 'state.json'
+    monkeypatch.setattr(homework, 'STATE_FILE', str(state_file))
+    monkeypatch.setattr(homework, 'LOG_FILE', str(tmp_path / 'main.log'))
+    monkeypatch.setattr(homework, 'TENANTS_FILE', None)
+    monkeypatch.setattr(homework, 'LEASE_FILE', None)
+    monkeypatch.setattr(homework, 'timestamp', 100)
+    sent = []
+    monkeypatch.setattr(
+        homework, 'send_message', lambda bot, message: sent.append(message)
+    )
+    return state_file, sent
+
+
+def cursors(state_file):
+    return json.loads(state_file.read_text())['cursors']
+
+
+def test_idle_cycle_saves_cursor_without_a_bot(once, monkeypatch):
+    state_file, sent = once
+    requested = []
+
+    def get_api_answer(timestamp):
+        requested.append(timestamp)
+        return {'homeworks': [], 'current_date': 200}
+
+    def get_bot(*args, **kwargs):
+        raise AssertionError('An idle cycle must not create a bot')
+
+    monkeypatch.setattr(homework, 'get_api_answer', get_api_answer)
+    monkeypatch.setattr(bots, 'get_bot', get_bot)
+    assert homework.run_once() == 0
+    assert homework.run_once() == 0
+    assert requested == [100, 200]
+    assert sent == []
+    assert list(cursors(state_file).values()) == [200]
+
+
+def test_cycle_sends_changes(once, monkeypatch):
+    state_file, sent = once
+    monkeypatch.setattr(homework, 'get_api_answer', lambda timestamp: {
+        'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+        'current_date': 200
+    })
+    monkeypatch.setattr(bots, 'get_bot', lambda *args, **kwargs: None)
+    assert homework.run_once() == 0
+    assert len(sent) == 1
+    assert '"hw"' in sent[0]
+    assert list(cursors(state_file).values()) == [200]
+
+
+def test_partial_batch_is_not_resent(once, monkeypatch):
+    state_file, sent = once
+    monkeypatch.setattr(homework, 'get_api_answer', lambda timestamp: {
+        'homeworks': [
+            {'homework_name': 'second', 'status': 'approved'},
+            {'homework_name': 'first', 'status': 'approved'},
+        ],
+        'current_date': 200
+    })
+    monkeypatch.setattr(bots, 'get_bot', lambda *args, **kwargs: None)
+    failures = []
+
+    def send_message(bot, message):
+        if '"second"' in message and not failures:
+            failures.append(message)
+            raise ConnectionError('Network error')
+        sent.append(message)
+
+    monkeypatch.setattr(homework, 'send_message', send_message)
+    assert homework.run_once() == 1
+    assert homework.run_once() == 0
+    assert len(sent) == 2
+    assert '"first"' in sent[0] and '"second"' in sent[1]
+    assert list(cursors(state_file).values()) == [200]
+
+
+def test_failed_cycle_keeps_cursor(once, monkeypatch):
+    state_file, sent = once
+
+    def get_api_answer(timestamp):
+        raise homework.APIRequestError('Request Exception')
+
+    monkeypatch.setattr(homework, 'get_api_answer', get_api_answer)
+    assert homework.run_once() == 1
+    assert not state_file.exists()
+
+
+def test_lease_is_kept_and_released(once, monkeypatch, tmp_path):
+    path = tmp_path / 'leases.db'
+    monkeypatch.setattr(homework, 'LEASE_FILE', str(path))
+    backend = SQLiteLeaseBackend(path)
+    holders = []
+
+    def get_api_answer(timestamp):
+        holders.append(backend.holder('homework-classic'))
+        return {'homeworks': [], 'current_date': 200}
+
+    monkeypatch.setattr(homework, 'get_api_answer', get_api_answer)
+    assert homework.run_once() == 0
+    assert holders[0] is not None
+    assert backend.holder('homework-classic') is None
+    backend.acquire('homework-classic', 'other', 10)
+    assert homework.run_once() == 0
+    assert len(holders) == 1
+
+
+def test_parse_args():
+    assert homework.parse_args(['--once']).once
+    assert not homework.parse_args([]).once
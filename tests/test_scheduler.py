@@ -0,0 +1,34 @@
+import pytest
+
+from homework_bot.scheduler import AdaptiveSchedule
+
+
+class TestAdaptiveSchedule:
+    schedule = AdaptiveSchedule(
+        fast=60, normal=600, slow=1800, max_backoff=3600, jitter=0.1
+    )
+
+    @pytest.mark.parametrize('statuses, idle_polls, expected', [
+        ({1: 'reviewing', 2: 'approved'}, 5, 60),
+        ({1: 'approved', 2: 'approved'}, 0, 1800),
+        ({1: 'rejected'}, 0, 600),
+        ({}, 0, 600),
+        ({}, 3, 1800),
+    ])
+    def test_base_delay(self, statuses, idle_polls, expected):
+        assert self.schedule.base_delay(statuses, idle_polls, 0) == expected
+
+    def test_errors_back_off(self):
+        delays = [
+            self.schedule.base_delay({1: 'reviewing'}, 0, errors)
+            for errors in range(1, 6)
+        ]
+        assert delays == [600, 1200, 2400, 3600, 3600]
+
+    def test_jitter(self):
+        delays = {
+            self.schedule.next_delay({}, 0, 0) for _ in range(50)
+        }
+        assert len(delays) > 1
+        assert all(540 <= delay <= 660 for delay in delays)
+        assert 0 <= self.schedule.first_delay() <= 60
@@ -0,0 +1,90 @@
+import multiprocessing
+import sys
+import time
+
+from homework_bot.sharding import HashRing, Supervisor, assign
+from homework_bot.tenants import Tenant
+
+FORK = multiprocessing.get_context('fork')
+KEYS = [f'token-{index}' for index in range(3000)]
+
+
+def sleep_forever(name, tenants):
+    time.sleep(60)
+
+
+def crash(name, tenants):
+    sys.exit(1)
+
+
+class TestHashRing:
+    def test_keys_are_spread(self):
+        ring = HashRing(['a', 'b', 'c'])
+        counts = {}
+        for key in KEYS:
+            node = ring.node_for(key)
+            counts[node] = counts.get(node, 0) + 1
+        assert all(700 < count < 1300 for count in counts.values())
+        assert ring.node_for('token-1') == HashRing(['c', 'b', 'a']).node_for(
+            'token-1'
+        )
+
+    def test_adding_a_node_moves_few_keys(self):
+        ring = HashRing(['a', 'b'])
+        before = {key: ring.node_for(key) for key in KEYS}
+        ring.add('c')
+        moved = [key for key in KEYS if ring.node_for(key) != before[key]]
+        assert all(ring.node_for(key) == 'c' for key in moved)
+        assert len(moved) < len(KEYS) / 2
+        ring.remove('c')
+        assert {key: ring.node_for(key) for key in KEYS} == before
+
+
+def test_assign_keeps_a_token_together():
+    tenants = [Tenant('shared', '1'), Tenant('shared', '2')] + [
+        Tenant(f'token{index}', str(index)) for index in range(20)
+    ]
+    shards = assign(tenants, HashRing(['a', 'b']))
+    assert sorted(shards) == ['a', 'b']
+    assert sum(len(shard) for shard in shards.values()) == len(tenants)
+    assert any(
+        tenants[0] in shard and tenants[1] in shard
+        for shard in shards.values()
+    )
+
+
+class TestSupervisor:
+    def make_tenants(self):
+        return [Tenant(f'token{index}', str(index)) for index in range(30)]
+
+    def test_resize_rebalances_workers(self):
+        supervisor = Supervisor(
+            self.make_tenants(), sleep_forever, workers=2, context=FORK
+        )
+        try:
+            supervisor.start()
+            assert len(supervisor.processes) == 2
+            supervisor.resize(3)
+            assert len(supervisor.processes) == 3
+            assert all(p.is_alive() for p in supervisor.processes.values())
+            assert sum(map(len, supervisor.shards.values())) == 30
+            supervisor.resize(1)
+            assert list(supervisor.processes) == ['worker-0']
+            assert len(supervisor.shards['worker-0']) == 30
+        finally:
+            supervisor.stop()
+        assert supervisor.processes == {}
+
+    def test_crashed_worker_is_restarted(self):
+        supervisor = Supervisor(
+            self.make_tenants(), crash, workers=1, context=FORK,
+            restart_delay=0
+        )
+        try:
+            supervisor.start()
+            supervisor.processes['worker-0'].join(5)
+            supervisor.check()
+            assert supervisor.restarts == 1
+            assert supervisor.crashes['worker-0'] == 1
+        finally:
+            supervisor.stop()
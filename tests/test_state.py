@@ -0,0 +1,245 @@
+import json
+import threading
+import time
+
+import pytest
+
+from homework_bot.state import (HISTORY_SIZE, JsonStateStore,
+                                SQLiteStateStore, StateStore, advance_cursor,
+                                open_store)
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def make_store(request, tmp_path):
+    stores = []
+
+    def make():
+        if request.param == 'json':
+            store = JsonStateStore(tmp_path / 'state.json')
+        else:
+            store = SQLiteStateStore(tmp_path / 'state.db')
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        if isinstance(store, SQLiteStateStore):
+            store.connection.close()
+
+
+class TestStateStores:
+    def test_round_trip(self, make_store):
+        store = make_store()
+        assert store.get('tenant', 100) == 100
+        store.set('tenant', 200)
+        store.set_status('tenant', 1, 'reviewing')
+        store.set_status('tenant', 'hw', 'approved')
+        store.flush()
+        store.set_status('tenant', 1, 'approved')
+        store.flush()
+        reopened = make_store()
+        assert reopened.get('tenant', 100) == 200
+        assert reopened.statuses('tenant') == {
+            '1': 'approved', 'hw': 'approved'
+        }
+        assert reopened.statuses('other') == {}
+
+    def test_buffered_changes_are_visible(self, make_store):
+        store = make_store()
+        store.set('tenant', 5)
+        store.set_status('tenant', 1, 'reviewing')
+        assert store.get('tenant', 0) == 5
+        assert store.statuses('tenant') == {'1': 'reviewing'}
+
+    def test_messages(self, make_store):
+        store = make_store()
+        first = store.add_message('tenant', 1, 'first')
+        store.add_message('tenant', 1, 'second', message_id='key')
+        store.flush()
+        store.mark_sent(first)
+        assert [row[1:] for row in store.pending_messages()] == [
+            ('tenant', '1', 'second')
+        ]
+        store.flush()
+        assert make_store().pending_messages() == [
+            ('key', 'tenant', '1', 'second')
+        ]
+
+    def test_boards(self, make_store):
+        store = make_store()
+        assert store.board(7) == (None, {}, '')
+        store.set_board_lines(7, {'a': 'a: reviewing'})
+        store.flush()
+        store.set_board_lines(7, {'b': 'b: approved'})
+        store.set_board_message(7, 11, 'a: reviewing\nb: approved')
+        store.flush()
+        assert make_store().board('7') == (
+            11, {'a': 'a: reviewing', 'b': 'b: approved'},
+            'a: reviewing\nb: approved'
+        )
+
+    def test_history(self, make_store):
+        store = make_store()
+        assert store.history(7) == []
+        for index in range(HISTORY_SIZE):
+            store.add_event(7, f'old {index}', at=index)
+        store.flush()
+        store.add_event(7, 'new', at=100)
+        store.add_event(8, 'other', at=50)
+        assert store.history(7, 2) == [(100, 'new'), (19, 'old 19')]
+        store.flush()
+        history = make_store().history('7')
+        assert len(history) == HISTORY_SIZE
+        assert history[0] == (100, 'new')
+        assert history[-1] == (1, 'old 1')
+
+    def test_paused(self, make_store):
+        store = make_store()
+        assert not store.is_paused(7)
+        store.set_paused(7, True)
+        store.set_paused(8, True)
+        assert store.is_paused('7')
+        store.flush()
+        store.set_paused(8, False)
+        store.flush()
+        reopened = make_store()
+        assert reopened.is_paused(7)
+        assert not reopened.is_paused(8)
+
+    def test_status_lines(self, make_store):
+        store = make_store()
+        assert store.status_lines(7) == {}
+        store.set_board_lines(7, {'a': 'a: reviewing'})
+        assert store.status_lines(7) == {'a': 'a: reviewing'}
+        store.flush()
+        assert make_store().status_lines('7') == {'a': 'a: reviewing'}
+
+
+class TestJsonStateStore:
+    def test_flush_is_atomic(self, tmp_path, monkeypatch):
+        path = tmp_path / 'state.json'
+        store = JsonStateStore(path)
+        store.set('tenant', 1)
+        store.flush()
+
+        def broken_dump(*args, **kwargs):
+            raise OSError('disk full')
+
+        store.set('tenant', 2)
+        monkeypatch.setattr(json, 'dump', broken_dump)
+        with pytest.raises(OSError):
+            store.flush()
+        monkeypatch.undo()
+        assert JsonStateStore(path).get('tenant', 0) == 1
+        assert [p.name for p in tmp_path.iterdir()] == ['state.json']
+        assert store.dirty
+
+    def test_unchanged_state_is_not_written(self, tmp_path):
+        path = tmp_path / 'state.json'
+        store = JsonStateStore(path)
+        store.set('tenant', 1)
+        store.flush()
+        path.unlink()
+        store.set('tenant', 1)
+        store.flush()
+        assert not path.exists()
+
+    def test_broken_file_starts_empty(self, tmp_path):
+        path = tmp_path / 'state.json'
+        path.write_text('{not json')
+        assert JsonStateStore(path).get('tenant', 5) == 5
+
+
+def test_sqlite_uses_wal(tmp_path):
+    store = SQLiteStateStore(tmp_path / 'state.db')
+    mode = store.connection.execute('PRAGMA journal_mode').fetchone()[0]
+    store.close()
+    assert mode == 'wal'
+
+
+def test_open_store(tmp_path):
+    assert type(open_store(None)) is StateStore
+    assert isinstance(open_store(tmp_path / 'a.json'), JsonStateStore)
+    store = open_store(str(tmp_path / 'a.sqlite3'))
+    assert isinstance(store, SQLiteStateStore)
+    store.close()
+
+
+def test_advance_cursor():
+    assert advance_cursor({'current_date': 20}, 10) == 20
+    assert advance_cursor({'current_date': 5}, 10) == 10
+    assert advance_cursor({'current_date': '20'}, 10) == 10
+    assert advance_cursor({}, 10) == 10
+
+
+class TestSQLiteStateStore:
+    def test_writes_do_not_wait_for_flush(self, tmp_path):
+        store = SQLiteStateStore(tmp_path / 'state.db')
+        holding = threading.Event()
+        release = threading.Event()
+
+        def write():
+            with store.connection_lock:
+                holding.set()
+                release.wait(1)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        holding.wait(1)
+        start = time.monotonic()
+        store.set('tenant', 5)
+        store.set_status('tenant', 1, 'approved')
+        store.mark_sent(store.add_message('tenant', '1', 'text'))
+        assert time.monotonic() - start < 0.5
+        release.set()
+        thread.join()
+        store.close()
+
+    def test_paused_chats_are_cached(self, tmp_path):
+        store = SQLiteStateStore(tmp_path / 'state.db')
+        store.set_paused(7, True)
+        store.flush()
+
+        def query(sql, params=()):
+            raise AssertionError(f'Unexpected query {sql}')
+
+        store._query = query
+        assert store.is_paused(7)
+        assert not store.is_paused(8)
+        store.connection.close()
+
+    def test_delivered_messages_are_pruned(self, tmp_path):
+        store = SQLiteStateStore(tmp_path / 'state.db', sent_retention=0)
+        first = store.add_message('tenant', '1', 'first')
+        store.add_message('tenant', '1', 'second')
+        store.flush()
+        store.mark_sent(first)
+        store.flush()
+        rows = store.connection.execute('SELECT text FROM messages')
+        assert rows.fetchall() == [('second',)]
+        store.close()
+
+
+class TestSQLiteSharing:
+    def test_other_process_sees_lines_and_pauses(self, tmp_path):
+        path = tmp_path / 'state.db'
+        owner = SQLiteStateStore(path)
+        reader = SQLiteStateStore(path)
+        assert reader.status_lines(7) == {}
+        owner.set_board_lines(7, {'a': 'a: reviewing'})
+        owner.flush()
+        assert reader.status_lines(7) == {'a': 'a: reviewing'}
+        owner.set_board_lines(7, {'a': 'a: approved'})
+        owner.flush()
+        assert reader.status_lines(7) == {'a': 'a: approved'}
+        reader.set_paused(7, True)
+        reader.flush()
+        assert not owner.is_paused(7)
+        owner.flush()
+        assert owner.is_paused(7)
+        reader.set_paused(7, False)
+        reader.flush()
+        owner.flush()
+        assert not owner.is_paused(7)
+        owner.connection.close()
+        reader.connection.close()
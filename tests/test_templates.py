@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+
+from homework_bot.errors import UnknownStatus
+from homework_bot.models import Homework, Status
+from homework_bot.templates import Catalog, Template
+
+VERDICTS = {'approved': 'Ура!', 'rejected': 'Есть замечания.'}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def write(path, config, mtime):
+    path.write_text(json.dumps(config), encoding='utf-8')
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_template_bakes_verdict():
+    template = Template('{name} ({id}): {verdict} [{status}]', 'OK', 'done')
+    assert template.parts[-1] == ('): OK [done]', None)
+    homework = Homework(3, 'hw', Status.APPROVED)
+    assert template.render(homework) == 'hw (3): OK [done]'
+
+
+@pytest.mark.parametrize('message', ['{name!r}', '{name:>5}', '{lesson}'])
+def test_template_rejects_unknown_syntax(message):
+    with pytest.raises(ValueError):
+        Template(message, 'OK', 'done')
+
+
+class TestCatalog:
+    def test_builtin_message(self):
+        catalog = Catalog(VERDICTS)
+        assert catalog.render(
+            {'homework_name': 'hw', 'status': 'approved'}
+        ) == 'Изменился статус проверки работы "hw". Ура!'
+        with pytest.raises(UnknownStatus):
+            catalog.render({'homework_name': 'hw', 'status': 'reviewing'})
+
+    def test_locales_and_new_status(self, tmp_path):
+        path = tmp_path / 'templates.json'
+        write(path, {'locales': {
+            'ru': {'verdicts': {'reviewing': 'На проверке.'}},
+            'en': {'message': '{name}: {verdict}',
+                   'verdicts': {'approved': 'Approved!'}},
+        }}, 1)
+        catalog = Catalog(VERDICTS, path)
+        homework = {'homework_name': 'hw', 'status': 'approved'}
+        assert catalog.render(homework, 'en') == 'hw: Approved!'
+        assert catalog.render(homework, 'de').endswith('Ура!')
+        assert catalog.render(
+            {'homework_name': 'hw', 'status': 'rejected'}, 'en'
+        ) == 'hw: Есть замечания.'
+        assert catalog.render(
+            {'homework_name': 'hw', 'status': 'reviewing'}
+        ).endswith('На проверке.')
+
+    def test_hot_reload(self, tmp_path):
+        path = tmp_path / 'templates.json'
+        write(path, {}, 1)
+        clock = Clock()
+        catalog = Catalog(VERDICTS, path, clock=clock)
+        homework = Homework(None, 'hw', Status.APPROVED)
+        write(path, {'locales': {'ru': {'message': '{name}!'}}}, 2)
+        assert not catalog.refresh()
+        clock.now = 1
+        assert catalog.refresh()
+        assert catalog.render(homework) == 'hw!'
+        clock.now = 2
+        assert not catalog.refresh()
+
+    def test_broken_file_keeps_catalog(self, tmp_path):
+        path = tmp_path / 'templates.json'
+        write(path, {}, 1)
+        clock = Clock()
+        catalog = Catalog(VERDICTS, path, clock=clock)
+        path.write_text('{', encoding='utf-8')
+        os.utime(path, ns=(2, 2))
+        clock.now = 1
+        assert not catalog.refresh()
+        assert catalog.render(
+            Homework(None, 'hw', Status.APPROVED)
+        ).endswith('Ура!')
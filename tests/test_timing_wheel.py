@@ -0,0 +1,56 @@
+import random
+
+from homework_bot.timing_wheel import LagMonitor, TimingWheel
+
+
+def run_wheel(wheel, until, step=1):
+    fired = {}
+    now = 0
+    while now < until:
+        now += step
+        for key in wheel.advance(now):
+            fired[key] = now
+    return fired
+
+
+class TestTimingWheel:
+    def test_timers_fire_on_time_across_levels(self):
+        wheel = TimingWheel(tick=1)
+        delays = {key: random.randint(1, 300000) for key in range(2000)}
+        for key, delay in delays.items():
+            wheel.schedule(key, delay, 0)
+        fired = run_wheel(wheel, 300001)
+        assert fired == delays
+        assert len(wheel) == 0
+        assert wheel.lateness.max == 0
+
+    def test_catches_up_after_a_long_pause(self):
+        wheel = TimingWheel(tick=1)
+        for key in range(100):
+            wheel.schedule(key, key * 50, 0)
+        fired = run_wheel(wheel, 10000, step=997)
+        assert sorted(fired) == list(range(100))
+        assert all(fired[key] >= key * 50 for key in fired)
+
+    def test_cancel_and_reschedule(self):
+        wheel = TimingWheel(tick=1)
+        wheel.schedule('a', 10, 0)
+        wheel.schedule('b', 10, 0)
+        wheel.cancel('a')
+        wheel.schedule('b', 5000, 0)
+        assert 'a' not in wheel and 'b' in wheel
+        assert run_wheel(wheel, 6000) == {'b': 5000}
+
+    def test_zero_delay_fires_on_next_tick(self):
+        wheel = TimingWheel(tick=0.5, now=100)
+        wheel.schedule('a', 0, 100)
+        assert wheel.advance(100.5) == ['a']
+
+
+def test_lag_monitor():
+    monitor = LagMonitor()
+    for lag in (0.1, 0.3, -0.2):
+        monitor.observe(lag)
+    assert monitor.count == 3
+    assert monitor.max == 0.3 and monitor.last == 0
+    assert round(monitor.mean, 6) == round(0.4 / 3, 6)